@@ -4,26 +4,25 @@
 # 功能：从OneLap平台下载最新运动数据并同步到行者平台和捷安特骑行平台
 import base64
 from math import log
-from DrissionPage import ChromiumPage, ChromiumOptions
 import os
 import time
 import re
-from datetime import datetime
-import requests
+from datetime import datetime, timedelta
 import hashlib
 import logging
 import random
 import shutil
-from bs4 import BeautifulSoup  # 添加BeautifulSoup用于HTML解析
 import string
 from urllib.parse import unquote, urlparse, quote
+from html import unescape as html_unescape
+from functools import lru_cache
 import threading
-import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 import json
-from http.server import BaseHTTPRequestHandler, HTTPServer
 
 # 导入配置 - 支持INI配置文件
 import configparser
+import signal
 import sys
 
 # 导入 FIT 坐标转换模块（GCJ-02 -> WGS84，用于 Strava 上传前转换）
@@ -33,6 +32,12 @@ try:
 except ImportError:
     FIT_COORD_TRANSFORM_AVAILABLE = False
 
+# 同步流程计时与运行报告（纯标准库）
+from sync_metrics import timed, span, incr, http_metrics_hook, reset_report, PrometheusExporter
+from fit_integrity import FitStreamValidator, FitIntegrityError
+from onelap_catalog import OneLapCatalog
+from activity_models import ActivityRecord, find_onelap_fit_key
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
@@ -47,6 +52,12 @@ APP_DIR = get_app_dir()
 CONFIG_FILE_PATH = os.path.join(APP_DIR, 'settings.ini')
 STRAVA_STATE_FILE = os.path.join(APP_DIR, 'strava_upload_state.json')
 ONELAP_DOWNLOAD_STATE_FILE = os.path.join(APP_DIR, 'onelap_download_state.json')
+ONELAP_DETAIL_CACHE_FILE = os.path.join(APP_DIR, 'onelap_detail_cache.json')
+ONELAP_CATALOG_FILE = os.path.join(APP_DIR, 'onelap_catalog.json')
+DAEMON_STATUS_FILE = os.path.join(APP_DIR, 'daemon_status.json')
+RUN_REPORT_FILE = os.path.join(APP_DIR, 'run_report.json')
+UPLOAD_BATCH_STATE_FILE = os.path.join(APP_DIR, 'upload_batch_state.json')
+UPLOAD_OUTBOX_FILE = os.path.join(APP_DIR, 'upload_outbox.json')
 ONELAP_BASE_WEB_URL = 'https://www.onelap.cn'
 ONELAP_BASE_APP_URL = 'https://u.onelap.cn'
 ONELAP_RECORD_PAGE_URL = f'{ONELAP_BASE_APP_URL}/recordPage'
@@ -55,20 +66,41 @@ ONELAP_DETAIL_API = f'{ONELAP_BASE_APP_URL}/api/otm/ride_record/analysis/{{recor
 ONELAP_DOWNLOAD_API = f'{ONELAP_BASE_APP_URL}/api/otm/ride_record/analysis/fit_content/{{fit_key}}'
 ONELAP_SIGN_KEY = 'fe9f8382418fcdeb136461cac6acae7b'
 ONELAP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36'
+STRAVA_OAUTH_TOKEN_URL = 'https://www.strava.com/oauth/token'
+STRAVA_API_BASE_URL = 'https://www.strava.com/api/v3'
+XOSS_BASE_URL = 'https://www.imxingzhe.com'
+XOSS_UPLOAD_PAGE_URL = f'{XOSS_BASE_URL}/upload/fit'
+XOSS_UPLOAD_API = f'{XOSS_BASE_URL}/api/v1/fit/upload/'
+GIANT_BASE_URL = 'https://ridelife.giant.com.cn'
+GIANT_FIT_PAGE_URL = f'{GIANT_BASE_URL}/web/main_fit.html'
+GIANT_UPLOAD_API = f'{GIANT_BASE_URL}/index.php/api/upload_fit'
+GARMIN_CONNECT_BASE_URL = 'https://connect.garmin.cn'
 GARMIN_IMPORT_URL = 'https://connect.garmin.cn/app/import-data'
 GARMIN_ACTIVITIES_URL = 'https://connect.garmin.cn/modern/activities'
 GARMIN_USAGE_INDICATORS_API = '/gc-api/web-gateway/snapshot/usageIndicators'
+# 接口会话只复制这些域名下的 cookies，sso.garmin.com 等账号域名的登录凭据不带出浏览器
+GARMIN_API_COOKIE_DOMAINS = ('connect.garmin.cn', 'connectapi.garmin.cn', 'connect.garmin.com', 'connectapi.garmin.com')
 GARMIN_LOGIN_WAIT_SECONDS = 180
-
-# ===== 新增：导入增量同步模块 =====
+# 上传/导入接口的 URL 片段，用于 tab.listen 捕获页面发出的上传请求响应
+GARMIN_UPLOAD_API_MARKERS = ['upload-service/upload']
+# iGPSport 导入弹窗实际调用的接口路径尚未抓包确认，只有 [igpsport] listen_upload_api = true 时才监听
+IGPSPORT_UPLOAD_API_MARKERS = ['activity/upload', 'uploadFile', 'upload/fit']
+XOSS_UPLOAD_API_MARKERS = ['fit/upload']
+GIANT_UPLOAD_API_MARKERS = ['upload_fit']
+
+# ===== 新增：增量同步模块（反向同步步骤执行时才导入）=====
 if SCRIPT_DIR not in sys.path:
     sys.path.insert(0, SCRIPT_DIR)
-try:
-    from incremental_sync_v2 import IncrementalSync
-    INCREMENTAL_SYNC_AVAILABLE = True
-except ImportError as e:
-    INCREMENTAL_SYNC_AVAILABLE = False
-    print(f"[WARN]增量同步模块未加载: {e}")
+
+
+def load_incremental_sync_class():
+    """按需导入 incremental_sync_v2.IncrementalSync，模块不可用时返回 None"""
+    try:
+        from incremental_sync_v2 import IncrementalSync
+        return IncrementalSync
+    except ImportError as e:
+        logger.warning(f"增量同步模块未加载: {e}")
+        return None
 
 
 def load_config_from_ini(config_file=CONFIG_FILE_PATH):
@@ -86,21 +118,34 @@ def load_config_from_ini(config_file=CONFIG_FILE_PATH):
         cfg['LOG_LEVEL'] = config.get('app', 'log_level', fallback='INFO')
         cfg['HEADLESS_MODE'] = config.getboolean('app', 'headless_mode', fallback=False)
         cfg['DEBUG_MODE'] = config.getboolean('app', 'debug_mode', fallback=False)
+        cfg['PERSIST_BROWSER_SESSION'] = config.getboolean('app', 'persist_browser_session', fallback=False)
+        cfg['BROWSER_PROFILE_DIR'] = config.get('app', 'browser_profile_dir', fallback='./browser_profile').strip() or './browser_profile'
+        cfg['DAEMON_ENABLE'] = config.getboolean('daemon', 'enable', fallback=False)
+        cfg['DAEMON_INTERVAL_MINUTES'] = max(1, config.getint('daemon', 'interval_minutes', fallback=30))
+        cfg['DAEMON_CRON'] = config.get('daemon', 'cron', fallback='').strip()
         cfg['ONELAP_ACCOUNT'] = config.get('onelap', 'username', fallback='')
         cfg['ONELAP_PASSWORD'] = config.get('onelap', 'password', fallback='')
         cfg['XOSS_ACCOUNT'] = config.get('xoss', 'username', fallback='')
         cfg['XOSS_PASSWORD'] = config.get('xoss', 'password', fallback='')
         cfg['XOSS_ENABLE_SYNC'] = config.getboolean('xoss', 'enable_sync', fallback=True)
+        cfg['XOSS_DIRECT_UPLOAD'] = config.getboolean('xoss', 'direct_upload', fallback=False)
+        cfg['XOSS_UPLOAD_WORKERS'] = config.getint('xoss', 'upload_workers', fallback=3)
         cfg['GIANT_ACCOUNT'] = config.get('giant', 'username', fallback='')
         cfg['GIANT_PASSWORD'] = config.get('giant', 'password', fallback='')
         cfg['GIANT_ENABLE_SYNC'] = config.getboolean('giant', 'enable_sync', fallback=False)
+        cfg['GIANT_DIRECT_UPLOAD'] = config.getboolean('giant', 'direct_upload', fallback=False)
+        cfg['GIANT_UPLOAD_WORKERS'] = config.getint('giant', 'upload_workers', fallback=3)
         cfg['IGPSPORT_ACCOUNT'] = config.get('igpsport', 'username', fallback='')
         cfg['IGPSPORT_PASSWORD'] = config.get('igpsport', 'password', fallback='')
         cfg['IGPSPORT_ENABLE_SYNC'] = config.getboolean('igpsport', 'enable_sync', fallback=False)
+        cfg['IGPSPORT_DIRECT_UPLOAD'] = config.getboolean('igpsport', 'direct_upload', fallback=False)
+        cfg['IGPSPORT_UPLOAD_WORKERS'] = config.getint('igpsport', 'upload_workers', fallback=3)
+        cfg['IGPSPORT_LISTEN_UPLOAD_API'] = config.getboolean('igpsport', 'listen_upload_api', fallback=False)
         cfg['GARMIN_ACCOUNT'] = config.get('garmin', 'username', fallback='')
         cfg['GARMIN_PASSWORD'] = config.get('garmin', 'password', fallback='')
         cfg['GARMIN_ENABLE_SYNC'] = config.getboolean('garmin', 'enable_sync', fallback=False)
         cfg['GARMIN_MAX_UPLOAD_FILES'] = config.getint('garmin', 'max_upload_files', fallback=0)
+        cfg['GARMIN_DIRECT_API'] = config.getboolean('garmin', 'direct_api', fallback=True)
         cfg['STRAVA_ENABLE_SYNC'] = config.getboolean('strava', 'enable_sync', fallback=False)
         cfg['STRAVA_CLIENT_ID'] = config.get('strava', 'client_id', fallback='').strip()
         cfg['STRAVA_CLIENT_SECRET'] = config.get('strava', 'client_secret', fallback='').strip()
@@ -118,6 +163,7 @@ def load_config_from_ini(config_file=CONFIG_FILE_PATH):
         
         cfg['MAX_FILE_SIZE'] = config.getint('sync', 'max_file_size_mb', fallback=50) * 1024 * 1024
         cfg['MAX_FILES_PER_BATCH'] = config.getint('sync', 'max_files_per_batch', fallback=5)
+        cfg['ADAPTIVE_BATCH_SIZE'] = config.getboolean('sync', 'adaptive_batch_size', fallback=True)
         cfg['ONELAP_FULL_SYNC'] = config.getboolean('sync', 'onelap_full_sync', fallback=False)
         
         # ===== 新增：iGPSport → OneLap 反向增量同步配置 =====
@@ -125,6 +171,11 @@ def load_config_from_ini(config_file=CONFIG_FILE_PATH):
         cfg['IGPSPORT_TO_ONELAP_ENABLE'] = config.getboolean('igpsport_to_onelap', 'enable', fallback=False)
         cfg['IGPSPORT_TO_ONELAP_MODE'] = config.get('igpsport_to_onelap', 'mode', fallback='auto')
         cfg['IGPSPORT_TO_ONELAP_STRATEGY'] = config.get('igpsport_to_onelap', 'strategy', fallback='time_based')
+
+        # Prometheus 指标导出（textfile collector 文件 / HTTP 接口）
+        cfg['METRICS_TEXTFILE'] = config.get('metrics', 'textfile_path', fallback='').strip()
+        cfg['METRICS_HTTP_PORT'] = config.getint('metrics', 'http_port', fallback=0)
+        cfg['METRICS_INSTANCE'] = config.get('metrics', 'instance', fallback='').strip()
         
         return cfg
     except Exception as e:
@@ -140,21 +191,34 @@ if ini_config:
     LOG_LEVEL = ini_config['LOG_LEVEL']
     HEADLESS_MODE = ini_config['HEADLESS_MODE']
     DEBUG_MODE = ini_config['DEBUG_MODE']
+    PERSIST_BROWSER_SESSION = ini_config.get('PERSIST_BROWSER_SESSION', False)
+    BROWSER_PROFILE_DIR = ini_config.get('BROWSER_PROFILE_DIR', './browser_profile')
+    DAEMON_ENABLE = ini_config.get('DAEMON_ENABLE', False)
+    DAEMON_INTERVAL_MINUTES = ini_config.get('DAEMON_INTERVAL_MINUTES', 30)
+    DAEMON_CRON = ini_config.get('DAEMON_CRON', '')
     ONELAP_ACCOUNT = ini_config['ONELAP_ACCOUNT']
     ONELAP_PASSWORD = ini_config['ONELAP_PASSWORD']
     XOSS_ACCOUNT = ini_config['XOSS_ACCOUNT']
     XOSS_PASSWORD = ini_config['XOSS_PASSWORD']
     XOSS_ENABLE_SYNC = ini_config.get('XOSS_ENABLE_SYNC', True)
+    XOSS_DIRECT_UPLOAD = ini_config.get('XOSS_DIRECT_UPLOAD', False)
+    XOSS_UPLOAD_WORKERS = ini_config.get('XOSS_UPLOAD_WORKERS', 3)
     GIANT_ACCOUNT = ini_config['GIANT_ACCOUNT']
     GIANT_PASSWORD = ini_config['GIANT_PASSWORD']
     GIANT_ENABLE_SYNC = ini_config['GIANT_ENABLE_SYNC']
+    GIANT_DIRECT_UPLOAD = ini_config.get('GIANT_DIRECT_UPLOAD', False)
+    GIANT_UPLOAD_WORKERS = ini_config.get('GIANT_UPLOAD_WORKERS', 3)
     IGPSPORT_ACCOUNT = ini_config['IGPSPORT_ACCOUNT']
     IGPSPORT_PASSWORD = ini_config['IGPSPORT_PASSWORD']
     IGPSPORT_ENABLE_SYNC = ini_config['IGPSPORT_ENABLE_SYNC']
+    IGPSPORT_DIRECT_UPLOAD = ini_config.get('IGPSPORT_DIRECT_UPLOAD', False)
+    IGPSPORT_UPLOAD_WORKERS = ini_config.get('IGPSPORT_UPLOAD_WORKERS', 3)
+    IGPSPORT_LISTEN_UPLOAD_API = ini_config.get('IGPSPORT_LISTEN_UPLOAD_API', False)
     GARMIN_ACCOUNT = ini_config['GARMIN_ACCOUNT']
     GARMIN_PASSWORD = ini_config['GARMIN_PASSWORD']
     GARMIN_ENABLE_SYNC = ini_config['GARMIN_ENABLE_SYNC']
     GARMIN_MAX_UPLOAD_FILES = ini_config.get('GARMIN_MAX_UPLOAD_FILES', 0)
+    GARMIN_DIRECT_API = ini_config.get('GARMIN_DIRECT_API', True)
     STRAVA_ENABLE_SYNC = ini_config.get('STRAVA_ENABLE_SYNC', False)
     STRAVA_CLIENT_ID = ini_config.get('STRAVA_CLIENT_ID', '')
     STRAVA_CLIENT_SECRET = ini_config.get('STRAVA_CLIENT_SECRET', '')
@@ -169,12 +233,16 @@ if ini_config:
     SUPPORTED_FORMATS = ini_config['SUPPORTED_FORMATS']
     MAX_FILE_SIZE = ini_config['MAX_FILE_SIZE']
     MAX_FILES_PER_BATCH = ini_config['MAX_FILES_PER_BATCH']
+    ADAPTIVE_BATCH_SIZE = ini_config.get('ADAPTIVE_BATCH_SIZE', True)
     ONELAP_FULL_SYNC = ini_config.get('ONELAP_FULL_SYNC', False)
     
     # ===== 新增：读取 iGPSport → OneLap 反向增量同步配置 =====
     IGPSPORT_TO_ONELAP_ENABLE = ini_config.get('IGPSPORT_TO_ONELAP_ENABLE', False)
     IGPSPORT_TO_ONELAP_MODE = ini_config.get('IGPSPORT_TO_ONELAP_MODE', 'auto')
     IGPSPORT_TO_ONELAP_STRATEGY = ini_config.get('IGPSPORT_TO_ONELAP_STRATEGY', 'time_based')
+    METRICS_TEXTFILE = ini_config.get('METRICS_TEXTFILE', '')
+    METRICS_HTTP_PORT = ini_config.get('METRICS_HTTP_PORT', 0)
+    METRICS_INSTANCE = ini_config.get('METRICS_INSTANCE', '')
     
     # 配置验证提示
     if ONELAP_ACCOUNT in ['139xxxxxx', '']:
@@ -205,21 +273,34 @@ else:
     LOG_LEVEL = 'INFO'
     HEADLESS_MODE = False
     DEBUG_MODE = False
+    PERSIST_BROWSER_SESSION = False
+    BROWSER_PROFILE_DIR = './browser_profile'
+    DAEMON_ENABLE = False
+    DAEMON_INTERVAL_MINUTES = 30
+    DAEMON_CRON = ''
     ONELAP_ACCOUNT = ''
     ONELAP_PASSWORD = ''
     XOSS_ACCOUNT = ''
     XOSS_PASSWORD = ''
     XOSS_ENABLE_SYNC = True
+    XOSS_DIRECT_UPLOAD = False
+    XOSS_UPLOAD_WORKERS = 3
     GIANT_ACCOUNT = ''
     GIANT_PASSWORD = ''
     GIANT_ENABLE_SYNC = False
+    GIANT_DIRECT_UPLOAD = False
+    GIANT_UPLOAD_WORKERS = 3
     IGPSPORT_ACCOUNT = ''
     IGPSPORT_PASSWORD = ''
     IGPSPORT_ENABLE_SYNC = False
+    IGPSPORT_DIRECT_UPLOAD = False
+    IGPSPORT_UPLOAD_WORKERS = 3
+    IGPSPORT_LISTEN_UPLOAD_API = False
     GARMIN_ACCOUNT = ''
     GARMIN_PASSWORD = ''
     GARMIN_ENABLE_SYNC = False
     GARMIN_MAX_UPLOAD_FILES = 0
+    GARMIN_DIRECT_API = True
     STRAVA_ENABLE_SYNC = False
     STRAVA_CLIENT_ID = ''
     STRAVA_CLIENT_SECRET = ''
@@ -234,12 +315,21 @@ else:
     SUPPORTED_FORMATS = ['.fit', '.gpx', '.tcx']
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
     MAX_FILES_PER_BATCH = 5
+    ADAPTIVE_BATCH_SIZE = True
     ONELAP_FULL_SYNC = False
     
     # ===== 新增：iGPSport → OneLap 反向增量同步默认配置 =====
     IGPSPORT_TO_ONELAP_ENABLE = False      # 默认禁用反向同步
     IGPSPORT_TO_ONELAP_MODE = 'auto'       # 默认使用增量模式
     IGPSPORT_TO_ONELAP_STRATEGY = 'time_based'  # 默认基于时间戳比对
+    METRICS_TEXTFILE = ''
+    METRICS_HTTP_PORT = 0
+    METRICS_INSTANCE = ''
+
+# 守护模式：settings.ini 的 [daemon] enable 或命令行 --daemon 均可开启，main() 按传入的 argv 重新确定
+DAEMON_MODE = DAEMON_ENABLE
+# 持久化浏览器目录或守护模式复用同一浏览器时，先探测已有登录态再决定是否重新登录
+PROBE_EXISTING_LOGIN = PERSIST_BROWSER_SESSION or DAEMON_MODE
 
 # 配置日志
 logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO), 
@@ -251,46 +341,270 @@ import platform
 logger.info(f"当前操作系统: {platform.system()} {platform.release()}")
 logger.info(f"文件存储目录: {STORAGE_DIR}")
 logger.info(f"无头模式: {'启用' if HEADLESS_MODE else '禁用'}")
+logger.info(f"浏览器会话持久化: {'启用 (' + os.path.abspath(BROWSER_PROFILE_DIR) + ')' if PERSIST_BROWSER_SESSION else '禁用（匿名模式）'}")
 logger.info("程序初始化完成")
 
-# 标记独立命令模式；真正执行放到 run_strava_auth_flow 定义之后，但仍早于主同步流程
-STRAVA_AUTH_MODE = '--strava-auth' in sys.argv
 STRAVA_TOKEN_REFRESH_MARGIN = 3600
 
 
 # 定义函数
+# 日期分隔符直接写进字符类（- / . 年 月，"日"视同空白），不再对整页文本做归一化替换；
+# 三个模式共用日期前缀、预编译并带分组，匹配结果直接构造 datetime，不再逐个 strptime
+DATE_TEXT_PATTERN_SOURCE = r'(20\d{2})[-/.年月](\d{1,2})[-/.年月](\d{1,2})'
+DATE_TEXT_PATTERN = re.compile(DATE_TEXT_PATTERN_SOURCE)
+DATETIME_MINUTES_TEXT_PATTERN = re.compile(DATE_TEXT_PATTERN_SOURCE + r'[\s日]+(\d{1,2}):(\d{2})')
+DATETIME_SECONDS_TEXT_PATTERN = re.compile(DATE_TEXT_PATTERN_SOURCE + r'[\s日]+(\d{1,2}):(\d{2}):(\d{2})')
+
+
+@lru_cache(maxsize=128)
+def extract_datetimes_tuple(text):
+    """顺序：先全部"年月日 时:分:秒"，再"年月日 时:分"，最后纯日期，按值去重；非法日期跳过"""
+    date_matches = DATE_TEXT_PATTERN.findall(text)
+    if not date_matches:
+        # 带时间的模式都以日期开头，日期都找不到时无需再扫
+        return ()
+
+    results = []
+    seen = set()
+    for matches in (
+        DATETIME_SECONDS_TEXT_PATTERN.findall(text),
+        DATETIME_MINUTES_TEXT_PATTERN.findall(text),
+        date_matches,
+    ):
+        for groups in matches:
+            try:
+                parsed = datetime(*map(int, groups))
+            except ValueError:
+                continue
+            if parsed not in seen:
+                seen.add(parsed)
+                results.append(parsed)
+    return tuple(results)
+
+
 def extract_datetimes_from_text(text):
     if not text:
         return []
+    return list(extract_datetimes_tuple(text))
+
+# 页面内一次性提取：整段逻辑在浏览器里执行，只把结果传回，避免逐元素读 .text 的 CDP 往返。
+# 结构化结果以 JSON 字符串返回：DrissionPage 对返回的数组/对象会逐项再发 CDP 请求取值
+DOM_ROWS_SCRIPT = """
+const rowSelector = arguments[0];
+const cellSelector = arguments[1];
+const limit = arguments[2];
+const rows = Array.from(document.querySelectorAll(rowSelector)).slice(0, limit);
+return JSON.stringify(rows.map(function (row) {
+    return {
+        text: (row.innerText || '').trim(),
+        cells: Array.from(row.querySelectorAll(cellSelector)).map(function (cell) {
+            return {
+                text: (cell.innerText || '').trim(),
+                className: typeof cell.className === 'string' ? cell.className : ''
+            };
+        })
+    };
+}));
+"""
+
+DOM_FIRST_TEXT_MATCH_SCRIPT = """
+const pattern = new RegExp(arguments[1]);
+const loosePattern = new RegExp(arguments[1].replace(/^\\^/, ''));
+const nodes = document.querySelectorAll(arguments[0]);
+for (let i = 0; i < nodes.length; i++) {
+    if (!loosePattern.test(nodes[i].textContent || '')) {
+        continue;
+    }
+    const match = (nodes[i].innerText || '').trim().match(pattern);
+    if (match) {
+        return match[0];
+    }
+}
+return null;
+"""
 
-    normalized = text.replace('\xa0', ' ').replace('/', '-').replace('.', '-')
-    normalized = normalized.replace('年', '-').replace('月', '-').replace('日', ' ')
-    normalized = re.sub(r'\s+', ' ', normalized).strip()
 
-    patterns = [
-        (r'20\d{2}-\d{1,2}-\d{1,2}\s+\d{1,2}:\d{2}:\d{2}', '%Y-%m-%d %H:%M:%S'),
-        (r'20\d{2}-\d{1,2}-\d{1,2}\s+\d{1,2}:\d{2}', '%Y-%m-%d %H:%M'),
-        (r'20\d{2}-\d{1,2}-\d{1,2}', '%Y-%m-%d')
-    ]
+def query_dom_rows(tab, row_selector, cell_selector='td', limit=50):
+    """一次 run_js 取回前 limit 个行元素的文本及其单元格文本/class；失败时返回空列表"""
+    try:
+        rows = json.loads(tab.run_js(DOM_ROWS_SCRIPT, row_selector, cell_selector, limit) or '[]')
+    except Exception as e:
+        logger.debug(f"页面行提取失败 ({row_selector}): {e}")
+        return []
+    return rows if isinstance(rows, list) else []
+
+
+def find_first_dom_text(tab, selector, pattern):
+    """一次 run_js 按文档顺序找第一个文本匹配 pattern（JS 正则）的元素，返回匹配到的那段文本"""
+    try:
+        return tab.run_js(DOM_FIRST_TEXT_MATCH_SCRIPT, selector, pattern)
+    except Exception as e:
+        logger.debug(f"页面文本提取失败 ({selector}): {e}")
+        return None
+
+
+# 按规则在页面内查找可点击元素：rules 按优先级排列，每条规则内按 tags 顺序、再按文档顺序查找，
+# 命中即返回元素本身（DrissionPage 会包装成 ChromiumElement）；mode 为 preview 时返回候选文本 JSON 供排查
+CLICKABLE_FINDER_SCRIPT = """
+const spec = JSON.parse(arguments[0]);
+const textCache = new Map();
+function textOf(el) {
+    if (!textCache.has(el)) {
+        textCache.set(el, (el.innerText || '').trim());
+    }
+    return textCache.get(el);
+}
+function isClickable(el, tag) {
+    const role = (el.getAttribute('role') || '').toLowerCase();
+    const className = (el.getAttribute('class') || '').toLowerCase();
+    return tag === 'button' || tag === 'a' || role === 'button' || className.indexOf('button') >= 0 || className.indexOf('btn') >= 0;
+}
+if (spec.mode === 'preview') {
+    const preview = [];
+    for (const tag of spec.tags) {
+        for (const el of document.getElementsByTagName(tag)) {
+            const text = textOf(el);
+            if (text) {
+                preview.push('tag:' + tag + ':' + text.slice(0, 30));
+                if (preview.length >= spec.limit) {
+                    return JSON.stringify(preview);
+                }
+            }
+        }
+    }
+    return JSON.stringify(preview);
+}
+for (const rule of spec.rules) {
+    const texts = rule.texts || [];
+    const keywords = (rule.keywords || []).map(function (keyword) { return keyword.toLowerCase(); });
+    for (const tag of spec.tags) {
+        for (const el of document.getElementsByTagName(tag)) {
+            const text = textOf(el);
+            if (!text) {
+                continue;
+            }
+            const lowered = text.toLowerCase();
+            const matched = texts.indexOf(text) >= 0 || keywords.some(function (keyword) { return lowered.indexOf(keyword) >= 0; });
+            if (!matched || (rule.clickable && !isClickable(el, tag))) {
+                continue;
+            }
+            return el;
+        }
+    }
+}
+return null;
+"""
+
+
+def find_clickable_by_text(tab, rules, tags=('button', 'a', 'div', 'span')):
+    """一次 run_js 按规则找出最先命中的元素，规则格式 {'texts': [...], 'keywords': [...], 'clickable': bool}"""
+    try:
+        return tab.run_js(CLICKABLE_FINDER_SCRIPT, json.dumps({'rules': rules, 'tags': list(tags)}, ensure_ascii=False))
+    except Exception as e:
+        logger.debug(f"页面按钮查找失败: {e}")
+        return None
+
+
+def preview_clickable_texts(tab, tags=('button', 'a', 'div', 'span'), limit=20):
+    """未找到按钮时用于日志：一次取回前 limit 个带文本元素的 "tag:标签:文本" """
+    try:
+        spec = {'mode': 'preview', 'tags': list(tags), 'limit': limit}
+        return json.loads(tab.run_js(CLICKABLE_FINDER_SCRIPT, json.dumps(spec, ensure_ascii=False)) or '[]')
+    except Exception as e:
+        logger.debug(f"页面候选文本提取失败: {e}")
+        return []
+
+
+def click_element(ele):
+    try:
+        ele.click(by_js=True)
+    except Exception:
+        ele.click()
+
+
+XOSS_TABLE_BOX_PATTERN = re.compile(
+    r'<(?P<tag>[a-zA-Z][\w-]*)\b[^>]*?(?<![\w-])class\s*=\s*(?P<quote>["\'])(?:(?!(?P=quote)).)*?(?<![\w-])table_box(?![\w-])',
+    re.IGNORECASE | re.DOTALL
+)
+HTML_COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.DOTALL)
+HTML_TABLE_ROW_PATTERN = re.compile(r'<tr\b[^>]*>(.*?)</tr\s*>', re.IGNORECASE | re.DOTALL)
+HTML_TABLE_CELL_PATTERN = re.compile(r'<td\b[^>]*>(.*?)</td\s*>', re.IGNORECASE | re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+
+def find_xoss_table_box_html(page_html):
+    """定位第一个 class 含 table_box 的元素，按同名标签嵌套深度截出其 HTML（不建整棵 DOM 树）"""
+    match = XOSS_TABLE_BOX_PATTERN.search(page_html)
+    if not match:
+        return None
+    tag = match.group('tag')
+    start = page_html.find('>', match.end())
+    if start < 0:
+        return None
+    depth = 1
+    for token in re.finditer(rf'<(/?){re.escape(tag)}\b[^>]*>', page_html[start + 1:], re.IGNORECASE):
+        if token.group(1):
+            depth -= 1
+            if depth == 0:
+                return page_html[start + 1:start + 1 + token.start()]
+        elif not token.group(0).endswith('/>'):
+            depth += 1
+    return page_html[start + 1:]
+
+
+def html_fragment_text(fragment):
+    """与 get_text(' ', strip=True) 一致：按标签切分、反转义、去空白后用空格拼接"""
+    parts = (html_unescape(part).strip() for part in HTML_TAG_PATTERN.split(fragment))
+    return ' '.join(part for part in parts if part)
+
+
+def pick_xoss_latest_activity_from_rows(rows):
+    """rows 为每行的单元格文本列表（表头行没有 td，为空列表），返回第一行带日期的记录"""
+    for cells in rows:
+        if not cells:
+            continue
+        row_text = ' '.join(cells).strip()
+        if not row_text:
+            continue
+        parsed_times = extract_datetimes_from_text(row_text)
+        if parsed_times:
+            first_time = parsed_times[0]
+            return {
+                'activity_date': first_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'time_obj': first_time,
+                'source_text': row_text
+            }
+    return None
+
+
+def parse_xoss_latest_activity_from_table_box(page_html):
+    """快速路径：只扫描 .table_box 里的 tr/td，取第一行带日期的记录；找不到时返回 None 交给完整解析"""
+    table_html = find_xoss_table_box_html(page_html)
+    if not table_html:
+        return None
+    table_html = HTML_COMMENT_PATTERN.sub('', table_html)
+    return pick_xoss_latest_activity_from_rows(
+        [html_fragment_text(cell) for cell in HTML_TABLE_CELL_PATTERN.findall(row_html)]
+        for row_html in HTML_TABLE_ROW_PATTERN.findall(table_html)
+    )
 
-    results = []
-    seen = set()
-    for pattern, fmt in patterns:
-        for match in re.findall(pattern, normalized):
-            try:
-                parsed = datetime.strptime(match, fmt)
-                key = parsed.strftime('%Y-%m-%d %H:%M:%S')
-                if key not in seen:
-                    seen.add(key)
-                    results.append(parsed)
-            except Exception:
-                continue
-    return results
 
 def parse_xoss_latest_activity_from_html(page_html):
     if not page_html:
         return None
 
+    parsed = parse_xoss_latest_activity_from_table_box(page_html)
+    if parsed:
+        return parsed
+    return parse_xoss_latest_activity_from_soup(page_html)
+
+
+def parse_xoss_latest_activity_from_soup(page_html):
+    """完整解析：BeautifulSoup 建树后依次尝试 .table_box、移动端卡片文本和通用列表选择器"""
+    from bs4 import BeautifulSoup
+    if not page_html:
+        return None
+
     soup = BeautifulSoup(page_html, 'html.parser')
     table_box = soup.select_one('.table_box')
     if table_box:
@@ -390,6 +704,7 @@ def parse_xoss_latest_activity_from_html(page_html):
         'source_text': latest_text
     }
 
+@timed('wait_xoss_activity_page_ready', metric='browser_wait_seconds')
 def wait_xoss_activity_page_ready(tab, timeout=12):
     end_time = time.time() + timeout
     while time.time() < end_time:
@@ -476,6 +791,7 @@ def click_xoss_login_button(tab):
 
     return None
 
+@timed('wait_xoss_login_success', metric='browser_wait_seconds')
 def wait_xoss_login_success(tab, timeout=12):
     end_time = time.time() + timeout
     while time.time() < end_time:
@@ -491,6 +807,53 @@ def wait_xoss_login_success(tab, timeout=12):
         time.sleep(1)
     return False
 
+def is_xoss_logged_in(tab, timeout=8):
+    """访问行者活动列表页，未被重定向到登录页即视为仍处于登录态"""
+    try:
+        tab.get('https://www.imxingzhe.com/workouts/list')
+        end = time.time() + timeout
+        while time.time() < end:
+            if is_xoss_login_page(tab):
+                return False
+            if 'workouts' in (tab.url or '').lower():
+                return True
+            time.sleep(1)
+    except Exception as e:
+        logger.debug(f"行者登录态探测失败: {e}")
+    return False
+
+@timed('xoss_login')
+def login_xoss_browser(tab, account, password):
+    """使用浏览器登录行者平台，返回是否检测到登录成功"""
+    if PROBE_EXISTING_LOGIN and is_xoss_logged_in(tab):
+        logger.info("检测到行者已登录态，跳过登录表单")
+        return True
+
+    logger.info("[DEBUG] 准备打开行者登录页")
+    tab.get('https://www.imxingzhe.com/login')
+    logger.info(f"[DEBUG] 行者登录页已打开，当前URL: {tab.url}")
+
+    # 点击“我已阅读并同意”
+    try:
+        checkbox = tab.ele('.van-checkbox', timeout=1)
+        if checkbox: checkbox.click()
+    except: pass
+
+    # 输入账号
+    tab.ele('@name=account').clear()
+    tab.ele('@name=account').input(account)
+    tab.ele('@name=password').clear()
+    tab.ele('@name=password').input(password)
+
+    # 点击登录
+    clicked_selector = click_xoss_login_button(tab)
+    logger.info(f"[DEBUG] 行者登录按钮点击方式: {clicked_selector}")
+
+    login_ok = wait_xoss_login_success(tab, timeout=12)
+    logger.info(f"[DEBUG] 行者提交登录后URL: {tab.url}, 标题: {tab.title}, login_success={login_ok}")
+    return login_ok
+
+@timed('xoss_latest_activity')
 def get_xoss_latest_activity_from_logged_in_tab(tab):
     try:
         tab.get('https://www.imxingzhe.com/workouts/list')
@@ -498,6 +861,12 @@ def get_xoss_latest_activity_from_logged_in_tab(tab):
         wait_xoss_activity_page_ready(tab, timeout=20)
 
         for attempt in range(4):
+            rows = query_dom_rows(tab, '.table_box tr')
+            parsed = pick_xoss_latest_activity_from_rows(
+                [' '.join(cell['text'].split()) for cell in row.get('cells') or []] for row in rows
+            )
+            if parsed:
+                return parsed
             page_html = tab.html or ''
             parsed = parse_xoss_latest_activity_from_html(page_html)
             if parsed:
@@ -510,8 +879,32 @@ def get_xoss_latest_activity_from_logged_in_tab(tab):
         logger.warning(f"[DEBUG] 行者当前页面基准提取失败: {e}")
         return None
 
+@timed('xoss_api_upload')
+def upload_files_to_xoss_api(tab, valid_files):
+    """
+    复用已登录标签页的 cookies，直接向行者上传接口提交 FIT 文件
+    返回仍需走页面上传的文件列表（没有 cookies、接口不可用或单个文件失败）
+    """
+    logger.info("===== 开始通过接口直传文件到行者 =====")
+    session = build_browser_cookie_session(tab, 'imxingzhe', XOSS_UPLOAD_PAGE_URL)
+    if session is None:
+        logger.warning("未读取到行者 cookies，回退页面上传")
+        return list(valid_files)
+
+    csrf_token = session.cookies.get('csrftoken')
+    if csrf_token:
+        session.headers['X-CSRFToken'] = csrf_token
+    try:
+        results = upload_files_with_session(session, XOSS_UPLOAD_API, valid_files, 'file', 'xoss_upload',
+                                            max_workers=XOSS_UPLOAD_WORKERS)
+    finally:
+        session.close()
+    return collect_pending_upload_files('xoss', '行者', valid_files, results)
+
+
 def create_retry_session():
     """创建带重试机制的会话"""
+    import requests
     logger.debug("创建带重试机制的会话")
     session = requests.Session()
     retry = requests.adapters.Retry(
@@ -525,11 +918,152 @@ def create_retry_session():
     return session
 
 
+def build_browser_cookie_session(tab, domain_keyword, referer):
+    """把已登录标签页中指定域名的 cookies 复制到带重试的 keep-alive 会话；没有 cookies 时返回 None"""
+    session = create_retry_session()
+    cookie_count = 0
+    try:
+        for cookie in tab.cookies(all_domains=True):
+            domain = cookie.get('domain') or ''
+            if domain_keyword not in domain:
+                continue
+            session.cookies.set(cookie['name'], cookie['value'], domain=domain)
+            cookie_count += 1
+    except Exception as e:
+        logger.warning(f"读取浏览器 cookies 失败: {e}")
+    if not cookie_count:
+        session.close()
+        return None
+
+    try:
+        user_agent = tab.user_agent or ONELAP_USER_AGENT
+    except Exception:
+        user_agent = ONELAP_USER_AGENT
+    apply_browser_headers(session, referer, user_agent)
+    return session
+
+
+def build_cookie_dict_session(cookies, referer):
+    """用登录函数返回的 {name: value} cookies 构建带重试的 keep-alive 会话；cookies 为空时返回 None"""
+    if not cookies:
+        return None
+    session = create_retry_session()
+    session.cookies.update(cookies)
+    apply_browser_headers(session, referer)
+    return session
+
+
+def apply_browser_headers(session, referer, user_agent=ONELAP_USER_AGENT):
+    session.headers.update({
+        'User-Agent': user_agent,
+        'Accept': 'application/json, text/plain, */*',
+        'Origin': f"{urlparse(referer).scheme}://{urlparse(referer).netloc}",
+        'Referer': referer,
+    })
+
+
+# 只认明确表示"文件已上传过"的说法；"user not exist"、"token not exist" 之类的错误不能当成重复
+UPLOAD_DUPLICATE_KEYWORDS = ('already exist', 'duplicate', '已存在', '重复')
+
+
+def is_duplicate_upload_message(message):
+    lowered = str(message or '').lower()
+    return any(keyword in lowered for keyword in UPLOAD_DUPLICATE_KEYWORDS)
+
+
+def classify_upload_response(response):
+    """按各平台常见的返回格式判断单个文件的上传结果，返回 (success/duplicate/failed/unsupported, 说明)"""
+    if response.status_code in (404, 405):
+        return 'unsupported', f"HTTP {response.status_code}"
+    try:
+        data = response.json()
+    except ValueError:
+        # 会话失效时常被重定向到登录页，返回 HTML
+        return 'failed', f"HTTP {response.status_code}: 非 JSON 返回"
+    return classify_upload_body(response.status_code, data)
+
+
+def classify_upload_body(status_code, data):
+    """按已解析的返回内容判断上传结果；接口直传和页面上传监听共用"""
+    if not isinstance(data, dict):
+        # 无法从返回内容确认上传结果，不能算作成功
+        return 'failed', f"HTTP {status_code}: 返回格式无法识别"
+
+    message = str(data.get('message') or data.get('msg') or data.get('error') or '')
+    if is_duplicate_upload_message(message):
+        return 'duplicate', message
+    if status_code >= 400:
+        return 'failed', message or f"HTTP {status_code}"
+    code = data.get('code', data.get('status'))
+    if data.get('success') is True or str(code).lower() in ('0', '200', 'success', 'ok'):
+        return 'success', ''
+    return 'failed', message or f"code={code}"
+
+
+def upload_files_with_session(session, url, file_paths, file_field, api, data=None, max_workers=3,
+                              parse_response=classify_upload_response):
+    """
+    用同一个会话并发提交 multipart 上传，返回 {文件名: (结果, 说明)}
+    任一文件返回 unsupported 后不再发起新的请求，未处理的文件不出现在结果中
+    """
+    results = {}
+    unsupported = []
+
+    def upload_one(file_path):
+        if unsupported:
+            return
+        filename = os.path.basename(file_path)
+        try:
+            with open(file_path, 'rb') as f:
+                response = session.post(url, data=data or {}, files={file_field: (filename, f, 'application/octet-stream')},
+                                        timeout=120, hooks={'response': http_metrics_hook(api)})
+            status, message = parse_response(response)
+        except Exception as e:
+            status, message = 'failed', str(e)
+        if status == 'unsupported':
+            unsupported.append(file_path)
+        results[filename] = (status, message)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers or 1))) as executor:
+        list(executor.map(upload_one, file_paths))
+    return results
+
+
+def collect_pending_upload_files(platform, label, valid_files, results):
+    """记录接口直传的逐文件结果，返回未被平台接受、需要回退浏览器上传的文件"""
+    remaining = []
+    for file_path in valid_files:
+        filename = os.path.basename(file_path)
+        status, message = results.get(filename, ('skipped', ''))
+        if status in ('success', 'duplicate'):
+            incr('upload_file_results', platform=platform, result=status)
+            logger.info(f"[{label}] 接口上传: {filename} -> {status}{f' ({message})' if message else ''}")
+            continue
+        if status == 'failed':
+            incr('upload_file_results', platform=platform, result=status)
+            logger.warning(f"[{label}] 接口上传失败: {filename} ({message})，稍后回退浏览器上传")
+        elif status == 'unsupported':
+            logger.warning(f"[{label}] 上传接口不可用({message})，剩余文件回退浏览器上传")
+        remaining.append(file_path)
+
+    logger.info(f"{label} 接口直传完成: 成功 {len(valid_files) - len(remaining)} 个，需浏览器补传 {len(remaining)} 个")
+    return remaining
+
+
+
+@timed('onelap_login')
 def login_onelap_browser(tab, account, password):
     """使用现有浏览器标签页登录顽鹿账号，并返回 token/cookies 上下文"""
     logger.info("使用浏览器登录顽鹿账号")
 
     try:
+        if PROBE_EXISTING_LOGIN and is_onelap_logged_in(tab):
+            auth_context = get_onelap_auth_context(tab)
+            if auth_context.get('token') and check_onelap_token_valid(auth_context):
+                logger.info(f"检测到顽鹿已登录态，跳过登录表单，token长度: {len(auth_context['token'])}")
+                return auth_context
+            logger.info("顽鹿本地登录态已失效，重新登录")
+
         logger.info("正在访问顽鹿登录页面...")
         tab.get(f'{ONELAP_BASE_APP_URL}/login')
         time.sleep(3)
@@ -637,6 +1171,26 @@ def generate_onelap_sign_headers(params):
     return {'nonce': nonce, 'timestamp': timestamp, 'sign': sign}
 
 
+def is_onelap_logged_in(tab, timeout=8):
+    """判断浏览器中是否仍保留顽鹿登录态（localStorage token 按域隔离，需先回到 u.onelap.cn）"""
+    try:
+        current_url = tab.url or ''
+        if 'u.onelap.cn' not in current_url or '/login' in current_url:
+            tab.get(ONELAP_RECORD_PAGE_URL)
+        end = time.time() + timeout
+        while time.time() < end:
+            current_url = tab.url or ''
+            if '/login' in current_url or 'login.html' in current_url:
+                return False
+            if tab.run_js("return localStorage.getItem('token');"):
+                return True
+            time.sleep(1)
+    except Exception as e:
+        logger.debug(f"顽鹿登录态探测失败: {e}")
+    return False
+
+
+@timed('wait_for_onelap_login_result', metric='browser_wait_seconds')
 def wait_for_onelap_login_result(tab, timeout=90):
     end = time.time() + timeout
     while time.time() < end:
@@ -702,57 +1256,26 @@ def build_onelap_api_session(token, cookies_dict, session=None):
     return session
 
 
-def get_onelap_record_id(activity):
-    return str(activity.get('_id') or activity.get('id') or activity.get('record_id') or '').strip()
-
-
-def parse_onelap_activity_time(activity):
-    candidates = []
-    if isinstance(activity, dict):
-        candidates.extend([
-            activity.get('activity_time'),
-            activity.get('start_riding_time'),
-            activity.get('startTime'),
-            activity.get('created_at'),
-            activity.get('updated_at'),
-            activity.get('date'),
-        ])
-
-    def parse_candidate(value):
-        if isinstance(value, int):
-            if value <= 0:
-                return None
-            timestamp = value / 1000 if value > 10**11 else value
-            dt = datetime.fromtimestamp(timestamp)
-            return dt if dt.year >= 2000 else None
-        if isinstance(value, float):
-            if value <= 0:
-                return None
-            timestamp = value / 1000 if value > 10**11 else value
-            dt = datetime.fromtimestamp(timestamp)
-            return dt if dt.year >= 2000 else None
-        if isinstance(value, str):
-            text = value.strip()
-            if not text:
-                return None
-            for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
-                try:
-                    dt = datetime.strptime(text, fmt)
-                    return dt if dt.year >= 2000 else None
-                except Exception:
-                    pass
-            try:
-                dt = datetime.fromisoformat(text.replace('Z', '+00:00')).replace(tzinfo=None)
-                return dt if dt.year >= 2000 else None
-            except Exception:
-                return None
-        return None
+def check_onelap_token_valid(auth_context):
+    """用一次最小分页请求确认 token 仍被服务端接受"""
+    session = build_onelap_api_session(
+        (auth_context or {}).get('token', ''),
+        (auth_context or {}).get('cookies', {}),
+    )
+    try:
+        payload = {'page': 1, 'limit': 1}
+        response = session.post(ONELAP_LIST_API, json=payload, headers=generate_onelap_sign_headers(payload), timeout=15,
+                                hooks={'response': http_metrics_hook('onelap_token_check')})
+        if response.status_code != 200:
+            return False
+        data = response.json()
+        return isinstance(data, dict) and isinstance(data.get('data'), dict)
+    except Exception as e:
+        logger.debug(f"顽鹿 token 校验失败: {e}")
+        return False
+    finally:
+        session.close()
 
-    for candidate in candidates:
-        parsed = parse_candidate(candidate)
-        if parsed:
-            return parsed
-    return None
 
 def parse_activity_time_from_filename(filename):
     """从 OneLap/FIT 文件名中提取活动开始时间，用于旧下载状态缺少时间时排序。"""
@@ -807,93 +1330,140 @@ def save_onelap_download_state(state, state_file=ONELAP_DOWNLOAD_STATE_FILE):
         logger.warning(f'[OneLap] 保存下载状态失败: {e}')
 
 
-def update_onelap_download_state(state, record_id, activity, filename, fit_url, downloaded=True):
+def update_onelap_download_state(state, record_id, activity, filename, fit_url, downloaded=True, sha256='', error=''):
+    """activity 为 ActivityRecord；下载失败时 downloaded=False 并在 error 中记录原因"""
     if not record_id:
         return
-    activity_time = parse_onelap_activity_time(activity)
     state[record_id] = {
         'downloaded': downloaded,
         'filename': filename or '',
         'fitUrl': fit_url or '',
-        'activity_time': activity_time.strftime('%Y-%m-%d %H:%M:%S') if activity_time else '',
-        'created_at': activity.get('created_at'),
+        'activity_time': activity.start_time_text,
         'downloaded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S') if downloaded else '',
-        'name': str(activity.get('name') or ''),
+        'name': activity.name,
     }
+    if sha256:
+        state[record_id]['sha256'] = sha256
+    if error:
+        state[record_id]['error'] = error
 
 
 def extract_onelap_fit_key(detail_data, record):
-    candidates = []
-
-    def add_candidate(value, priority):
-        if value is None:
-            return
-        value = str(value).strip()
-        if value:
-            candidates.append((priority, value))
-
-    def walk(value):
-        if isinstance(value, dict):
-            for key, item in value.items():
-                key_lower = str(key).lower()
-                if key_lower in {'fiturl', 'fit_url'}:
-                    add_candidate(item, 0)
-                elif key_lower in {'fit', 'fitkey', 'filekey', 'file_key'}:
-                    add_candidate(item, 1)
-                elif key_lower in {'url', 'path'}:
-                    add_candidate(item, 2)
-                walk(item)
-        elif isinstance(value, list):
-            for item in value:
-                walk(item)
-
-    walk(record)
-    walk(detail_data)
-
-    seen = set()
-    for _, value in sorted(candidates, key=lambda item: item[0]):
-        if value in seen:
-            continue
-        seen.add(value)
-        return value
-    return ''
+    return find_onelap_fit_key(record, detail_data)
 
 
-def build_onelap_fit_download_candidates(fit_url):
+def build_onelap_fit_download_candidates(fit_url, preferred_form=''):
+    """
+    返回 [(形式, 下载参数源)]，形式为 raw/unquoted/path/basename；
+    preferred_form 是之前下载成功过的形式，排在最前面先尝试
+    """
     candidates = []
     seen = set()
 
-    def add_candidate(value):
+    def add_candidate(form, value):
         if value is None:
             return
         value = str(value).strip()
         if not value or value in seen:
             return
         seen.add(value)
-        candidates.append(value)
+        candidates.append((form, value))
 
-    add_candidate(fit_url)
-    add_candidate(unquote(fit_url))
+    add_candidate('raw', fit_url)
+    add_candidate('unquoted', unquote(fit_url))
 
     if fit_url.startswith('http://') or fit_url.startswith('https://'):
         parsed = urlparse(fit_url)
-        add_candidate(parsed.path)
+        add_candidate('path', parsed.path)
         if parsed.path:
-            add_candidate(parsed.path.rsplit('/', 1)[-1])
+            add_candidate('basename', parsed.path.rsplit('/', 1)[-1])
     elif '/' in fit_url:
-        add_candidate(fit_url.rsplit('/', 1)[-1])
+        add_candidate('basename', fit_url.rsplit('/', 1)[-1])
 
+    if preferred_form:
+        candidates.sort(key=lambda item: item[0] != preferred_form)
     return candidates
 
 
+def load_onelap_detail_cache(cache_file=ONELAP_DETAIL_CACHE_FILE):
+    """
+    读取活动详情缓存：records 按 record_id 记录已解析出的 fitUrl 和下载成功的参数形式，
+    preferred_form 是最近一次下载成功的形式，新活动优先尝试
+    """
+    cache = {}
+    try:
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    cache = data
+    except Exception as e:
+        logger.warning(f'[OneLap] 读取详情缓存失败: {e}')
+    if not isinstance(cache.get('records'), dict):
+        cache['records'] = {}
+    return cache
+
+
+def save_onelap_detail_cache(cache, cache_file=ONELAP_DETAIL_CACHE_FILE):
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.warning(f'[OneLap] 保存详情缓存失败: {e}')
+
+
+def update_onelap_detail_cache(cache, record_id, fit_url, form):
+    cache['records'][record_id] = {
+        'fitUrl': fit_url,
+        'form': form,
+        'cached_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    cache['preferred_form'] = form
+    save_onelap_detail_cache(cache)
+
+
+def open_onelap_fit_stream(session, fit_url, preferred_form=''):
+    """按候选参数依次请求 fit_content，返回 (response, 形式, 参数源, 下载地址, 最后错误)，全部失败时 response 为 None"""
+    last_error = None
+    for form, fit_key_source in build_onelap_fit_download_candidates(fit_url, preferred_form):
+        fit_key = base64.b64encode(fit_key_source.encode('utf-8')).decode('ascii')
+        download_url = ONELAP_DOWNLOAD_API.format(fit_key=fit_key)
+        response = None
+        try:
+            response = session.get(download_url, timeout=60, stream=True,
+                                   hooks={'response': http_metrics_hook('onelap_download')})
+            response.raise_for_status()
+            return response, form, fit_key_source, download_url, None
+        except Exception as e:
+            last_error = e
+            logger.warning(f'[OneLap] 下载参数失败，尝试下一个候选: {fit_key_source} ({e})')
+            try:
+                if response is not None:
+                    response.close()
+            except Exception:
+                pass
+    return None, '', '', '', last_error
+
+
+@timed('onelap_detail')
 def fetch_onelap_record_detail(session, record_id):
-    response = session.get(ONELAP_DETAIL_API.format(record_id=record_id), timeout=30)
+    response = session.get(ONELAP_DETAIL_API.format(record_id=record_id), timeout=30,
+                           hooks={'response': http_metrics_hook('onelap_detail')})
     response.raise_for_status()
     return response.json()
 
 
-def fetch_activities(session, auth_context, latest_sync_activity):
-    """获取活动列表数据（新 OneLap API）"""
+def load_onelap_catalog(catalog_file=ONELAP_CATALOG_FILE):
+    return OneLapCatalog(catalog_file)
+
+
+@timed('onelap_list')
+def fetch_activities(session, auth_context, latest_sync_activity, catalog=None):
+    """
+    获取活动列表数据（新 OneLap API），按时间倒序返回 ActivityRecord 列表
+    传入 catalog 时先增量同步本地活动目录（翻页到出现已知记录为止），再从目录中按时间索引筛选；
+    不传时只在内存中建目录，翻页到同步基准为止
+    """
     logger.info('获取活动列表数据')
 
     cookies_dict = (auth_context or {}).get('cookies') or {}
@@ -908,46 +1478,32 @@ def fetch_activities(session, auth_context, latest_sync_activity):
     if token:
         session.headers['Authorization'] = token
 
-    benchmark_time = latest_sync_activity.get('time_obj') if latest_sync_activity else None
-    page = 1
-    page_size = 20
-    collected = []
-
-    while True:
+    def fetch_page(page, page_size):
         payload = {'page': page, 'limit': page_size}
         headers = generate_onelap_sign_headers(payload)
-        response = session.post(ONELAP_LIST_API, json=payload, headers=headers, timeout=30)
+        response = session.post(ONELAP_LIST_API, json=payload, headers=headers, timeout=30,
+                                hooks={'response': http_metrics_hook('onelap_list')})
         response.raise_for_status()
         data = response.json()
         page_data = (data.get('data') or {}) if isinstance(data, dict) else {}
-        items = page_data.get('list') or []
-
-        if not items:
-            break
-
-        stop_paging = False
-        for activity in items:
-            if benchmark_time:
-                activity_time = parse_onelap_activity_time(activity)
-                if activity_time and activity_time <= benchmark_time:
-                    stop_paging = True
-                    continue
-            collected.append(activity)
-
-        logger.info(f'[OneLap] 第 {page} 页获取 {len(items)} 条，待处理累计 {len(collected)} 条')
-
-        total = int(page_data.get('total') or 0)
-        total_pages = int(page_data.get('pages') or 0)
-        if stop_paging:
-            logger.info('[OneLap] 已触及同步基准，停止继续翻页')
-            break
-        if total_pages and page >= total_pages:
-            break
-        if total and page * page_size >= total:
-            break
-        page += 1
-        time.sleep(0.2)
+        return page_data.get('list') or [], page_data
 
+    benchmark_time = latest_sync_activity.get('time_obj') if latest_sync_activity else None
+    # 下载状态中已成功下载的文件名补进目录，没有时间的活动据此判断是否还需要下载
+    if catalog is None:
+        catalog = OneLapCatalog()
+        catalog.sync(fetch_page, stop_time=benchmark_time)
+        catalog.merge_download_state(load_onelap_download_state())
+    else:
+        full = catalog.needs_full_sync()
+        if full:
+            logger.info('[OneLap] 本地活动目录需要完整同步，将翻完全部记录页')
+        added = catalog.sync(fetch_page, full=full)
+        catalog.merge_download_state(load_onelap_download_state())
+        catalog.save()
+        logger.info(f'[OneLap] 本地活动目录共 {len(catalog.records)} 条记录，本次新增 {len(added)} 条')
+
+    collected = catalog.newer_than(benchmark_time)
     if benchmark_time:
         logger.info(f'筛选到 {len(collected)} 个比基准时间更新的OneLap活动')
     else:
@@ -965,7 +1521,7 @@ def infer_onelap_filename(activity, response, record_id):
                 safe_name = re.sub(r'[<>:"/\\|?*]+', '_', filename).strip().strip('.')
                 return safe_name if safe_name.lower().endswith('.fit') else f'{safe_name}.fit'
 
-    name = activity.get('name') or activity.get('start_riding_time') or record_id or 'activity'
+    name = activity.name or activity.start_time_text or record_id or 'activity'
     safe_name = re.sub(r'[<>:"/\\|?*]+', '_', str(name)).strip().strip('.')
     return safe_name if safe_name.lower().endswith('.fit') else f'{safe_name}.fit'
 
@@ -974,11 +1530,100 @@ def ensure_storage_dir(directory):
     os.makedirs(directory, exist_ok=True)
 
 
-def download_fit_file(session, activity, state, storage_dir=STORAGE_DIR):
-    """下载单个 FIT 文件（新 OneLap API）"""
+CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+# 下载内容不是有效 FIT 时立即重新下载的总次数
+FIT_DOWNLOAD_ATTEMPTS = 3
+
+
+def get_identity_content_length(response):
+    """未压缩传输时返回 Content-Length，否则返回 None（压缩后的长度与写入文件的字节数不可比）"""
+    if (response.headers.get('Content-Encoding') or 'identity').lower() != 'identity':
+        return None
+    length = response.headers.get('Content-Length') or ''
+    return int(length) if length.isdigit() else None
+
+
+def save_response_resumable(session, response, part_path, final_path, api):
+    """
+    把流式响应写入 part_path，校验长度和 FIT 完整性后替换为 final_path，返回 (本次下载字节数, FIT 校验结果)
+    已有 .part 时改用 Range 请求从其末尾续传；服务器不返回 206 时从头下载。
+    传输中断时保留 .part 供下次续传，长度超出预期说明 .part 已损坏，删除后重新下载；
+    哈希和 CRC 在写盘的同一循环里计算，内容不是有效 FIT 时删除 .part 并抛出 FitIntegrityError
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    expected_total = get_identity_content_length(response)
+    mode = 'wb'
+    if offset and expected_total is not None and offset < expected_total:
+        url = response.url
+        response.close()
+        response = session.get(url, headers={'Range': f'bytes={offset}-'}, timeout=60, stream=True,
+                               hooks={'response': http_metrics_hook(api)})
+        if response.status_code == 416:
+            # .part 与服务器上的文件对不上，丢弃后从头下载
+            response.close()
+            os.remove(part_path)
+            response = session.get(url, timeout=60, stream=True, hooks={'response': http_metrics_hook(api)})
+        response.raise_for_status()
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get('Content-Range') or '')
+        if response.status_code == 206 and match and int(match.group(1)) == offset:
+            mode = 'ab'
+            if match.group(3) != '*':
+                expected_total = int(match.group(3))
+            logger.info(f'[下载] 从断点续传 {os.path.basename(final_path)}: 已有 {offset}/{expected_total} 字节')
+            incr('download_resumed', api=api)
+        else:
+            expected_total = get_identity_content_length(response)
+            logger.info(f'[下载] 服务器不支持断点续传，重新下载 {os.path.basename(final_path)}')
+    elif offset and offset == expected_total:
+        # 上次已完整写入 .part 但未来得及改名
+        response.close()
+        mode = None
+
+    validator = FitStreamValidator()
+    if mode != 'wb':
+        validator.update_from_file(part_path)
+    written = 0
+    try:
+        if mode:
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    if chunk:
+                        f.write(chunk)
+                        validator.update(chunk)
+                        written += len(chunk)
+    finally:
+        response.close()
+
+    size = os.path.getsize(part_path)
+    if expected_total is not None and size != expected_total:
+        if size > expected_total:
+            os.remove(part_path)
+        raise RuntimeError(f'下载长度不符: {size}/{expected_total} 字节')
+    if size <= 0:
+        os.remove(part_path)
+        raise RuntimeError('下载结果为空文件')
+    fit_info = validator.result()
+    if not fit_info['valid']:
+        os.remove(part_path)
+        raise FitIntegrityError(f"{os.path.basename(final_path)} 不是有效的 FIT 文件: {fit_info['error']}")
+    os.replace(part_path, final_path)
+    return written, fit_info
+
+
+@timed('onelap_download')
+def download_fit_file(session, activity, state, storage_dir=STORAGE_DIR, detail_cache=None):
+    """
+    下载单个 FIT 文件（新 OneLap API）
+    activity 为 ActivityRecord（原始字典会先转换）。
+    内容多次校验不通过或长度不符时在下载状态中记录失败原因并返回 None，不影响其他活动；
+    传入 detail_cache 时，缓存过 fitUrl 的活动跳过详情请求，直接用上次成功的参数形式请求 fit_content；
+    缓存的 fitUrl 全部下载失败时丢弃该条缓存，重新查询详情
+    """
     ensure_storage_dir(storage_dir)
 
-    record_id = get_onelap_record_id(activity)
+    if isinstance(activity, dict):
+        activity = ActivityRecord.from_onelap(activity)
+    record_id = activity.record_id
     if not record_id:
         logger.warning('[OneLap] 跳过无 record_id 的活动')
         return None
@@ -991,33 +1636,32 @@ def download_fit_file(session, activity, state, storage_dir=STORAGE_DIR):
             logger.info(f'[OneLap] 已在状态中标记且文件存在，跳过下载: {existing_name}')
             return existing_path
 
-    detail_data = fetch_onelap_record_detail(session, record_id)
-    fit_url = extract_onelap_fit_key(detail_data, activity)
-    if not fit_url:
-        raise RuntimeError(f'未找到活动 {record_id} 的 fitUrl')
-
     response = None
-    last_error = None
-    used_fit_key_source = ''
-    for fit_key_source in build_onelap_fit_download_candidates(fit_url):
-        fit_key = base64.b64encode(fit_key_source.encode('utf-8')).decode('ascii')
-        try:
-            response = session.get(ONELAP_DOWNLOAD_API.format(fit_key=fit_key), timeout=60, stream=True)
-            response.raise_for_status()
-            used_fit_key_source = fit_key_source
-            break
-        except Exception as e:
-            last_error = e
-            logger.warning(f'[OneLap] 下载参数失败，尝试下一个候选: {fit_key_source} ({e})')
-            try:
-                if response is not None:
-                    response.close()
-            except Exception:
-                pass
-            response = None
+    cached = (detail_cache or {}).get('records', {}).get(record_id) or {}
+    fit_url = cached.get('fitUrl') or ''
+    if fit_url:
+        incr('onelap_detail_cache', result='hit')
+        response, form, used_fit_key_source, download_url, last_error = open_onelap_fit_stream(
+            session, fit_url, cached.get('form') or '')
+        if response is None:
+            logger.warning(f'[OneLap] 缓存的 fitUrl 无法下载，重新查询活动详情: {record_id}')
+            detail_cache['records'].pop(record_id, None)
+
+    if response is None:
+        if detail_cache is not None:
+            incr('onelap_detail_cache', result='miss')
+        detail_data = fetch_onelap_record_detail(session, record_id)
+        fit_url = extract_onelap_fit_key(detail_data, {'fitUrl': activity.fit_url})
+        if not fit_url:
+            raise RuntimeError(f'未找到活动 {record_id} 的 fitUrl')
+        preferred_form = (detail_cache or {}).get('preferred_form') or ''
+        response, form, used_fit_key_source, download_url, last_error = open_onelap_fit_stream(
+            session, fit_url, preferred_form)
 
     if response is None:
         raise RuntimeError(f'活动 {record_id} 下载失败，fitUrl={fit_url}，最后错误: {last_error}')
+    if detail_cache is not None and (cached.get('fitUrl') != fit_url or cached.get('form') != form):
+        update_onelap_detail_cache(detail_cache, record_id, fit_url, form)
 
     filename = infer_onelap_filename(activity, response, record_id)
     final_path = os.path.join(storage_dir, filename)
@@ -1030,35 +1674,63 @@ def download_fit_file(session, activity, state, storage_dir=STORAGE_DIR):
         response.close()
         return final_path
 
-    if os.path.exists(part_path):
-        os.remove(part_path)
-
     logger.info(f'[OneLap] 开始下载: {filename}')
     logger.info(f'[OneLap] 使用下载参数源: {used_fit_key_source}')
-    try:
-        with open(part_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        os.replace(part_path, final_path)
-    except Exception:
-        if os.path.exists(part_path):
-            os.remove(part_path)
-        raise
-    finally:
-        response.close()
+    error = ''
+    for attempt in range(1, FIT_DOWNLOAD_ATTEMPTS + 1):
+        try:
+            downloaded_bytes, fit_info = save_response_resumable(session, response, part_path, final_path, 'onelap_download')
+            break
+        except FitIntegrityError as e:
+            incr('fit_integrity_failures', platform='onelap')
+            logger.warning(f'[OneLap] 下载内容校验失败(第{attempt}/{FIT_DOWNLOAD_ATTEMPTS}次): {e}')
+            if attempt == FIT_DOWNLOAD_ATTEMPTS:
+                error = str(e)
+                break
+            response = session.get(download_url, timeout=60, stream=True,
+                                   hooks={'response': http_metrics_hook('onelap_download')})
+            response.raise_for_status()
+        except RuntimeError as e:
+            # 长度不符或空文件：较短的 .part 已保留，下轮从断点续传
+            error = str(e)
+            break
 
-    update_onelap_download_state(state, record_id, activity, filename, fit_url, downloaded=True)
+    if error:
+        incr('onelap_fit_skipped')
+        logger.error(f'[OneLap] 活动 {record_id} 下载失败，本轮跳过该文件: {error}')
+        update_onelap_download_state(state, record_id, activity, filename, fit_url, downloaded=False, error=error)
+        save_onelap_download_state(state)
+        return None
+
+    incr('onelap_fit_bytes', downloaded_bytes)
+    incr('onelap_fit_files')
+    update_onelap_download_state(state, record_id, activity, filename, fit_url, downloaded=True, sha256=fit_info['sha256'])
     save_onelap_download_state(state)
     logger.info(f'[OneLap] 文件下载完成: {final_path}')
     return final_path
 
 
+def is_giant_logged_in(tab):
+    """访问捷安特历史列表页，未被重定向回 login.html 即视为仍处于登录态"""
+    try:
+        tab.get('https://ridelife.giant.com.cn/web/main_fit.html')
+        time.sleep(2)
+        current_url = tab.url or ''
+        return 'ridelife.giant.com.cn' in current_url and 'login.html' not in current_url
+    except Exception as e:
+        logger.debug(f"捷安特登录态探测失败: {e}")
+        return False
+
+@timed('giant_login')
 def login_giant_browser(tab, account, password):
     """使用现有浏览器标签页登录捷安特骑行平台"""
     logger.info("使用浏览器登录捷安特骑行平台")
     
     try:
+        if PROBE_EXISTING_LOGIN and is_giant_logged_in(tab):
+            logger.info("检测到捷安特已登录态，跳过登录表单")
+            return {cookie['name']: cookie['value'] for cookie in tab.cookies()}
+
         # 访问捷安特登录页面
         logger.info("正在访问捷安特登录页面...")
         tab.get('https://ridelife.giant.com.cn/web/login.html')
@@ -1188,6 +1860,7 @@ def login_giant_browser(tab, account, password):
         logger.error(f"捷安特浏览器登录失败: {e}")
         raise
 # 将文件分批处理
+@timed('giant_latest_activity')
 def get_latest_activity_giant(tab):
     """从Giant获取最新活动时间"""
     logger.info("正在从Giant获取最新活动记录...")
@@ -1198,21 +1871,11 @@ def get_latest_activity_giant(tab):
             time.sleep(3)
             
         # 查找列表中的第一条记录
-        # Giant页面通常是表格结构
-        first_row_date = None
-        
-        # 尝试查找日期元素，Giant列表页通常有日期列
-        # 这里假设日期元素包含 YYYY-MM-DD
-        elements = tab.eles('tag:div') # 宽泛搜索
-        for ele in elements:
-            text = ele.text
-            if text and re.match(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', text):
-                first_row_date = text
-                break
-            if text and re.match(r'\d{4}-\d{2}-\d{2}', text):
-                # 只有日期，默认为 00:00:00
-                first_row_date = text + " 00:00:00"
-                break
+        # Giant页面通常是表格结构，日期元素以 YYYY-MM-DD 开头；在页面内一次性找出第一个
+        first_row_date = find_first_dom_text(tab, 'div', r'^\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?')
+        if first_row_date and len(first_row_date) == 10:
+            # 只有日期，默认为 00:00:00
+            first_row_date += " 00:00:00"
         
         if first_row_date:
             latest_time = datetime.strptime(first_row_date, '%Y-%m-%d %H:%M:%S')
@@ -1244,6 +1907,7 @@ def is_garmin_logged_in(tab):
         pass
     return ('/app/import-data' in current_url) or ('/modern/' in current_url)
 
+@timed('wait_garmin_login_success', metric='browser_wait_seconds')
 def wait_garmin_login_success(tab, timeout=GARMIN_LOGIN_WAIT_SECONDS):
     """等待 Garmin 登录成功；验证码/二次验证可由用户在浏览器内手动完成"""
     end = time.time() + timeout
@@ -1324,6 +1988,86 @@ def parse_garmin_usage_indicators(data):
         }
     return None
 
+def log_garmin_latest_activity(parsed):
+    if parsed.get('source') == 'cycling':
+        logger.info(f"Garmin 最新骑行活动时间: {parsed['activity_date']}")
+    else:
+        logger.info(f"Garmin 未找到骑行活动，使用最新 {parsed.get('source')} 活动时间: {parsed['activity_date']}")
+
+_garmin_api_session = None
+
+def get_garmin_api_session(tab, refresh=False):
+    """从已登录的 Garmin 标签页提取一次 cookies，构建可复用的 requests 会话"""
+    global _garmin_api_session
+    if _garmin_api_session is not None and not refresh:
+        return _garmin_api_session
+    if _garmin_api_session is not None:
+        _garmin_api_session.close()
+        _garmin_api_session = None
+
+    session = create_retry_session()
+    cookie_count = 0
+    for cookie in tab.cookies(all_domains=True):
+        domain = cookie.get('domain') or ''
+        if domain.lstrip('.').lower() not in GARMIN_API_COOKIE_DOMAINS:
+            continue
+        session.cookies.set(cookie['name'], cookie['value'], domain=domain)
+        cookie_count += 1
+    if not cookie_count:
+        session.close()
+        return None
+
+    try:
+        user_agent = tab.user_agent or ONELAP_USER_AGENT
+    except Exception:
+        user_agent = ONELAP_USER_AGENT
+    session.headers.update({
+        'User-Agent': user_agent,
+        'Accept': 'application/json',
+        'NK': 'NT',
+        'Origin': GARMIN_CONNECT_BASE_URL,
+        'Referer': GARMIN_ACTIVITIES_URL,
+    })
+    try:
+        csrf_token = tab.run_js("""
+            const meta = document.querySelector('meta[name="csrf-token"]');
+            return meta ? meta.content : null;
+        """, timeout=5)
+        if csrf_token:
+            session.headers['connect-csrf-token'] = csrf_token
+    except Exception:
+        pass
+
+    logger.info(f"已从浏览器提取 Garmin cookies {cookie_count} 个，后续接口请求不再依赖页面跳转")
+    _garmin_api_session = session
+    return session
+
+def fetch_garmin_usage_indicators_api(tab):
+    """直接调用 usageIndicators 接口获取最新活动；会话失效时重建一次，失败返回 None"""
+    for attempt in range(2):
+        session = get_garmin_api_session(tab, refresh=attempt > 0)
+        if session is None:
+            logger.warning("未读取到 Garmin cookies，无法使用接口直连模式")
+            return None
+        try:
+            response = session.get(f'{GARMIN_CONNECT_BASE_URL}{GARMIN_USAGE_INDICATORS_API}', timeout=15,
+                                   hooks={'response': http_metrics_hook('garmin_usage_indicators')})
+        except Exception as e:
+            logger.warning(f"Garmin usageIndicators 直连请求失败: {e}")
+            return None
+        if response.status_code in (401, 403):
+            logger.info(f"Garmin 接口会话返回 {response.status_code}，重新提取 cookies")
+            continue
+        if response.status_code != 200:
+            logger.warning(f"Garmin usageIndicators 直连返回 HTTP {response.status_code}")
+            return None
+        try:
+            return parse_garmin_usage_indicators(response.json())
+        except Exception as e:
+            logger.warning(f"Garmin usageIndicators 直连响应解析失败: {e}")
+            return None
+    return None
+
 def input_garmin_field(tab, element, value, field_name):
     """Garmin SSO 需要真实键盘事件才能启用登录按钮。"""
     try:
@@ -1360,6 +2104,7 @@ def is_garmin_login_button_enabled(tab):
     except Exception:
         return False
 
+@timed('wait_garmin_login_button_enabled', metric='browser_wait_seconds')
 def wait_garmin_login_button_enabled(tab, timeout=10):
     """等待 Garmin SSO 前端校验解锁登录按钮。"""
     end = time.time() + timeout
@@ -1369,6 +2114,7 @@ def wait_garmin_login_button_enabled(tab, timeout=10):
         time.sleep(0.5)
     return False
 
+@timed('garmin_login')
 def login_garmin_browser(tab, account, password):
     """使用现有浏览器标签页登录 Garmin Connect 中国区"""
     logger.info("使用浏览器登录 Garmin Connect 中国区")
@@ -1486,10 +2232,19 @@ def login_garmin_browser(tab, account, password):
         logger.error(f"Garmin 浏览器登录失败: {e}")
         raise
 
+@timed('garmin_latest_activity')
 def get_latest_activity_garmin(tab):
     """从 Garmin Connect 获取最新活动时间"""
+    from bs4 import BeautifulSoup
     logger.info("正在从 Garmin Connect 获取最新活动记录...")
     try:
+        if GARMIN_DIRECT_API:
+            parsed = fetch_garmin_usage_indicators_api(tab)
+            if parsed:
+                log_garmin_latest_activity(parsed)
+                return parsed
+            logger.info("Garmin 接口直连未取到结果，回退页面监听方式")
+
         if not is_garmin_logged_in(tab):
             tab.get(GARMIN_ACTIVITIES_URL)
             time.sleep(4)
@@ -1512,10 +2267,7 @@ def get_latest_activity_garmin(tab):
                 if isinstance(body, dict):
                     parsed = parse_garmin_usage_indicators(body)
                     if parsed:
-                        if parsed.get('source') == 'cycling':
-                            logger.info(f"Garmin 最新骑行活动时间: {parsed['activity_date']}")
-                        else:
-                            logger.info(f"Garmin 未找到骑行活动，使用最新 {parsed.get('source')} 活动时间: {parsed['activity_date']}")
+                        log_garmin_latest_activity(parsed)
                         return parsed
             logger.warning("未从 Garmin 页面原生 usageIndicators 响应中解析出活动时间")
         except Exception as e:
@@ -1538,10 +2290,7 @@ def get_latest_activity_garmin(tab):
             if isinstance(usage_data, dict) and usage_data.get('ok'):
                 parsed = parse_garmin_usage_indicators(usage_data.get('data', {}))
                 if parsed:
-                    if parsed.get('source') == 'cycling':
-                        logger.info(f"Garmin 最新骑行活动时间: {parsed['activity_date']}")
-                    else:
-                        logger.info(f"Garmin 未找到骑行活动，使用最新 {parsed.get('source')} 活动时间: {parsed['activity_date']}")
+                    log_garmin_latest_activity(parsed)
                     return parsed
             else:
                 logger.warning(f"Garmin usageIndicators 接口不可用: {usage_data}")
@@ -1611,60 +2360,153 @@ def click_garmin_confirm_button(tab):
     """点击 Garmin 导入确认按钮"""
     candidate_texts = ['继续', '导入', '导入数据', '开始导入', '上传', '确认', 'Continue', 'Next', 'Import', 'Import Data', 'Upload']
     candidate_keywords = ['继续', '导入', '上传', 'continue', 'import', 'upload']
-    preview = []
 
-    for preferred_text in ['继续', 'Continue', 'Next']:
-        for selector in ['tag:button', 'tag:a', 'tag:div', 'tag:span']:
-            try:
-                for ele in tab.eles(selector):
-                    text = (ele.text or '').strip()
-                    if text != preferred_text:
-                        continue
-                    tag = str(ele.tag or '').lower()
-                    role = (ele.attr('role') or '').lower()
-                    class_name = (ele.attr('class') or '').lower()
-                    is_clickable = tag in ['button', 'a'] or role == 'button' or 'button' in class_name or 'btn' in class_name
-                    if not is_clickable:
-                        continue
-                    try:
-                        ele.click(by_js=True)
-                    except Exception:
-                        ele.click()
-                    logger.info(f"已点击 Garmin 导入确认按钮: {text}")
-                    return True
-            except Exception:
-                continue
+    # 优先精确匹配"继续/Continue/Next"，再按候选文本和关键字宽松匹配；只接受可点击元素
+    rules = [{'texts': [preferred_text], 'clickable': True} for preferred_text in ['继续', 'Continue', 'Next']]
+    rules.append({'texts': candidate_texts, 'keywords': candidate_keywords, 'clickable': True})
+    ele = find_clickable_by_text(tab, rules)
+    if ele:
+        click_element(ele)
+        logger.info(f"已点击 Garmin 导入确认按钮: {(ele.text or '').strip()}")
+        return True
+    logger.warning(f"未找到 Garmin 导入确认按钮，候选文本: {preview_clickable_texts(tab)}")
+    return False
 
-    for selector in ['tag:button', 'tag:a', 'tag:div', 'tag:span']:
-        try:
-            for ele in tab.eles(selector):
-                text = (ele.text or '').strip()
-                if not text:
-                    continue
-                preview.append(f"{selector}:{text[:30]}")
-                normalized_text = text.lower()
-                text_matches = text in candidate_texts or any(keyword in normalized_text for keyword in candidate_keywords)
-                if not text_matches:
-                    continue
+UPLOAD_FILENAME_PATTERN = re.compile(r'filename="([^"]+)"')
 
-                tag = str(ele.tag or '').lower()
-                role = (ele.attr('role') or '').lower()
-                class_name = (ele.attr('class') or '').lower()
-                is_clickable = tag in ['button', 'a'] or role == 'button' or 'button' in class_name or 'btn' in class_name
-                if not is_clickable:
-                    continue
 
-                try:
-                    ele.click(by_js=True)
-                except Exception:
-                    ele.click()
-                logger.info(f"已点击 Garmin 导入确认按钮: {text}")
-                return True
-        except Exception:
+def start_upload_listener(tab, markers):
+    """在选择文件之前开始监听上传接口；监听不可用时返回 False，调用方回退原有的页面等待方式"""
+    try:
+        tab.listen.start(markers, method='POST')
+        return True
+    except Exception as e:
+        logger.warning(f"上传接口监听启动失败，回退页面等待: {e}")
+        return False
+
+
+def stop_upload_listener(tab):
+    try:
+        tab.listen.stop()
+    except Exception:
+        pass
+
+
+def get_upload_packet_filenames(pkt):
+    """从 multipart 请求体里取上传文件名（一个请求可能带多个文件）；浏览器不回传文件内容时取不到，返回空列表"""
+    try:
+        post_data = pkt.request.postData
+    except Exception:
+        return []
+    if isinstance(post_data, str):
+        return [os.path.basename(name) for name in UPLOAD_FILENAME_PATTERN.findall(post_data)]
+    return []
+
+
+def wait_upload_responses(tab, file_paths, parse_packet, platform, timeout=180, first_response_timeout=30):
+    """
+    逐个接收已监听的上传接口响应，直到每个文件都有结果或超时
+    parse_packet(pkt) 返回 (结果, 说明, 文件名)，结果为 success/duplicate/failed，无关请求返回 (None, '', '')
+    返回 {文件名: (结果, 说明)}；first_response_timeout 内一个响应都没有时返回空字典，由调用方回退
+    """
+    pending = [os.path.basename(path) for path in file_paths]
+    results = {}
+    started = time.time()
+    end = started + timeout
+    while pending and time.time() < end:
+        deadline = end if results else min(end, started + first_response_timeout)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            pkt = tab.listen.wait(timeout=remaining, raise_err=False)
+        except Exception as e:
+            logger.debug(f"[{platform}] 上传接口监听中断: {e}")
+            break
+        if not pkt:
+            break
+
+        status, message, filename = parse_packet(pkt)
+        if not status:
             continue
-    logger.warning(f"未找到 Garmin 导入确认按钮，候选文本: {preview[:20]}")
-    return False
+        filenames = [filename] if filename else get_upload_packet_filenames(pkt)
+        filenames = [name for name in filenames if name in pending]
+        if not filenames:
+            # 请求和响应里都认不出文件名时，按上传顺序归属
+            filenames = [pending[0]]
+        for filename in filenames:
+            pending.remove(filename)
+            results[filename] = (status, message)
+            incr('upload_file_results', platform=platform, result=status)
+            if status == 'failed':
+                logger.warning(f"[{platform}] 上传失败: {filename} ({message})")
+            else:
+                logger.info(f"[{platform}] 上传接口已确认: {filename} -> {status}{f' ({message})' if message else ''}")
+    return results
 
+
+def upload_batch_result(file_results, file_count):
+    """
+    把一批的上传接口监听结果换算成 AdaptiveBatcher.record() 的结果：
+    一个响应都没捕获到（监听路径不匹配或监听不可用）记为 no_result，不代表平台慢，不调整批大小；
+    捕获到部分响应、其余等到超时记为 timeout；全部返回时按有无失败记为 failed / success
+    """
+    if not file_results:
+        return 'no_result'
+    if len(file_results) < file_count:
+        return 'timeout'
+    return 'failed' if any(status == 'failed' for status, _ in file_results.values()) else 'success'
+
+
+def parse_garmin_upload_packet(pkt):
+    if pkt.is_failed:
+        return 'failed', f"网络错误: {pkt.fail_info.errorText}", ''
+    status_code = int(getattr(pkt.response, 'status', 0) or 0)
+    body = getattr(pkt.response, 'body', None)
+    result = body.get('detailedImportResult') if isinstance(body, dict) else None
+    result = result if isinstance(result, dict) else {}
+    filename = os.path.basename(str(result.get('fileName') or ''))
+    messages = []
+    for failure in result.get('failures') or []:
+        for item in (failure or {}).get('messages') or []:
+            messages.append(str((item or {}).get('content') or ''))
+    message = '; '.join(message for message in messages if message)
+    if status_code == 409 or 'duplicate' in message.lower():
+        return 'duplicate', message or '重复活动', filename
+    if status_code >= 400 or messages:
+        return 'failed', message or f'HTTP {status_code}', filename
+    return 'success', '', filename
+
+
+def parse_igpsport_upload_packet(pkt):
+    if pkt.is_failed:
+        return 'failed', f"网络错误: {pkt.fail_info.errorText}", ''
+    status_code = int(getattr(pkt.response, 'status', 0) or 0)
+    if status_code in (404, 405):
+        # 命中的不是导入接口（路径是推测的），忽略，文件结果交给活动列表核对
+        return None, '', ''
+    body = getattr(pkt.response, 'body', None)
+    if not isinstance(body, dict):
+        return ('failed', f'HTTP {status_code}', '') if status_code >= 400 else ('success', '', '')
+    data = body.get('data') if isinstance(body.get('data'), dict) else {}
+    filename = os.path.basename(str(data.get('fileName') or data.get('filename') or data.get('name') or ''))
+    message = str(body.get('message') or body.get('msg') or '')
+    if body.get('code') in (0, 200) and status_code < 400:
+        return 'success', '', filename
+    if is_duplicate_upload_message(message):
+        return 'duplicate', message, filename
+    return 'failed', message or f"code={body.get('code')}", filename
+
+
+def parse_xoss_upload_packet(pkt):
+    if pkt.is_failed:
+        return 'failed', f"网络错误: {pkt.fail_info.errorText}", ''
+    status_code = int(getattr(pkt.response, 'status', 0) or 0)
+    status, message = classify_upload_body(status_code, getattr(pkt.response, 'body', None))
+    return status, message, ''
+
+
+@timed('garmin_import_wait', metric='browser_wait_seconds')
 def wait_garmin_import_result(tab, timeout=180):
     """等待 Garmin 导入处理完成，返回 success/failed/unknown"""
     success_keywords = ['导入完成', '导入成功', '上传成功', '已导入', '完成', 'successfully imported', 'import complete']
@@ -1701,35 +2543,35 @@ def wait_garmin_import_result(tab, timeout=180):
     logger.warning("等待 Garmin 导入结果超时，请在 Garmin 页面手动确认是否导入成功")
     return 'unknown'
 
-def sort_garmin_upload_files_chronologically(valid_files):
-    """Garmin 增量基准会随最新活动推进，必须按旧到新上传，便于异常后续传。"""
+def get_upload_file_time(file_path, file_times=None, catalog=None):
+    """文件对应的活动时间：依次取 file_times（绝对路径 -> 时间）、活动目录的文件名索引、文件名本身，都没有时返回 None"""
+    filename = os.path.basename(file_path)
+    activity_time = (file_times or {}).get(os.path.abspath(file_path))
+    if activity_time is None and catalog is not None:
+        activity_time = catalog.time_for_filename(filename)
+    return activity_time or parse_activity_time_from_filename(filename)
+
+
+def sort_garmin_upload_files_chronologically(valid_files, file_times=None, catalog=None):
+    """
+    Garmin 增量基准会随最新活动推进，必须按旧到新上传，便于异常后续传。
+    活动时间依次取 file_times（绝对路径 -> 时间，下载步骤随文件传入）、已加载活动目录的文件名索引、文件名本身，
+    全程只查内存，不读磁盘上的状态文件
+    """
     files = list(valid_files)
     if len(files) <= 1:
         return files
 
-    state = load_onelap_download_state()
-    filename_times = {}
-    for item in state.values():
-        if not isinstance(item, dict):
-            continue
-        filename = str(item.get('filename') or '').strip()
-        if not filename:
-            continue
-        activity_time = parse_onelap_activity_time(item) or parse_activity_time_from_filename(filename)
-        if activity_time:
-            filename_times[filename] = activity_time
-
     indexed_files = []
     missing_count = 0
     for idx, file_path in enumerate(files):
-        filename = os.path.basename(file_path)
-        activity_time = filename_times.get(filename) or parse_activity_time_from_filename(filename)
+        activity_time = get_upload_file_time(file_path, file_times=file_times, catalog=catalog)
         if not activity_time:
             missing_count += 1
         indexed_files.append((idx, file_path, activity_time))
 
     if missing_count == len(indexed_files):
-        logger.warning("未能从 OneLap 下载状态解析 Garmin 上传文件时间，按当前列表反向上传")
+        logger.warning("未能解析 Garmin 上传文件的活动时间，按当前列表反向上传")
         return list(reversed(files))
 
     sorted_items = sorted(
@@ -1744,19 +2586,23 @@ def sort_garmin_upload_files_chronologically(valid_files):
         logger.warning(f"Garmin 上传排序有 {missing_count} 个文件缺少时间，已放在有时间文件之后")
     return [item[1] for item in sorted_items]
 
-def upload_files_to_garmin(tab, valid_files):
-    """上传文件到 Garmin Connect 中国区"""
+@timed('garmin_upload')
+def upload_files_to_garmin(tab, valid_files, outbox=None, catalog=None, file_times=None):
+    """上传文件到 Garmin Connect 中国区；传入 outbox 时逐批记录上传待办状态，file_times 和 catalog 用于按活动时间排序"""
     logger.info("===== 开始上传文件到 Garmin Connect =====")
 
     try:
         if not is_garmin_logged_in(tab):
             login_garmin_browser(tab, GARMIN_ACCOUNT, GARMIN_PASSWORD)
 
-        upload_files = sort_garmin_upload_files_chronologically(valid_files)
+        upload_files = sort_garmin_upload_files_chronologically(valid_files, file_times=file_times, catalog=catalog)
         garmin_batch_size = GARMIN_MAX_UPLOAD_FILES if GARMIN_MAX_UPLOAD_FILES and GARMIN_MAX_UPLOAD_FILES > 0 else MAX_FILES_PER_BATCH
-        logger.info(f"Garmin 本次待上传文件总数: {len(upload_files)}，每批最多 {garmin_batch_size} 个，按活动时间正序上传")
+        batcher = AdaptiveBatcher('garmin', garmin_batch_size,
+                                  max_size=GARMIN_MAX_UPLOAD_FILES if GARMIN_MAX_UPLOAD_FILES and GARMIN_MAX_UPLOAD_FILES > 0 else None)
+        logger.info(f"Garmin 本次待上传文件总数: {len(upload_files)}，首批 {batcher.size} 个，按活动时间正序上传")
 
-        for batch in batch_files(upload_files, garmin_batch_size):
+        all_succeeded = True
+        for batch in batcher.batches(upload_files):
             logger.info(f"正在上传批次文件到 Garmin，共 {len(batch)} 个文件")
             tab.get(GARMIN_IMPORT_URL)
             time.sleep(4)
@@ -1770,32 +2616,60 @@ def upload_files_to_garmin(tab, valid_files):
             for file_path in abs_paths:
                 logger.info(f"准备上传到 Garmin: {os.path.basename(file_path)}")
 
+            if outbox:
+                outbox.mark('garmin', batch, 'in_flight')
+            listening = start_upload_listener(tab, GARMIN_UPLOAD_API_MARKERS)
             try:
-                file_input.input('\n'.join(abs_paths))
-            except Exception as e:
-                logger.warning(f"Garmin 批量选择文件失败，尝试 click.to_upload: {e}")
                 try:
-                    if len(abs_paths) == 1:
-                        file_input.click.to_upload(abs_paths[0])
-                    else:
-                        file_input.click.to_upload('\n'.join(abs_paths))
-                except Exception as inner_e:
-                    logger.error(f"Garmin 文件选择失败: {inner_e}")
-                    return False
+                    file_input.input('\n'.join(abs_paths))
+                except Exception as e:
+                    logger.warning(f"Garmin 批量选择文件失败，尝试 click.to_upload: {e}")
+                    try:
+                        if len(abs_paths) == 1:
+                            file_input.click.to_upload(abs_paths[0])
+                        else:
+                            file_input.click.to_upload('\n'.join(abs_paths))
+                    except Exception as inner_e:
+                        logger.error(f"Garmin 文件选择失败: {inner_e}")
+                        return False
 
-            logger.info(f"Garmin 文件选择成功，共 {len(abs_paths)} 个")
-            time.sleep(3)
+                logger.info(f"Garmin 文件选择成功，共 {len(abs_paths)} 个")
+                time.sleep(3)
 
-            if not click_garmin_confirm_button(tab):
-                logger.warning("未能点击 Garmin 导入确认按钮，文件可能已被页面自动接收，请手动检查")
+                if not click_garmin_confirm_button(tab):
+                    logger.warning("未能点击 Garmin 导入确认按钮，文件可能已被页面自动接收，请手动检查")
+
+                file_results = wait_upload_responses(tab, abs_paths, parse_garmin_upload_packet, 'garmin') if listening else {}
+            finally:
+                if listening:
+                    stop_upload_listener(tab)
+
+            if not file_results:
+                # 没捕获到上传接口响应（接口路径变化或监听不可用），回退为页面文本判断
+                result = wait_garmin_import_result(tab, timeout=180)
+                batcher.record(result)
+                if outbox:
+                    outbox.mark('garmin', batch, {'success': 'done', 'failed': 'failed'}.get(result, 'unconfirmed'), result)
+                if result == 'failed':
+                    return False
+                if result == 'unknown':
+                    logger.warning("Garmin 导入结果未知，为避免打断处理，停止后续批次")
+                    return False
+                continue
 
-            result = wait_garmin_import_result(tab, timeout=180)
-            if result == 'failed':
-                return False
-            if result == 'unknown':
-                logger.warning("Garmin 导入结果未知，为避免打断处理，停止后续批次")
+            failed_files = [name for name, (status, _) in file_results.items() if status == 'failed']
+            batcher.record(upload_batch_result(file_results, len(abs_paths)))
+            if outbox:
+                outbox.mark_results('garmin', batch, file_results)
+            if failed_files:
+                all_succeeded = False
+                logger.warning(f"Garmin 本批 {len(failed_files)} 个文件导入失败: {failed_files}")
+            if len(file_results) < len(abs_paths):
+                logger.warning(f"Garmin 本批有 {len(abs_paths) - len(file_results)} 个文件未收到导入结果，为避免打断处理，停止后续批次")
                 return False
 
+        if not all_succeeded:
+            return False
         logger.info("===== Garmin Connect 文件上传流程完成 =====")
         return True
 
@@ -1808,6 +2682,279 @@ def batch_files(file_list, batch_size):
     for i in range(0, len(file_list), batch_size):
         yield file_list[i:i + batch_size]
 
+
+# 各平台浏览器上传单批的上限（iGPSport 导入弹窗最多 9 个文件）
+UPLOAD_BATCH_SIZE_LIMITS = {'garmin': 25, 'igpsport': 9, 'xoss': 20, 'giant': 50}
+# 单批平均每个文件在该秒数内完成视为"很快"，下一批加 1
+UPLOAD_BATCH_FAST_SECONDS_PER_FILE = 15
+
+
+def load_upload_batch_state(state_file=UPLOAD_BATCH_STATE_FILE):
+    try:
+        if os.path.exists(state_file):
+            with open(state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+    except Exception as e:
+        logger.warning(f'读取上传批大小状态失败: {e}')
+    return {}
+
+
+def save_upload_batch_state(state, state_file=UPLOAD_BATCH_STATE_FILE):
+    try:
+        with open(state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.warning(f'保存上传批大小状态失败: {e}')
+
+
+class AdaptiveBatcher:
+    """
+    按上一批的结果调整批大小的 batch_files：导入很快成功则加 1，超时或结果未知则减半，失败保持不变；
+    no_result（没捕获到任何上传接口响应，多半是监听路径不匹配）只计数，不调整批大小
+    学到的批大小按平台保存在 upload_batch_state.json，下次运行（包括补传历史）从该值继续
+    """
+
+    def __init__(self, platform, initial_size, max_size=None, state_file=UPLOAD_BATCH_STATE_FILE):
+        self.platform = platform
+        self.state_file = state_file
+        self.max_size = max(1, int(max_size or UPLOAD_BATCH_SIZE_LIMITS.get(platform) or initial_size))
+        self.adaptive = ADAPTIVE_BATCH_SIZE
+        learned = None
+        if self.adaptive:
+            learned = (load_upload_batch_state(state_file).get(platform) or {}).get('batch_size')
+        self.size = self._clamp(learned or initial_size)
+        self._batch_len = 0
+        self._started = None
+
+    def _clamp(self, size):
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            size = 1
+        return min(max(size, 1), self.max_size)
+
+    def batches(self, file_list):
+        index = 0
+        while index < len(file_list):
+            batch = file_list[index:index + self.size]
+            index += len(batch)
+            self._batch_len = len(batch)
+            self._started = time.time()
+            yield batch
+
+    def record(self, result):
+        """记录当前批的结果：success / failed / timeout / unknown / no_result"""
+        if not self.adaptive or self._started is None:
+            return
+        elapsed = time.time() - self._started
+        previous = self.size
+        if result == 'success' and self._batch_len >= self.size:
+            if elapsed <= UPLOAD_BATCH_FAST_SECONDS_PER_FILE * self._batch_len:
+                self.size = self._clamp(self.size + 1)
+        elif result in ('timeout', 'unknown'):
+            self.size = self._clamp(self.size // 2)
+        self._started = None
+
+        incr('upload_batches', platform=self.platform, result=result)
+        if self.size != previous:
+            logger.info(f"[{self.platform}] 上传批大小调整: {previous} -> {self.size}（上一批 {result}，耗时 {elapsed:.1f}s）")
+        state = load_upload_batch_state(self.state_file)
+        state[self.platform] = {
+            'batch_size': self.size,
+            'last_result': result,
+            'last_seconds': round(elapsed, 1),
+            'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        save_upload_batch_state(state, self.state_file)
+
+
+# 同一 (文件, 平台) 最多尝试次数，超过后保留 failed 状态，不再自动重试
+UPLOAD_OUTBOX_MAX_ATTEMPTS = 5
+# done 状态的条目保留天数，超过后从待办文件中清理
+UPLOAD_OUTBOX_KEEP_DONE_DAYS = 30
+
+
+def get_enabled_upload_platforms():
+    """返回已启用且配置了账号的正向上传平台，下载完成后为这些平台登记上传待办"""
+    def configured(account, password):
+        return bool(account and password and account not in ['139xxxxxx', ''] and password not in ['xxxxxx', ''])
+
+    platforms = []
+    if XOSS_ENABLE_SYNC and configured(XOSS_ACCOUNT, XOSS_PASSWORD):
+        platforms.append('xoss')
+    if GIANT_ENABLE_SYNC and configured(GIANT_ACCOUNT, GIANT_PASSWORD):
+        platforms.append('giant')
+    if IGPSPORT_ENABLE_SYNC and configured(IGPSPORT_ACCOUNT, IGPSPORT_PASSWORD):
+        platforms.append('igpsport')
+    if GARMIN_ENABLE_SYNC and configured(GARMIN_ACCOUNT, GARMIN_PASSWORD):
+        platforms.append('garmin')
+    if STRAVA_ENABLE_SYNC and STRAVA_CLIENT_ID and STRAVA_CLIENT_SECRET:
+        platforms.append('strava')
+    return platforms
+
+
+class UploadOutbox:
+    """
+    持久化的上传待办：每个 (文件, 平台) 一条记录，状态为 pending / in_flight / unconfirmed / done / failed，并记录尝试次数
+    下载完成即登记；各平台上传前标记 in_flight，得到结果后标记 done/failed，每次变更都原子写回 upload_outbox.json。
+    进程中途退出时 in_flight 的条目在下次运行中按 pending 继续，已 done 的文件不会重复上传
+
+    页面上传流程走完但没拿到平台对该文件的明确结果（接口响应未捕获、导入结果未知）时，所有平台一律记为 unconfirmed：
+    文件很可能已经上传成功，不能直接重传，否则会在平台上产生重复活动。unconfirmed 的文件不进入 pending()，
+    由 verify_unconfirmed() 按平台活动列表的最新日期核对：不早于文件活动日期视为已上传（done），否则记为 failed 再重试。
+    重试次数对 pending / in_flight / failed 都生效，尝试 UPLOAD_OUTBOX_MAX_ATTEMPTS 次后不再自动上传
+    """
+
+    def __init__(self, state_file=UPLOAD_OUTBOX_FILE):
+        self.state_file = state_file
+        self.state = {}
+        try:
+            if os.path.exists(state_file):
+                with open(state_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    if isinstance(data, dict):
+                        self.state = data
+        except Exception as e:
+            logger.warning(f'读取上传待办失败: {e}')
+        self._prune()
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(file_path)
+
+    def _prune(self):
+        cutoff = (datetime.now() - timedelta(days=UPLOAD_OUTBOX_KEEP_DONE_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+        for entries in self.state.values():
+            for key in [key for key, item in entries.items()
+                        if item.get('status') == 'done' and (item.get('updated_at') or '') < cutoff]:
+                del entries[key]
+
+    def save(self):
+        tmp_file = f'{self.state_file}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            logger.warning(f'保存上传待办失败: {e}')
+
+    def enqueue(self, file_path, platforms):
+        """为刚下载的文件登记各平台的 pending 条目，已有记录的 (文件, 平台) 保持原状态"""
+        key = self._key(file_path)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        changed = False
+        for platform_name in platforms:
+            entries = self.state.setdefault(platform_name, {})
+            if key not in entries:
+                entries[key] = {'status': 'pending', 'attempts': 0, 'created_at': now, 'updated_at': now}
+                changed = True
+        if changed:
+            self.save()
+
+    def pending(self, platform):
+        """返回该平台需要上传的文件：未超过重试次数的 pending、上次中断的 in_flight 和 failed"""
+        files = []
+        for key, item in (self.state.get(platform) or {}).items():
+            status = item.get('status')
+            if status in ('done', 'unconfirmed'):
+                continue
+            if int(item.get('attempts') or 0) >= UPLOAD_OUTBOX_MAX_ATTEMPTS:
+                continue
+            if not os.path.exists(key):
+                continue
+            files.append(key)
+        return sorted(files)
+
+    def mark(self, platform, file_paths, status, message=''):
+        """更新一组文件在该平台的状态；标记 in_flight 时累加尝试次数"""
+        if not file_paths:
+            return
+        entries = self.state.setdefault(platform, {})
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for file_path in file_paths:
+            item = entries.setdefault(self._key(file_path), {'status': 'pending', 'attempts': 0, 'created_at': now})
+            if status == 'in_flight':
+                item['attempts'] = int(item.get('attempts') or 0) + 1
+            item['status'] = status
+            item['updated_at'] = now
+            if message:
+                item['message'] = message
+            else:
+                item.pop('message', None)
+        self.save()
+
+    def status(self, platform, file_path):
+        return ((self.state.get(platform) or {}).get(self._key(file_path)) or {}).get('status', '')
+
+    def mark_results(self, platform, file_paths, results):
+        """按 {文件名: (结果, 说明)} 更新状态：success/duplicate -> done，failed -> failed，没有结果的 -> unconfirmed"""
+        for file_path in file_paths:
+            status, message = results.get(os.path.basename(file_path), (None, ''))
+            if status in ('success', 'duplicate'):
+                self.mark(platform, [file_path], 'done')
+            elif status == 'failed':
+                self.mark(platform, [file_path], 'failed', message)
+            else:
+                self.mark(platform, [file_path], 'unconfirmed', '上传结果未确认')
+
+    def unconfirmed(self, platform):
+        return sorted(key for key, item in (self.state.get(platform) or {}).items()
+                      if item.get('status') == 'unconfirmed')
+
+    def verify_unconfirmed(self, platform, latest_time, file_time):
+        """
+        用平台活动列表的最新活动时间核对 unconfirmed 的文件，file_time(path) 返回文件的活动时间
+        最新日期不早于活动日期 -> done；更早或平台没有活动 -> failed（之后按重试次数重传）；
+        文件时间未知时无法判断，保持 unconfirmed。返回本次得出结论的文件列表
+        """
+        resolved = []
+        for file_path in self.unconfirmed(platform):
+            activity_time = file_time(file_path)
+            if not activity_time:
+                continue
+            if latest_time and latest_time.date() >= activity_time.date():
+                self.mark(platform, [file_path], 'done', '活动列表已确认')
+            else:
+                self.mark(platform, [file_path], 'failed', '活动列表中未找到')
+            resolved.append(file_path)
+        return resolved
+
+def is_igpsport_logged_in(tab, timeout=8):
+    """访问 iGPSport 运动记录页，停留在 app.igpsport.cn 且 localStorage 有 token 即视为已登录"""
+    try:
+        tab.get('https://app.igpsport.cn/sport/record')
+        end = time.time() + timeout
+        while time.time() < end:
+            current_url = (tab.url or '').lower()
+            if 'login' in current_url or 'passport' in current_url:
+                return False
+            if 'app.igpsport.cn' in current_url and tab.run_js("return localStorage.getItem('access_token');"):
+                return True
+            time.sleep(1)
+    except Exception as e:
+        logger.debug(f"iGPSport 登录态探测失败: {e}")
+    return False
+
+def get_igpsport_session_cookies(tab):
+    """读取 iGPSport 当前 cookies，并附带 localStorage 中保存的 access_token"""
+    session_cookies = {}
+    try:
+        for cookie in tab.cookies():
+            session_cookies[cookie['name']] = cookie['value']
+    except Exception:
+        pass
+    try:
+        access_token = tab.run_js("return localStorage.getItem('access_token');")
+        if access_token:
+            session_cookies['access_token'] = access_token
+            session_cookies['token_type'] = tab.run_js("return localStorage.getItem('token_type');") or 'Bearer'
+    except Exception:
+        pass
+    return session_cookies
+
+@timed('igpsport_login')
 def login_igpsport_browser(tab, account, password):
     """使用浏览器登录iGPSport平台"""
     logger.info("使用浏览器登录iGPSport平台")
@@ -1838,6 +2985,10 @@ def login_igpsport_browser(tab, account, password):
                 pass
             return session_cookies
 
+        if PROBE_EXISTING_LOGIN and is_igpsport_logged_in(tab):
+            logger.info(f"检测到 iGPSport 已登录态，跳过登录表单: {tab.url}")
+            return get_igpsport_session_cookies(tab)
+
         # 访问登录页面
         logger.info("正在访问iGPSport登录页面...")
         tab.get('https://login.passport.igpsport.cn/login?lang=zh-Hans')
@@ -2019,6 +3170,7 @@ def login_igpsport_browser(tab, account, password):
         logger.error(f"iGPSport浏览器登录失败: {e}")
         raise
 
+@timed('igpsport_latest_activity')
 def get_latest_activity_igpsport(tab):
     """从iGPSport获取最新活动时间"""
     logger.info("正在从iGPSport获取最新活动记录...")
@@ -2046,8 +3198,8 @@ def get_latest_activity_igpsport(tab):
                 return empty_result
             return None
 
-        # 获取所有数据行（使用 .ant-table-row 过滤掉表头或占位符）
-        table_rows = tab.eles('css:.ant-table-row')
+        # 获取所有数据行（使用 .ant-table-row 过滤掉表头或占位符）；行和单元格文本在页面内一次取回
+        table_rows = query_dom_rows(tab, '.ant-table-row', limit=1)
         if not table_rows:
             logger.warning("iGPSport未找到有效活动记录(行数为0)")
             no_data = tab.ele('text:暂无数据', timeout=1)
@@ -2055,7 +3207,7 @@ def get_latest_activity_igpsport(tab):
                 logger.warning("页面显示'暂无数据'")
                 return empty_result
             # 再次尝试宽泛搜索
-            table_rows = tab.eles('css:.ant-table-tbody > tr')
+            table_rows = query_dom_rows(tab, '.ant-table-tbody > tr', limit=1)
             if not table_rows:
                 return None
 
@@ -2063,7 +3215,7 @@ def get_latest_activity_igpsport(tab):
         first_row = table_rows[0]
 
         # 检查第一行是否为暂无数据
-        if "暂无数据" in first_row.text:
+        if "暂无数据" in first_row['text']:
             logger.warning("第一行为'暂无数据'，尝试等待并刷新...")
             time.sleep(3)
             # 刷新页面
@@ -2075,7 +3227,7 @@ def get_latest_activity_igpsport(tab):
                     logger.warning("重试后页面仍显示'暂无数据'")
                     return empty_result
                 return None
-            table_rows = tab.eles('css:.ant-table-row')
+            table_rows = query_dom_rows(tab, '.ant-table-row', limit=1)
             if not table_rows:
                 no_data = tab.ele('text:暂无数据', timeout=1)
                 if no_data:
@@ -2083,16 +3235,14 @@ def get_latest_activity_igpsport(tab):
                     return empty_result
                 return None
             first_row = table_rows[0]
-            if "暂无数据" in first_row.text:
+            if "暂无数据" in first_row['text']:
                 logger.warning("重试后仍为'暂无数据'")
                 return empty_result
 
-        try:
-            date_td = first_row.ele('css:td.ant-table-column-sort', timeout=1)
-        except Exception:
-            date_td = None
-        if date_td and (date_td.text or '').strip():
-            raw_date = date_td.text.strip()
+        cells = first_row.get('cells') or []
+        date_td = next((cell for cell in cells if 'ant-table-column-sort' in (cell.get('className') or '')), None)
+        if date_td and date_td.get('text'):
+            raw_date = date_td['text']
             logger.info(f"直接从日期列提取到文本: {raw_date}")
             # 支持 2026.01.30 或 2026-01-30
             m_dot = re.search(r'(\d{4})\.(\d{2})\.(\d{2})', raw_date)
@@ -2117,52 +3267,10 @@ def get_latest_activity_igpsport(tab):
                 }
             logger.warning("日期列文本未匹配到有效日期格式，回退到逐列解析")
 
-        if not date_td:
-            try:
-                row_html = first_row.html
-            except Exception:
-                row_html = ""
-            if row_html:
-                try:
-                    soup = BeautifulSoup(row_html, 'html.parser')
-                    td = soup.find('td', class_=lambda c: c and 'ant-table-column-sort' in c)
-                    raw_date = td.get_text(strip=True) if td else ""
-                except Exception:
-                    raw_date = ""
-                if raw_date:
-                    logger.info(f"从行HTML提取到日期列文本: {raw_date}")
-                    m_dot = re.search(r'(\d{4})\.(\d{2})\.(\d{2})', raw_date)
-                    m_dash = re.search(r'(\d{4})-(\d{2})-(\d{2})', raw_date)
-                    if m_dot:
-                        date_str = f"{m_dot.group(1)}-{m_dot.group(2)}-{m_dot.group(3)}"
-                        latest_time = datetime.strptime(date_str, '%Y-%m-%d')
-                        return {
-                            'platform': 'igpsport',
-                            'activity_date': latest_time.strftime('%Y-%m-%d %H:%M:%S'),
-                            'time_obj': latest_time
-                        }
-                    if m_dash:
-                        date_str = f"{m_dash.group(1)}-{m_dash.group(2)}-{m_dash.group(3)}"
-                        latest_time = datetime.strptime(date_str, '%Y-%m-%d')
-                        return {
-                            'platform': 'igpsport',
-                            'activity_date': latest_time.strftime('%Y-%m-%d %H:%M:%S'),
-                            'time_obj': latest_time
-                        }
-
-        # 获取所有单元格文本
-        # 我们需要找到时间列。通常包含日期格式如 YYYY-MM-DD HH:MM:SS
-
-        # 获取所有单元格文本
-        # 注意：iGPSport的表格结构可能比较复杂，有时候 td 可能会被包含在其他元素中
-        # 或者 eles('tag:td') 获取方式在某些版本的 DrissionPage 中表现不同
-        # 我们尝试更稳健的方式：获取所有子 td 元素
-        cells = first_row.eles('css:td')  # 使用CSS选择器更准确
-
         # 如果还是获取不到，尝试获取所有文本并按换行符分割
         if not cells or len(cells) <= 1:
             logger.warning(f"使用 tag:td 只获取到 {len(cells) if cells else 0} 列，尝试分析行文本")
-            row_text = first_row.text
+            row_text = first_row['text']
             logger.info(f"行完整文本: {row_text}")
 
             # 尝试直接在行文本中搜索日期
@@ -2192,7 +3300,7 @@ def get_latest_activity_igpsport(tab):
 
         latest_time = None
 
-        row_text = first_row.text or ""
+        row_text = first_row['text'] or ""
         match_full = re.search(r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})', row_text)
         if match_full:
             time_str = match_full.group(1)
@@ -2218,7 +3326,7 @@ def get_latest_activity_igpsport(tab):
 
         logger.info(f"正在解析第一行数据，共 {len(cells)} 列")
         for i, cell in enumerate(cells):
-            text = cell.text.strip() if cell.text else ""
+            text = cell.get('text') or ""
             logger.debug(f"第 {i+1} 列内容: '{text}'")
 
             # 尝试匹配时间格式 YYYY-MM-DD HH:MM:SS
@@ -2264,8 +3372,30 @@ def get_latest_activity_igpsport(tab):
         logger.error(f"获取iGPSport最新活动失败: {e}")
         return None
 
-def upload_files_to_igpsport(tab, valid_files):
-    """上传文件到iGPSport平台"""
+@timed('igpsport_api_upload')
+def upload_files_to_igpsport_api(valid_files):
+    """
+    通过 IGPSportClient 直接调用导入接口上传，不经过浏览器导入弹窗
+    返回仍需走浏览器上传的文件列表（模块不可用、登录失败、接口不可用或单个文件失败）
+    """
+    logger.info("===== 开始通过接口直传文件到iGPSport =====")
+    try:
+        from incremental_sync_v2 import IGPSportClient
+    except ImportError as e:
+        logger.warning(f"iGPSport 接口直传不可用，回退浏览器上传: {e}")
+        return list(valid_files)
+
+    client = IGPSportClient(IGPSPORT_ACCOUNT, IGPSPORT_PASSWORD)
+    if not client.login():
+        logger.warning("iGPSport 接口登录失败，回退浏览器上传")
+        return list(valid_files)
+
+    results = client.upload_files(valid_files, max_workers=IGPSPORT_UPLOAD_WORKERS)
+    return collect_pending_upload_files('igpsport', 'iGPSport', valid_files, results)
+
+@timed('igpsport_upload')
+def upload_files_to_igpsport(tab, valid_files, outbox=None):
+    """上传文件到iGPSport平台；传入 outbox 时逐批记录上传待办状态"""
     logger.info("===== 开始上传文件到iGPSport平台 =====")
 
     def ensure_record_page():
@@ -2348,11 +3478,12 @@ def upload_files_to_igpsport(tab, valid_files):
         return file_input
 
     try:
-        max_files_per_batch = 9
+        batcher = AdaptiveBatcher('igpsport', UPLOAD_BATCH_SIZE_LIMITS['igpsport'])
+        all_succeeded = True
+        uploaded_count = 0
 
-        for batch_start in range(0, len(valid_files), max_files_per_batch):
-            batch_files = valid_files[batch_start:batch_start + max_files_per_batch]
-            logger.info(f"正在处理批次 {batch_start // max_files_per_batch + 1}，共 {len(batch_files)} 个文件")
+        for batch_index, batch_files in enumerate(batcher.batches(valid_files), start=1):
+            logger.info(f"正在处理批次 {batch_index}，共 {len(batch_files)} 个文件")
 
             try:
                 file_input = open_import_modal_and_get_input()
@@ -2360,60 +3491,69 @@ def upload_files_to_igpsport(tab, valid_files):
                 logger.error(f"iGPSport打开导入弹窗或定位输入框失败: {e}")
                 return False
 
+            abs_paths = [os.path.abspath(p) for p in batch_files]
+            if outbox:
+                outbox.mark('igpsport', batch_files, 'in_flight')
+            listening = IGPSPORT_LISTEN_UPLOAD_API and start_upload_listener(tab, IGPSPORT_UPLOAD_API_MARKERS)
             try:
-                abs_paths = [os.path.abspath(p) for p in batch_files]
-                file_input.input("\n".join(abs_paths))
-                logger.info(f"文件选择成功，共 {len(batch_files)} 个")
-                for file_path in batch_files:
-                    logger.info(f"  - {os.path.basename(file_path)}")
-            except Exception as e:
-                logger.error(f"iGPSport选择文件失败: {e}")
-                return False
-
-            time.sleep(2)
+                try:
+                    file_input.input("\n".join(abs_paths))
+                    logger.info(f"文件选择成功，共 {len(batch_files)} 个")
+                    for file_path in batch_files:
+                        logger.info(f"  - {os.path.basename(file_path)}")
+                except Exception as e:
+                    logger.error(f"iGPSport选择文件失败: {e}")
+                    return False
 
-            try:
-                upload_confirm_btn = None
-                candidate_texts = ['确认', '上传']
-                button_candidates = []
+                time.sleep(2)
 
-                for selector in ['tag:button', 'tag:div', 'tag:span']:
-                    try:
-                        for ele in tab.eles(selector):
-                            text = (ele.text or '').strip()
-                            if text:
-                                button_candidates.append((selector, text, ele))
-                                if text in candidate_texts:
-                                    upload_confirm_btn = ele
-                                    logger.info(f"命中最终确认元素: selector={selector}, text={text}")
-                                    break
-                        if upload_confirm_btn:
-                            break
-                    except Exception:
-                        continue
+                try:
+                    confirm_tags = ('button', 'div', 'span')
+                    upload_confirm_btn = find_clickable_by_text(tab, [{'texts': ['确认', '上传']}], tags=confirm_tags)
+                    if not upload_confirm_btn:
+                        preview = preview_clickable_texts(tab, tags=confirm_tags)
+                        logger.warning(f"未找到最终确认按钮（确认/上传）。当前候选元素文本: {preview}")
+                        return False
 
-                if not upload_confirm_btn:
-                    preview = [f"{sel}:{txt}" for sel, txt, _ in button_candidates[:20]]
-                    logger.warning(f"未找到最终确认按钮（确认/上传）。当前候选元素文本: {preview}")
+                    logger.info(f"命中最终确认元素: tag={upload_confirm_btn.tag}, text={(upload_confirm_btn.text or '').strip()}")
+                    click_element(upload_confirm_btn)
+                    logger.info("已点击最终确认按钮（确认/上传）")
+                except Exception as e:
+                    logger.error(f"点击最终确认按钮失败: {e}")
                     return False
 
-                try:
-                    upload_confirm_btn.click(by_js=True)
-                except Exception:
-                    upload_confirm_btn.click()
-                logger.info("已点击最终确认按钮（确认/上传）")
-                time.sleep(8)
-            except Exception as e:
-                logger.error(f"点击最终确认按钮失败: {e}")
-                return False
-
-            time.sleep(3)
+                file_results = wait_upload_responses(tab, abs_paths, parse_igpsport_upload_packet, 'igpsport',
+                                                     timeout=120, first_response_timeout=15) if listening else {}
+            finally:
+                if listening:
+                    stop_upload_listener(tab)
 
-            if batch_start + max_files_per_batch < len(valid_files):
+            if not file_results:
+                # 没捕获到上传接口响应时保持原来的固定等待让页面处理完，结果记为 unconfirmed，稍后按活动列表核对
+                time.sleep(8)
+                time.sleep(3)
+                batcher.record(upload_batch_result(file_results, len(abs_paths)))
+                if outbox:
+                    outbox.mark_results('igpsport', batch_files, {})
+            else:
+                failed_files = [name for name, (status, _) in file_results.items() if status == 'failed']
+                batcher.record(upload_batch_result(file_results, len(abs_paths)))
+                if outbox:
+                    outbox.mark_results('igpsport', batch_files, file_results)
+                if failed_files:
+                    all_succeeded = False
+                    logger.warning(f"iGPSport 本批 {len(failed_files)} 个文件上传失败: {failed_files}")
+                if len(file_results) < len(abs_paths):
+                    logger.warning(f"iGPSport 本批有 {len(abs_paths) - len(file_results)} 个文件未收到上传结果，稍后按活动列表核对")
+
+            uploaded_count += len(batch_files)
+            if uploaded_count < len(valid_files):
                 logger.info("等待页面恢复，准备下一批上传...")
                 tab.get('https://app.igpsport.cn/sport/record')
                 time.sleep(3)
 
+        if not all_succeeded:
+            return False
         logger.info("===== iGPSport上传流程完成 =====")
         return True
 
@@ -2449,21 +3589,24 @@ def build_strava_auth_url(client_id, redirect_uri, scope='activity:write,activit
 
 
 def exchange_strava_code_for_token(client_id, client_secret, code):
+    import requests
     resp = requests.post(
-        'https://www.strava.com/oauth/token',
+        STRAVA_OAUTH_TOKEN_URL,
         data={
             'client_id': client_id,
             'client_secret': client_secret,
             'code': code,
             'grant_type': 'authorization_code'
         },
-        timeout=20
+        timeout=20,
+        hooks={'response': http_metrics_hook('strava_oauth_token')}
     )
     resp.raise_for_status()
     return resp.json()
 
 
 def refresh_strava_token_if_needed(config_file=CONFIG_FILE_PATH):
+    import requests
     config = configparser.ConfigParser()
     config.read(config_file, encoding='utf-8-sig')
     if not config.has_section('strava'):
@@ -2490,14 +3633,15 @@ def refresh_strava_token_if_needed(config_file=CONFIG_FILE_PATH):
 
     logger.info('[Strava] access_token 缺失或即将过期，开始刷新')
     resp = requests.post(
-        'https://www.strava.com/oauth/token',
+        STRAVA_OAUTH_TOKEN_URL,
         data={
             'client_id': client_id,
             'client_secret': client_secret,
             'refresh_token': refresh_token,
             'grant_type': 'refresh_token'
         },
-        timeout=20
+        timeout=20,
+        hooks={'response': http_metrics_hook('strava_oauth_token')}
     )
     resp.raise_for_status()
     data = resp.json()
@@ -2514,12 +3658,15 @@ def refresh_strava_token_if_needed(config_file=CONFIG_FILE_PATH):
     return data.get('access_token', '')
 
 
-def poll_strava_upload_status(upload_id, access_token, timeout_seconds=60):
+@timed('strava_upload_poll')
+def poll_strava_upload_status(upload_id, access_token, timeout_seconds=60, poll_interval=2):
+    import requests
     headers = {'Authorization': f'Bearer {access_token}'}
     end_at = time.time() + timeout_seconds
     last_data = None
     while time.time() < end_at:
-        resp = requests.get(f'https://www.strava.com/api/v3/uploads/{upload_id}', headers=headers, timeout=20)
+        resp = requests.get(f'{STRAVA_API_BASE_URL}/uploads/{upload_id}', headers=headers, timeout=20,
+                            hooks={'response': http_metrics_hook('strava_upload_status')})
         resp.raise_for_status()
         data = resp.json()
         last_data = data
@@ -2532,7 +3679,7 @@ def poll_strava_upload_status(upload_id, access_token, timeout_seconds=60):
             return data
         if 'ready' in status_text.lower() and not data.get('activity_id'):
             return data
-        time.sleep(2)
+        time.sleep(poll_interval)
     return last_data
 
 
@@ -2559,12 +3706,14 @@ def build_strava_file_signature(file_path):
     return f"{os.path.basename(file_path)}|{stat.st_size}|{int(stat.st_mtime)}"
 
 
+@timed('strava_upload_file')
 def upload_file_to_strava(file_path, access_token):
+    import requests
     headers = {'Authorization': f'Bearer {access_token}'}
     external_id = os.path.basename(file_path)
     with open(file_path, 'rb') as f:
         resp = requests.post(
-            'https://www.strava.com/api/v3/uploads',
+            f'{STRAVA_API_BASE_URL}/uploads',
             headers=headers,
             data={
                 'data_type': 'fit',
@@ -2572,8 +3721,10 @@ def upload_file_to_strava(file_path, access_token):
                 'external_id': external_id,
             },
             files={'file': (os.path.basename(file_path), f, 'application/octet-stream')},
-            timeout=60
+            timeout=60,
+            hooks={'response': http_metrics_hook('strava_upload')}
         )
+    incr('strava_upload_bytes', os.path.getsize(file_path))
     resp.raise_for_status()
     data = resp.json()
     if data.get('error'):
@@ -2596,12 +3747,15 @@ def classify_strava_error(err_text):
     return 'unknown', err_text
 
 
+@timed('strava_latest_activity')
 def get_latest_activity_strava(config_file=CONFIG_FILE_PATH):
+    import requests
     access_token = refresh_strava_token_if_needed(config_file)
     if not access_token:
         return None
     headers = {'Authorization': f'Bearer {access_token}'}
-    resp = requests.get('https://www.strava.com/api/v3/athlete/activities?per_page=1&page=1', headers=headers, timeout=20)
+    resp = requests.get(f'{STRAVA_API_BASE_URL}/athlete/activities?per_page=1&page=1', headers=headers, timeout=20,
+                        hooks={'response': http_metrics_hook('strava_athlete_activities')})
     resp.raise_for_status()
     data = resp.json()
     if not data:
@@ -2618,7 +3772,10 @@ def get_latest_activity_strava(config_file=CONFIG_FILE_PATH):
     }
 
 
-def upload_files_to_strava(valid_files, config_file=CONFIG_FILE_PATH):
+@timed('strava_upload')
+def upload_files_to_strava(valid_files, config_file=CONFIG_FILE_PATH, upload_paths=None):
+    """上传文件到 Strava；upload_paths 为 原始路径 -> 预先转换好的上传路径 映射，
+    传入时不再逐个做坐标转换，临时文件在上传后统一清理"""
     if not valid_files:
         logger.info('[Strava] 没有可上传文件，跳过')
         return {'ok': True, 'success': 0, 'skipped': 0, 'failed': 0}
@@ -2637,7 +3794,10 @@ def upload_files_to_strava(valid_files, config_file=CONFIG_FILE_PATH):
     except Exception:
         pass
 
-    if gcj02_to_wgs84_enabled and FIT_COORD_TRANSFORM_AVAILABLE:
+    if upload_paths is not None:
+        upload_paths = dict(upload_paths)
+        gcj02_to_wgs84_enabled = False  # 已由调用方完成转换
+    elif gcj02_to_wgs84_enabled and FIT_COORD_TRANSFORM_AVAILABLE:
         logger.info('[Strava] 已启用 GCJ-02 -> WGS84 坐标转换（OneLap FIT -> Strava）')
     elif gcj02_to_wgs84_enabled and not FIT_COORD_TRANSFORM_AVAILABLE:
         logger.warning('[Strava] GCJ-02 -> WGS84 转换已启用但 fit_coord_transform 模块未加载，将上传原始文件')
@@ -2647,7 +3807,8 @@ def upload_files_to_strava(valid_files, config_file=CONFIG_FILE_PATH):
     skipped_count = 0
     failed_count = 0
     for file_path in valid_files:
-        upload_path = file_path  # 实际用于上传的文件路径（可能为转换后的临时文件）
+        # 实际用于上传的文件路径（可能为转换后的临时文件）
+        upload_path = upload_paths.pop(file_path, file_path) if upload_paths else file_path
         try:
             signature = build_strava_file_signature(file_path)  # 始终基于原始文件做去重签名
             state_item = state.get(signature) or {}
@@ -2716,6 +3877,8 @@ def upload_files_to_strava(valid_files, config_file=CONFIG_FILE_PATH):
 
 
 def run_strava_auth_flow(config_file=CONFIG_FILE_PATH):
+    import webbrowser
+    from http.server import BaseHTTPRequestHandler, HTTPServer
     config = configparser.ConfigParser()
     config.read(config_file, encoding='utf-8-sig')
     if not config.has_section('strava'):
@@ -2760,6 +3923,7 @@ def run_strava_auth_flow(config_file=CONFIG_FILE_PATH):
     auth_tab = None
     try:
         logger.info('[Strava] 正在使用 ChromiumPage 打开授权页面...')
+        from DrissionPage import ChromiumPage, ChromiumOptions
         auth_options = ChromiumOptions()
         auth_options.incognito()
         auth_options.set_argument('--no-sandbox')
@@ -2847,50 +4011,101 @@ def run_strava_auth_flow(config_file=CONFIG_FILE_PATH):
     })
     logger.info(f"[Strava] 授权成功，已绑定账号: {athlete.get('username') or athlete.get('firstname') or athlete.get('id', '')}")
 
-if STRAVA_AUTH_MODE:
+def run_strava_commands(argv):
+    """处理 --strava-auth / --strava-test / --strava-upload-test 独立命令，命中时直接退出进程"""
+    if '--strava-auth' in argv:
+        try:
+            run_strava_auth_flow(CONFIG_FILE_PATH)
+            logger.info('Strava 首次授权完成，程序结束。')
+            sys.exit(0)
+        except Exception as e:
+            logger.error(f'Strava 授权初始化失败: {e}')
+            sys.exit(1)
+
+    if '--strava-test' in argv:
+        try:
+            refresh_strava_token_if_needed(CONFIG_FILE_PATH)
+            cfg = configparser.ConfigParser()
+            cfg.read(CONFIG_FILE_PATH, encoding='utf-8-sig')
+            athlete_id = cfg.get('strava', 'athlete_id', fallback='').strip()
+            athlete_name = cfg.get('strava', 'athlete_name', fallback='').strip()
+            logger.info(f"[Strava] 测试成功，token 可用，账号: {athlete_name or athlete_id}")
+            print('STRAVA_TEST_OK')
+            sys.exit(0)
+        except Exception as e:
+            logger.error(f'[Strava] 测试失败: {e}')
+            sys.exit(1)
+
+    if '--strava-upload-test' in argv:
+        try:
+            idx = argv.index('--strava-upload-test')
+            if idx + 1 >= len(argv):
+                raise Exception('请在 --strava-upload-test 后面提供文件路径')
+            test_file = argv[idx + 1]
+            if not os.path.isabs(test_file):
+                test_file = os.path.abspath(test_file)
+            if not os.path.exists(test_file):
+                raise Exception(f'测试文件不存在: {test_file}')
+            result = upload_files_to_strava([test_file], CONFIG_FILE_PATH)
+            if not result.get('ok', False):
+                raise Exception('Strava 上传测试未成功')
+            print('STRAVA_UPLOAD_TEST_OK')
+            sys.exit(0)
+        except Exception as e:
+            logger.error(f'[Strava] 上传测试失败: {e}')
+            sys.exit(1)
+
+
+def parse_giant_upload_response(response):
+    """捷安特接口以 status=1 表示成功，其余格式交给通用判断"""
     try:
-        run_strava_auth_flow(CONFIG_FILE_PATH)
-        logger.info('Strava 首次授权完成，程序结束。')
-        sys.exit(0)
-    except Exception as e:
-        logger.error(f'Strava 授权初始化失败: {e}')
-        sys.exit(1)
-
-if '--strava-test' in sys.argv:
-    try:
-        token = refresh_strava_token_if_needed(CONFIG_FILE_PATH)
-        cfg = configparser.ConfigParser()
-        cfg.read(CONFIG_FILE_PATH, encoding='utf-8-sig')
-        athlete_id = cfg.get('strava', 'athlete_id', fallback='').strip()
-        athlete_name = cfg.get('strava', 'athlete_name', fallback='').strip()
-        logger.info(f"[Strava] 测试成功，token 可用，账号: {athlete_name or athlete_id}")
-        print('STRAVA_TEST_OK')
-        sys.exit(0)
-    except Exception as e:
-        logger.error(f'[Strava] 测试失败: {e}')
-        sys.exit(1)
-
-if '--strava-upload-test' in sys.argv:
-    try:
-        idx = sys.argv.index('--strava-upload-test')
-        if idx + 1 >= len(sys.argv):
-            raise Exception('请在 --strava-upload-test 后面提供文件路径')
-        test_file = sys.argv[idx + 1]
-        if not os.path.isabs(test_file):
-            test_file = os.path.abspath(test_file)
-        if not os.path.exists(test_file):
-            raise Exception(f'测试文件不存在: {test_file}')
-        result = upload_files_to_strava([test_file], CONFIG_FILE_PATH)
-        if not result.get('ok', False):
-            raise Exception('Strava 上传测试未成功')
-        print('STRAVA_UPLOAD_TEST_OK')
-        sys.exit(0)
-    except Exception as e:
-        logger.error(f'[Strava] 上传测试失败: {e}')
-        sys.exit(1)
+        data = response.json()
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and str(data.get('status')) == '1' and response.status_code < 400:
+        return 'success', ''
+    return classify_upload_response(response)
+
+
+def parse_giant_upload_packet(pkt):
+    """页面上传监听到的捷安特上传响应，判断规则同 parse_giant_upload_response"""
+    if pkt.is_failed:
+        return 'failed', f"网络错误: {pkt.fail_info.errorText}", ''
+    status_code = int(getattr(pkt.response, 'status', 0) or 0)
+    body = getattr(pkt.response, 'body', None)
+    if isinstance(body, dict) and str(body.get('status')) == '1' and status_code < 400:
+        return 'success', '', ''
+    status, message = classify_upload_body(status_code, body)
+    return status, message, ''
+
+
+@timed('giant_api_upload')
+def upload_files_to_giant_api(cookies, valid_files):
+    """
+    复用 login_giant_browser 返回的 cookies，直接提交上传表单（device=bike_computer, brand=onelap）
+    返回仍需走页面上传的文件列表（没有 cookies、接口不可用或单个文件失败）
+    """
+    logger.info("===== 开始通过接口直传文件到捷安特平台 =====")
+    session = build_cookie_dict_session(cookies, GIANT_FIT_PAGE_URL)
+    if session is None:
+        logger.warning("未获取到捷安特 cookies，回退页面上传")
+        return list(valid_files)
 
-def upload_files_to_giant(tab, valid_files):
-    """上传文件到捷安特骑行平台"""
+    try:
+        results = upload_files_with_session(session, GIANT_UPLOAD_API, valid_files, 'files', 'giant_upload',
+                                            data={'device': 'bike_computer', 'brand': 'onelap'},
+                                            max_workers=GIANT_UPLOAD_WORKERS, parse_response=parse_giant_upload_response)
+    finally:
+        session.close()
+    return collect_pending_upload_files('giant', '捷安特', valid_files, results)
+
+@timed('giant_upload')
+def upload_files_to_giant(tab, valid_files, outbox=None):
+    """
+    上传文件到捷安特骑行平台
+    监听页面发出的上传请求，只有接口确认的文件才在 outbox 中标记 done；没收到结果的文件记为失败，下轮重试
+    全部文件都被确认时返回 True
+    """
     logger.info("===== 开始上传文件到捷安特平台 =====")
     
     try:
@@ -2955,9 +4170,13 @@ def upload_files_to_giant(tab, valid_files):
         logger.info(f"当前页面标题: {tab.title}")
         
         # 分批上传文件
-        for batch in batch_files(valid_files, 10*MAX_FILES_PER_BATCH):
+        all_confirmed = True
+        batcher = AdaptiveBatcher('giant', 10*MAX_FILES_PER_BATCH)
+        for batch in batcher.batches(valid_files):
             logger.info(f"正在上传批次文件到捷安特平台，共 {len(batch)} 个文件")
             
+            # 在选择文件之前开始监听，提交后按接口响应确认每个文件
+            listening = start_upload_listener(tab, GIANT_UPLOAD_API_MARKERS)
             try:
                 # 在弹出的窗体中查找文件上传输入框
                 upload_selectors = [
@@ -3053,73 +4272,113 @@ def upload_files_to_giant(tab, valid_files):
 
                 except Exception as e:
                     logger.warning(f"查找提交按钮失败: {e}")
+
+                file_results = wait_upload_responses(tab, batch, parse_giant_upload_packet, 'giant') if listening else {}
                     
             except Exception as e:
                 logger.error(f"批次上传到捷安特失败: {e}")
+                batcher.record('failed')
+                all_confirmed = False
+                if outbox:
+                    outbox.mark('giant', batch, 'failed', str(e))
                 continue
+            finally:
+                if listening:
+                    stop_upload_listener(tab)
             
+            if outbox:
+                outbox.mark_results('giant', batch, file_results)
+            failed_files = [name for name, (status, _) in file_results.items() if status == 'failed']
+            batcher.record(upload_batch_result(file_results, len(batch)))
+            if len(file_results) < len(batch):
+                all_confirmed = False
+                logger.warning(f"捷安特本批有 {len(batch) - len(file_results)} 个文件未收到上传接口结果，稍后按活动列表核对")
+            if failed_files:
+                all_confirmed = False
+                logger.warning(f"捷安特本批 {len(failed_files)} 个文件上传失败: {failed_files}")
             time.sleep(1)  # 批次间隔
         
         logger.info("===== 捷安特平台文件上传完成 =====")
-        return True
+        return all_confirmed
         
     except Exception as e:
         logger.error(f"上传到捷安特平台失败: {e}")
         return False
 
-# 获取屏幕尺寸并计算窗口大小
-try:
-    import tkinter as tk
-    root = tk.Tk()
-    screen_width = root.winfo_screenwidth()
-    screen_height = root.winfo_screenheight()
-    root.destroy()  # 立即销毁tkinter窗口
-    
-    # 计算半屏尺寸和右侧位置
-    half_width = screen_width // 2
-    window_height = screen_height
-    right_position = half_width  # 右半屏的起始位置
-    
-    logger.info(f"检测到屏幕尺寸: {screen_width}x{screen_height}")
-    logger.info(f"设置浏览器窗口: {half_width}x{window_height}，位置: ({right_position}, 0)")
-    
-except Exception as e:
-    # 如果获取屏幕尺寸失败，使用默认值
-    logger.warning(f"无法获取屏幕尺寸: {e}，使用默认值")
-    half_width = 960
-    window_height = 1080
-    right_position = 960
-
-# 初始化浏览器选项
-options = ChromiumOptions()
-options.incognito()  # 启用匿名模式
-
-# Chrome浏览器启动参数配置
-options.set_argument("--no-sandbox")                    # 避免沙盒问题
-options.set_argument("--disable-dev-shm-usage")         # 避免/dev/shm内存不足
-options.set_argument("--disable-web-security")          # 禁用网络安全检查
-options.set_argument("--disable-features=VizDisplayCompositor")
-options.set_argument("--disable-blink-features=AutomationControlled")
-options.set_argument("--disable-extensions")            # 禁用扩展
-options.auto_port()
-
-# 动态设置窗口大小和位置
-options.set_argument(f"--window-size={half_width},{window_height}")    # 设置窗口大小为半屏
-options.set_argument(f"--window-position={right_position},0")          # 设置窗口位置在右侧
-options.set_argument("--force-device-scale-factor=1")                  # 强制设备缩放因子为1
-
-
-if HEADLESS_MODE:
-    options.headless()  # 启用无头模式
-    logger.info("启用无头模式运行")
-else:
-    logger.info("启用可视化模式运行")
+_browser_window_geometry = None
 
 
-# 启动浏览器
-logger.info("[DEBUG] 准备启动 ChromiumPage")
-tab = ChromiumPage(options)
-logger.info(f"[DEBUG] ChromiumPage 已启动，当前URL: {getattr(tab, 'url', 'N/A')}")
+def get_browser_window_geometry():
+    """获取屏幕尺寸并计算浏览器窗口大小（右半屏），结果缓存供重启浏览器时复用"""
+    global _browser_window_geometry
+    if _browser_window_geometry is not None:
+        return _browser_window_geometry
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        screen_width = root.winfo_screenwidth()
+        screen_height = root.winfo_screenheight()
+        root.destroy()  # 立即销毁tkinter窗口
+
+        # 计算半屏尺寸和右侧位置
+        half_width = screen_width // 2
+        window_height = screen_height
+        right_position = half_width  # 右半屏的起始位置
+
+        logger.info(f"检测到屏幕尺寸: {screen_width}x{screen_height}")
+        logger.info(f"设置浏览器窗口: {half_width}x{window_height}，位置: ({right_position}, 0)")
+
+    except Exception as e:
+        # 如果获取屏幕尺寸失败，使用默认值
+        logger.warning(f"无法获取屏幕尺寸: {e}，使用默认值")
+        half_width = 960
+        window_height = 1080
+        right_position = 960
+    _browser_window_geometry = (half_width, window_height, right_position)
+    return _browser_window_geometry
+
+
+def create_browser_page():
+    """按当前配置初始化浏览器选项并启动 ChromiumPage，守护模式下浏览器失效时可重复调用"""
+    from DrissionPage import ChromiumPage, ChromiumOptions
+    half_width, window_height, right_position = get_browser_window_geometry()
+    options = ChromiumOptions()
+    if not PERSIST_BROWSER_SESSION:
+        options.incognito()  # 启用匿名模式
+
+    # Chrome浏览器启动参数配置
+    options.set_argument("--no-sandbox")                    # 避免沙盒问题
+    options.set_argument("--disable-dev-shm-usage")         # 避免/dev/shm内存不足
+    options.set_argument("--disable-web-security")          # 禁用网络安全检查
+    options.set_argument("--disable-features=VizDisplayCompositor")
+    options.set_argument("--disable-blink-features=AutomationControlled")
+    options.set_argument("--disable-extensions")            # 禁用扩展
+    if PERSIST_BROWSER_SESSION:
+        # 固定用户数据目录以保留各平台登录态；set_user_data_path 会关闭 auto_port
+        profile_dir = os.path.abspath(BROWSER_PROFILE_DIR)
+        os.makedirs(profile_dir, exist_ok=True)
+        options.set_user_data_path(profile_dir)
+        logger.info(f"使用持久化浏览器用户目录: {profile_dir}")
+    else:
+        options.auto_port()
+
+    # 动态设置窗口大小和位置
+    options.set_argument(f"--window-size={half_width},{window_height}")    # 设置窗口大小为半屏
+    options.set_argument(f"--window-position={right_position},0")          # 设置窗口位置在右侧
+    options.set_argument("--force-device-scale-factor=1")                  # 强制设备缩放因子为1
+
+    if HEADLESS_MODE:
+        options.headless()  # 启用无头模式
+        logger.info("启用无头模式运行")
+    else:
+        logger.info("启用可视化模式运行")
+
+    # 启动浏览器
+    logger.info("[DEBUG] 准备启动 ChromiumPage")
+    page = ChromiumPage(options)
+    logger.info(f"[DEBUG] ChromiumPage 已启动，当前URL: {getattr(page, 'url', 'N/A')}")
+    return page
+
 
 #test giant
 # giant_cookies = login_giant_browser(tab, GIANT_ACCOUNT, GIANT_PASSWORD)
@@ -3127,45 +4386,6 @@ logger.info(f"[DEBUG] ChromiumPage 已启动，当前URL: {getattr(tab, 'url', '
 # valid_files = [f for f in os.listdir(STORAGE_DIR) if f.endswith('.fit') or f.endswith('.gpx')]
 # upload_success = upload_files_to_giant(tab, valid_files)
 
-# === 步骤1：先登录顽鹿获取认证上下文 ===
-logger.info("===== 步骤1：登录顽鹿平台 =====")
-session = create_retry_session()
-onelap_auth_context = None
-try:
-    logger.info("[DEBUG] 开始调用 login_onelap_browser()")
-    onelap_auth_context = login_onelap_browser(tab, ONELAP_ACCOUNT, ONELAP_PASSWORD)
-    session = build_onelap_api_session(
-        onelap_auth_context.get('token', ''),
-        onelap_auth_context.get('cookies', {}),
-        session=session,
-    )
-    logger.info(f"[DEBUG] login_onelap_browser() 返回，cookies数量: {len((onelap_auth_context or {}).get('cookies') or {})}")
-    logger.info("顽鹿登录完成，准备获取活动数据...")
-except Exception as e:
-    logger.critical(f"顽鹿登录失败: {e}")
-    if DEBUG_MODE:
-        logger.info("=" * 60)
-        logger.info("[DEBUG MODE] 浏览器将保持打开，请手动检查页面状态")
-        logger.info(f"[DEBUG MODE] 当前 URL: {tab.url}")
-        logger.info(f"[DEBUG MODE] 当前标题: {tab.title}")
-        try:
-            all_keys = tab.run_js("""
-                var keys = [];
-                for (var i = 0; i < localStorage.length; i++) {
-                    var k = localStorage.key(i);
-                    var v = localStorage.getItem(k);
-                    if (v && v.length > 100) v = v.substring(0, 100) + '...';
-                    keys.push(k + '=' + v);
-                }
-                return keys;
-            """)
-            logger.info(f"[DEBUG MODE] localStorage 内容: {all_keys}")
-        except Exception:
-            logger.info("[DEBUG MODE] 无法读取 localStorage 内容")
-        logger.info("[DEBUG MODE] 请在浏览器中手动完成登录或检查问题，然后按 Enter 关闭...")
-        input()
-    tab.close()
-    sys.exit(1)
 
 def get_latest_activity_xoss(tab):
     """从行者平台获取最新活动时间"""
@@ -3221,495 +4441,1080 @@ def get_latest_activity_xoss(tab):
         logger.error(f"行者操作失败: {e}")
         return False
 
-# === 步骤2：确定同步基准 ===
-logger.info("===== 步骤2：确定同步基准 =====")
-latest_sync_activity = None
-sync_benchmark_platform = None
-xoss_login_ok = False
-igpsport_empty_confirmed = False
-garmin_login_ok = False
 
-# 优先级1：行者 (XOSS)
-if XOSS_ENABLE_SYNC and XOSS_ACCOUNT and XOSS_PASSWORD and XOSS_ACCOUNT not in ['139xxxxxx', ''] and XOSS_PASSWORD not in ['xxxxxx', '']:
-    logger.info("尝试使用行者(XOSS)作为同步基准...")
+def is_browser_alive(tab):
+    """检查浏览器标签页是否仍可响应，守护模式每轮开始前调用"""
     try:
-        logger.info("[DEBUG] 准备打开行者登录页")
-        tab.get('https://www.imxingzhe.com/login')
-        logger.info(f"[DEBUG] 行者登录页已打开，当前URL: {tab.url}")
-        # ... (原有的行者登录代码) ...
+        return tab.run_js('return 1;', timeout=5) == 1
+    except Exception:
+        return False
 
-        # 点击“我已阅读并同意”
+
+_metrics_exporter = None
+
+
+def get_metrics_state_file():
+    """textfile 旁边保存跨进程累计值的文件，例如 onelap_sync.prom.state.json"""
+    return f'{METRICS_TEXTFILE}.state.json' if METRICS_TEXTFILE else ''
+
+
+def get_metrics_exporter():
+    """
+    按配置创建 Prometheus 导出器；未配置 textfile_path 和 http_port 时返回 None
+    配置了 textfile_path 时先载入上次保存的累计值，单次运行模式下计数器才能跨进程单调递增
+    """
+    global _metrics_exporter
+    if _metrics_exporter is None and (METRICS_TEXTFILE or METRICS_HTTP_PORT > 0):
+        const_labels = {'instance': METRICS_INSTANCE} if METRICS_INSTANCE else {}
+        _metrics_exporter = PrometheusExporter(const_labels=const_labels)
+        if METRICS_TEXTFILE:
+            _metrics_exporter.load_state(get_metrics_state_file())
+    return _metrics_exporter
+
+
+def start_metrics_server():
+    """配置了 http_port 时启动 /metrics 接口"""
+    exporter = get_metrics_exporter()
+    if exporter is None or METRICS_HTTP_PORT <= 0:
+        return
+    try:
+        exporter.start_http_server(METRICS_HTTP_PORT)
+    except OSError as e:
+        logger.warning(f"[Metrics] 指标接口启动失败（端口 {METRICS_HTTP_PORT}）: {e}")
+
+
+def publish_metrics(report, ok):
+    """把本轮运行报告合并进 Prometheus 指标，并按配置刷新 textfile"""
+    exporter = get_metrics_exporter()
+    if exporter is None:
+        return
+    exporter.collect(report, ok=ok)
+    if METRICS_TEXTFILE:
+        exporter.save_state(get_metrics_state_file())
+        if exporter.write_textfile(METRICS_TEXTFILE):
+            logger.debug(f"[Metrics] 指标已写入 {METRICS_TEXTFILE}")
+
+
+class SyncCycleError(Exception):
+    """同步周期内的致命错误，exit_code 对应单次运行模式下的进程退出码"""
+
+    def __init__(self, exit_code, message):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def parse_cron_field(field, min_value, max_value):
+    """解析单个 cron 字段（支持 *、a-b、a,b、*/n、a-b/n），返回允许值集合"""
+    values = set()
+    for part in field.split(','):
+        part = part.strip()
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f'cron 步长必须为正数: {field}')
+        if part in ('*', ''):
+            start, end = min_value, max_value
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = max_value if step > 1 else start
+        if start < min_value or end > max_value or start > end:
+            raise ValueError(f'cron 字段超出范围 [{min_value}-{max_value}]: {field}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def next_cron_time(expression, after):
+    """计算标准 5 字段 cron 表达式（分 时 日 月 周）在 after 之后的下一次触发时间"""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f'cron 表达式需要 5 个字段（分 时 日 月 周）: {expression}')
+    minutes = parse_cron_field(fields[0], 0, 59)
+    hours = parse_cron_field(fields[1], 0, 23)
+    days = parse_cron_field(fields[2], 1, 31)
+    months = parse_cron_field(fields[3], 1, 12)
+    weekdays = {value % 7 for value in parse_cron_field(fields[4], 0, 7)}  # 0 和 7 都表示周日
+    # 与 crontab 一致：日和周都被限制时，满足任意一个即可
+    day_restricted = not fields[2].startswith('*')
+    weekday_restricted = not fields[4].startswith('*')
+
+    candidate = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = candidate + timedelta(days=366 * 4)
+    while candidate < limit:
+        if candidate.month not in months:
+            candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            continue
+        day_ok = candidate.day in days
+        weekday_ok = (candidate.weekday() + 1) % 7 in weekdays
+        if day_restricted and weekday_restricted:
+            day_matched = day_ok or weekday_ok
+        else:
+            day_matched = day_ok and weekday_ok
+        if not day_matched:
+            candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            continue
+        if candidate.hour not in hours:
+            candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            continue
+        if candidate.minute not in minutes:
+            candidate += timedelta(minutes=1)
+            continue
+        return candidate
+    raise ValueError(f'cron 表达式没有可触发的时间: {expression}')
+
+
+def compute_next_daemon_run(cycle_started_at, now=None):
+    """根据 cron 或固定间隔计算守护模式下一轮开始时间"""
+    now = now or datetime.now()
+    if DAEMON_CRON:
+        return next_cron_time(DAEMON_CRON, now)
+    next_run = cycle_started_at + timedelta(minutes=DAEMON_INTERVAL_MINUTES)
+    # 本轮耗时超过间隔时立即开始下一轮，而不是累积补跑
+    return next_run if next_run > now else now
+
+
+def write_daemon_status(status):
+    """写入守护模式状态文件，便于外部查看最近一轮的耗时和下一次执行时间"""
+    try:
+        with open(DAEMON_STATUS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.warning(f"写入守护模式状态文件失败: {e}")
+
+
+def close_sync_resources(tab, runtime):
+    """关闭浏览器、顽鹿会话和 Garmin API 会话"""
+    global _garmin_api_session
+    if tab is not None:
         try:
-            checkbox = tab.ele('.van-checkbox', timeout=1)
-            if checkbox: checkbox.click()
-        except: pass
+            tab.close()
+        except Exception as e:
+            logger.debug(f"关闭浏览器失败: {e}")
+    session = runtime.pop('session', None)
+    if session is not None:
+        session.close()
+    runtime.pop('onelap_auth_context', None)
+    if _garmin_api_session is not None:
+        _garmin_api_session.close()
+        _garmin_api_session = None
+
+
+class SyncPipeline:
+    """一轮 OneLap 多平台同步的分阶段流水线
+
+    每个阶段都是独立方法，可以单独调用和计时；阶段间通过实例属性传递
+    中间结果（同步基准、活动列表、待上传文件等）。runtime 字典跨轮次保存
+    顽鹿会话和认证上下文，守护模式下可复用登录态。
+    """
+
+    STAGES = (
+        ('auth', 'auth'),
+        ('benchmark', 'benchmark'),
+        ('fetch', 'fetch'),
+        ('download', 'download'),
+        ('convert', 'convert'),
+        ('xoss_upload', 'upload_xoss'),
+        ('giant_upload', 'upload_giant'),
+        ('igpsport_upload', 'upload_igpsport'),
+        ('garmin_upload', 'upload_garmin'),
+        ('strava_upload', 'upload_strava'),
+        ('verify', 'verify'),
+        ('reverse_sync', 'reverse_sync'),
+    )
 
-        # 输入账号
-        tab.ele('@name=account').clear()
-        tab.ele('@name=account').input(XOSS_ACCOUNT)
-        tab.ele('@name=password').clear()
-        tab.ele('@name=password').input(XOSS_PASSWORD)
-
-        # 点击登录
-        clicked_selector = click_xoss_login_button(tab)
-        logger.info(f"[DEBUG] 行者登录按钮点击方式: {clicked_selector}")
-
-        xoss_login_submitted = wait_xoss_login_success(tab, timeout=12)
-        logger.info(f"[DEBUG] 行者提交登录后URL: {tab.url}, 标题: {tab.title}, login_success={xoss_login_submitted}")
-        xoss_login_ok = xoss_login_submitted
-        if not xoss_login_submitted:
-            logger.warning("[DEBUG] 行者登录提交后仍未检测到成功登录态，跳过XOSS基准提取")
+    def __init__(self, tab, runtime=None):
+        self.tab = tab
+        self.runtime = runtime if runtime is not None else {}
+        self.timings = {}
+        self.session = None
+        self.onelap_auth_context = None
+        self.latest_sync_activity = None
+        self.sync_benchmark_platform = None
+        self.xoss_login_ok = False
+        self.igpsport_empty_confirmed = False
+        self.garmin_login_ok = False
+        self.activities = []
+        self.onelap_catalog = None
+        self.latest_onelap_activity_time = None
+        self.downloaded_files = []
+        self.file_times = {}
+        self.valid_files = []
+        self.has_forward_sync_files = False
+        self.upload_paths = {}
+        self.outbox = None
+        self.upload_queue = {}
+
+    def run_stage(self, name):
+        """执行单个阶段并记录耗时（秒），name 为 STAGES 中的阶段名"""
+        method_name = dict(self.STAGES)[name]
+        started = time.time()
+        try:
+            with span(f'stage.{name}'):
+                return getattr(self, method_name)()
+        finally:
+            self.timings[name] = round(time.time() - started, 2)
+
+    def run(self, report_file=RUN_REPORT_FILE):
+        """按顺序执行全部阶段（步骤1-10），返回各阶段耗时；致命错误抛出 SyncCycleError
+
+        无论成功与否，结束时都会把本轮运行报告写入 report_file
+        """
+        report = reset_report()
+        ok = False
+        try:
+            for name, _ in self.STAGES:
+                self.run_stage(name)
+            ok = True
+        finally:
+            self.cleanup_converted_files()
+            if report_file and report.write(report_file):
+                logger.info(f"运行报告已写入: {report_file}")
+            publish_metrics(report, ok)
+        logger.info(f"本轮各步骤耗时(秒): {json.dumps(self.timings, ensure_ascii=False)}")
+        return self.timings
+
+    def auth(self):
+        """步骤1：登录顽鹿，优先复用 runtime 中仍然有效的登录态"""
+        # === 步骤1：先登录顽鹿获取认证上下文 ===
+        logger.info("===== 步骤1：登录顽鹿平台 =====")
+        self.session = self.runtime.get('session')
+        self.onelap_auth_context = self.runtime.get('onelap_auth_context')
+        if self.session is not None and self.onelap_auth_context and check_onelap_token_valid(self.onelap_auth_context):
+            logger.info("复用上一轮顽鹿登录态，跳过登录")
         else:
+            if self.session is not None:
+                self.session.close()
+            self.runtime['session'] = self.session = create_retry_session()
+            self.runtime['onelap_auth_context'] = self.onelap_auth_context = None
             try:
-                logger.info("[DEBUG] 开始通过当前已登录页面解析行者最新活动时间")
-                parsed = get_xoss_latest_activity_from_logged_in_tab(tab)
-                if parsed:
-                    latest_sync_activity = parsed
-                    sync_benchmark_platform = 'xoss'
-                    logger.info(f"成功通过当前页面获取行者最新记录: {parsed['activity_date']}")
-                    if parsed.get('source_text'):
-                        logger.info(f"[DEBUG] 行者当前页面来源文本: {parsed['source_text'][:200]}")
+                logger.info("[DEBUG] 开始调用 login_onelap_browser()")
+                self.onelap_auth_context = login_onelap_browser(self.tab, ONELAP_ACCOUNT, ONELAP_PASSWORD)
+                self.session = build_onelap_api_session(
+                    self.onelap_auth_context.get('token', ''),
+                    self.onelap_auth_context.get('cookies', {}),
+                    session=self.session,
+                )
+                self.runtime['onelap_auth_context'] = self.onelap_auth_context
+                logger.info(f"[DEBUG] login_onelap_browser() 返回，cookies数量: {len((self.onelap_auth_context or {}).get('cookies') or {})}")
+                logger.info("顽鹿登录完成，准备获取活动数据...")
+            except Exception as e:
+                logger.critical(f"顽鹿登录失败: {e}")
+                if DEBUG_MODE:
+                    logger.info("=" * 60)
+                    logger.info("[DEBUG MODE] 浏览器将保持打开，请手动检查页面状态")
+                    logger.info(f"[DEBUG MODE] 当前 URL: {self.tab.url}")
+                    logger.info(f"[DEBUG MODE] 当前标题: {self.tab.title}")
+                    try:
+                        all_keys = self.tab.run_js("""
+                            var keys = [];
+                            for (var i = 0; i < localStorage.length; i++) {
+                                var k = localStorage.key(i);
+                                var v = localStorage.getItem(k);
+                                if (v && v.length > 100) v = v.substring(0, 100) + '...';
+                                keys.push(k + '=' + v);
+                            }
+                            return keys;
+                        """)
+                        logger.info(f"[DEBUG MODE] localStorage 内容: {all_keys}")
+                    except Exception:
+                        logger.info("[DEBUG MODE] 无法读取 localStorage 内容")
+                    logger.info("[DEBUG MODE] 请在浏览器中手动完成登录或检查问题，然后按 Enter 关闭...")
+                    input()
+                raise SyncCycleError(1, f"顽鹿登录失败: {e}")
+
+    def benchmark(self):
+        """步骤2：按 行者 -> iGPSport -> 捷安特 -> Garmin -> Strava 的优先级确定同步基准"""
+        # === 步骤2：确定同步基准 ===
+        logger.info("===== 步骤2：确定同步基准 =====")
+        self.latest_sync_activity = None
+        self.sync_benchmark_platform = None
+        self.xoss_login_ok = False
+        self.igpsport_empty_confirmed = False
+        self.garmin_login_ok = False
+
+        # 优先级1：行者 (XOSS)
+        if XOSS_ENABLE_SYNC and XOSS_ACCOUNT and XOSS_PASSWORD and XOSS_ACCOUNT not in ['139xxxxxx', ''] and XOSS_PASSWORD not in ['xxxxxx', '']:
+            logger.info("尝试使用行者(XOSS)作为同步基准...")
+            try:
+                xoss_login_submitted = login_xoss_browser(self.tab, XOSS_ACCOUNT, XOSS_PASSWORD)
+                self.xoss_login_ok = xoss_login_submitted
+                if not xoss_login_submitted:
+                    logger.warning("[DEBUG] 行者登录提交后仍未检测到成功登录态，跳过XOSS基准提取")
                 else:
-                    logger.warning("未能通过当前页面解析出行者最新活动时间")
+                    try:
+                        logger.info("[DEBUG] 开始通过当前已登录页面解析行者最新活动时间")
+                        parsed = get_xoss_latest_activity_from_logged_in_tab(self.tab)
+                        if parsed:
+                            self.latest_sync_activity = parsed
+                            self.sync_benchmark_platform = 'xoss'
+                            logger.info(f"成功通过当前页面获取行者最新记录: {parsed['activity_date']}")
+                            if parsed.get('source_text'):
+                                logger.info(f"[DEBUG] 行者当前页面来源文本: {parsed['source_text'][:200]}")
+                        else:
+                            logger.warning("未能通过当前页面解析出行者最新活动时间")
+                    except Exception as e:
+                        logger.error(f"解析行者最新活动时间失败: {e}")
+
             except Exception as e:
-                logger.error(f"解析行者最新活动时间失败: {e}")
+                logger.error(f"行者登录或获取数据失败: {e}")
+                self.xoss_login_ok = False
+                # 失败后继续尝试下一个平台
 
-    except Exception as e:
-        logger.error(f"行者登录或获取数据失败: {e}")
-        xoss_login_ok = False
-        # 失败后继续尝试下一个平台
-
-# 如果行者失败或未配置，尝试 iGPSport
-if not latest_sync_activity and IGPSPORT_ENABLE_SYNC and IGPSPORT_ACCOUNT and IGPSPORT_PASSWORD:
-    logger.info("尝试使用 iGPSport 作为同步基准...")
-    try:
-        logger.info("[DEBUG] 开始调用 login_igpsport_browser() 获取基准")
-        login_igpsport_browser(tab, IGPSPORT_ACCOUNT, IGPSPORT_PASSWORD)
-        logger.info(f"[DEBUG] iGPSport 登录返回，当前URL: {tab.url}")
-        result = get_latest_activity_igpsport(tab)
-        if result:
-            if result.get('is_empty'):
-                igpsport_empty_confirmed = True
-                logger.warning("iGPSport 当前无活动记录，将按首次同步候选处理，并继续尝试其他平台基准")
+        # 如果行者失败或未配置，尝试 iGPSport
+        if not self.latest_sync_activity and IGPSPORT_ENABLE_SYNC and IGPSPORT_ACCOUNT and IGPSPORT_PASSWORD:
+            logger.info("尝试使用 iGPSport 作为同步基准...")
+            try:
+                logger.info("[DEBUG] 开始调用 login_igpsport_browser() 获取基准")
+                login_igpsport_browser(self.tab, IGPSPORT_ACCOUNT, IGPSPORT_PASSWORD)
+                logger.info(f"[DEBUG] iGPSport 登录返回，当前URL: {self.tab.url}")
+                result = get_latest_activity_igpsport(self.tab)
+                if result:
+                    if result.get('is_empty'):
+                        self.igpsport_empty_confirmed = True
+                        logger.warning("iGPSport 当前无活动记录，将按首次同步候选处理，并继续尝试其他平台基准")
+                    else:
+                        self.latest_sync_activity = result
+                        self.sync_benchmark_platform = 'igpsport'
+                        logger.info(f"成功获取 iGPSport 最新记录: {result['activity_date']}")
+                else:
+                    logger.warning("未能确认 iGPSport 最新记录，继续尝试其他平台")
+            except Exception as e:
+                logger.error(f"iGPSport 获取基准失败: {e}")
+
+        # 如果还不行，尝试 Giant
+        if not self.latest_sync_activity and GIANT_ENABLE_SYNC and GIANT_ACCOUNT and GIANT_PASSWORD:
+            logger.info("尝试使用 Giant 作为同步基准...")
+            try:
+                logger.info("[DEBUG] 开始调用 login_giant_browser() 获取基准")
+                login_giant_browser(self.tab, GIANT_ACCOUNT, GIANT_PASSWORD)
+                logger.info(f"[DEBUG] Giant 登录返回，当前URL: {self.tab.url}")
+                result = get_latest_activity_giant(self.tab)
+                if result:
+                    self.latest_sync_activity = result
+                    self.sync_benchmark_platform = 'giant'
+                    logger.info(f"成功获取 Giant 最新记录: {result['activity_date']}")
+            except Exception as e:
+                logger.error(f"Giant 获取基准失败: {e}")
+
+        # 如果还不行，尝试 Garmin
+        if not self.latest_sync_activity and GARMIN_ENABLE_SYNC and GARMIN_ACCOUNT and GARMIN_PASSWORD:
+            logger.info("尝试使用 Garmin 作为同步基准...")
+            try:
+                logger.info("[DEBUG] 开始调用 login_garmin_browser() 获取基准")
+                login_garmin_browser(self.tab, GARMIN_ACCOUNT, GARMIN_PASSWORD)
+                self.garmin_login_ok = True
+                logger.info(f"[DEBUG] Garmin 登录返回，当前URL: {self.tab.url}")
+                result = get_latest_activity_garmin(self.tab)
+                if result:
+                    self.latest_sync_activity = result
+                    self.sync_benchmark_platform = 'garmin'
+                    logger.info(f"成功获取 Garmin 最新记录: {result['activity_date']}")
+                else:
+                    logger.warning("未能确认 Garmin 最新记录，继续尝试其他平台")
+            except Exception as e:
+                logger.error(f"Garmin 获取基准失败: {e}")
+                self.garmin_login_ok = False
+
+        # 如果还不行，尝试 Strava
+        if not self.latest_sync_activity and STRAVA_ENABLE_SYNC and STRAVA_CLIENT_ID and STRAVA_CLIENT_SECRET and STRAVA_REFRESH_TOKEN:
+            logger.info("尝试使用 Strava 作为同步基准...")
+            try:
+                result = get_latest_activity_strava(CONFIG_FILE_PATH)
+                if result:
+                    self.latest_sync_activity = result
+                    self.sync_benchmark_platform = 'strava'
+                    logger.info(f"成功获取 Strava 最新记录: {result['activity_date']}")
+                else:
+                    logger.warning("未获取到 Strava 最新记录")
+            except Exception as e:
+                logger.error(f"Strava 获取基准失败: {e}")
+
+        if not self.latest_sync_activity:
+            if ONELAP_FULL_SYNC:
+                logger.warning("[WARN]未能从任何平台获取最新活动记录，但已显式启用 onelap_full_sync=true，将执行全量同步！")
+            elif self.igpsport_empty_confirmed:
+                logger.warning("[WARN]iGPSport 当前无活动记录，将按首次同步处理，返回全部 OneLap 活动继续上传。")
             else:
-                latest_sync_activity = result
-                sync_benchmark_platform = 'igpsport'
-                logger.info(f"成功获取 iGPSport 最新记录: {result['activity_date']}")
-        else:
-            logger.warning("未能确认 iGPSport 最新记录，继续尝试其他平台")
-    except Exception as e:
-        logger.error(f"iGPSport 获取基准失败: {e}")
-
-# 如果还不行，尝试 Giant
-if not latest_sync_activity and GIANT_ENABLE_SYNC and GIANT_ACCOUNT and GIANT_PASSWORD:
-    logger.info("尝试使用 Giant 作为同步基准...")
-    try:
-        logger.info("[DEBUG] 开始调用 login_giant_browser() 获取基准")
-        login_giant_browser(tab, GIANT_ACCOUNT, GIANT_PASSWORD)
-        logger.info(f"[DEBUG] Giant 登录返回，当前URL: {tab.url}")
-        result = get_latest_activity_giant(tab)
-        if result:
-            latest_sync_activity = result
-            sync_benchmark_platform = 'giant'
-            logger.info(f"成功获取 Giant 最新记录: {result['activity_date']}")
-    except Exception as e:
-        logger.error(f"Giant 获取基准失败: {e}")
-
-# 如果还不行，尝试 Garmin
-if not latest_sync_activity and GARMIN_ENABLE_SYNC and GARMIN_ACCOUNT and GARMIN_PASSWORD:
-    logger.info("尝试使用 Garmin 作为同步基准...")
-    try:
-        logger.info("[DEBUG] 开始调用 login_garmin_browser() 获取基准")
-        login_garmin_browser(tab, GARMIN_ACCOUNT, GARMIN_PASSWORD)
-        garmin_login_ok = True
-        logger.info(f"[DEBUG] Garmin 登录返回，当前URL: {tab.url}")
-        result = get_latest_activity_garmin(tab)
-        if result:
-            latest_sync_activity = result
-            sync_benchmark_platform = 'garmin'
-            logger.info(f"成功获取 Garmin 最新记录: {result['activity_date']}")
+                logger.critical("[ERROR]未能从任何平台获取最新活动记录，且未显式启用 onelap_full_sync=true；为避免误触发全量同步，程序终止。")
+                raise SyncCycleError(2, "未能确定同步基准")
         else:
-            logger.warning("未能确认 Garmin 最新记录，继续尝试其他平台")
-    except Exception as e:
-        logger.error(f"Garmin 获取基准失败: {e}")
-        garmin_login_ok = False
-
-# 如果还不行，尝试 Strava
-if not latest_sync_activity and STRAVA_ENABLE_SYNC and STRAVA_CLIENT_ID and STRAVA_CLIENT_SECRET and STRAVA_REFRESH_TOKEN:
-    logger.info("尝试使用 Strava 作为同步基准...")
-    try:
-        result = get_latest_activity_strava(CONFIG_FILE_PATH)
-        if result:
-            latest_sync_activity = result
-            sync_benchmark_platform = 'strava'
-            logger.info(f"成功获取 Strava 最新记录: {result['activity_date']}")
+            logger.info(f"[OK]同步基准确定: {self.sync_benchmark_platform}, 最新时间: {self.latest_sync_activity['activity_date']}")
+
+        if ONELAP_FULL_SYNC:
+            logger.info("[OK]已显式启用 OneLap 全量下载开关，将忽略同步基准，执行全量同步")
+            self.latest_sync_activity = None
+
+    def fetch(self):
+        """步骤3a：按同步基准拉取顽鹿活动列表"""
+        logger.info("===== 步骤3：开始执行 FIT 文件下载任务 =====")
+        self.activities = []
+        self.latest_onelap_activity_time = None
+        try:
+            logger.info(f"[DEBUG] 进入步骤3，latest_sync_activity={'有' if self.latest_sync_activity else '无'}，benchmark平台={self.sync_benchmark_platform}")
+            self.onelap_catalog = load_onelap_catalog()
+            self.activities = fetch_activities(self.session, self.onelap_auth_context, self.latest_sync_activity,
+                                               catalog=self.onelap_catalog)
+
+            logger.info(f"[DEBUG] fetch_activities() 返回 {len(self.activities)} 个活动")
+            incr('onelap_activities_discovered', len(self.activities))
+            logger.info(f"总共需要处理 {len(self.activities)} 个活动")
+
+            for activity in self.activities:
+                try:
+                    activity_time = activity.start_time
+                    time_str = activity.start_time_text or "未知时间"
+                    distance_km = round(activity.distance / 1000, 2)
+                    logger.info(f"时间: {time_str}, 距离: {distance_km}km, 爬升: {activity.elevation:g}m")
+                    if activity_time and (self.latest_onelap_activity_time is None or activity_time > self.latest_onelap_activity_time):
+                        self.latest_onelap_activity_time = activity_time
+                except Exception as e:
+                    logger.warning(f"时间格式化失败: {e}, record_id={activity.record_id}")
+        except Exception as e:
+            logger.critical("主流程发生致命错误", exc_info=True)
+            raise SyncCycleError(1, f"OneLap 活动列表获取失败: {e}")
+
+    def download(self):
+        """步骤3b：下载 FIT 文件并确定本轮需要上传的文件列表"""
+        self.downloaded_files = []
+        self.file_times = {}
+        self.outbox = UploadOutbox()
+        upload_platforms = get_enabled_upload_platforms()
+        try:
+            onelap_download_state = load_onelap_download_state()
+            onelap_detail_cache = load_onelap_detail_cache()
+            ensure_storage_dir(STORAGE_DIR)
+
+            for idx, activity in enumerate(self.activities, 1):
+                logger.debug(f"正在处理第 {idx}/{len(self.activities)} 个活动")
+                file_path = download_fit_file(self.session, activity, onelap_download_state, storage_dir=STORAGE_DIR,
+                                              detail_cache=onelap_detail_cache)
+                if file_path and file_path not in self.downloaded_files:
+                    self.downloaded_files.append(file_path)
+                    self.outbox.enqueue(file_path, upload_platforms)
+                    if activity.start_time:
+                        self.file_times[os.path.abspath(file_path)] = activity.start_time
+                    if self.onelap_catalog is not None:
+                        self.onelap_catalog.set_filename(activity.record_id, os.path.basename(file_path))
+            if self.onelap_catalog is not None:
+                self.onelap_catalog.save()
+
+            logger.info(f"===== FIT 文件下载完成，本次可用于上传的文件数: {len(self.downloaded_files)} =====")
+        except Exception as e:
+            logger.critical("主流程发生致命错误", exc_info=True)
+            raise SyncCycleError(1, f"OneLap 下载阶段失败: {e}")
+
+        # 获取本次需要上传的文件列表：各平台只处理自己在上传待办中未完成的条目（含上次中断遗留的文件）
+        self.valid_files = list(self.downloaded_files)
+        self.upload_queue = {name: self.outbox.pending(name) for name in upload_platforms}
+        for name, files in self.upload_queue.items():
+            leftover = len(set(files) - {os.path.abspath(path) for path in self.valid_files})
+            if leftover:
+                logger.info(f"[{name}] 上传待办中有 {leftover} 个上次未完成的文件，本轮继续上传")
+        self.has_forward_sync_files = any(self.upload_queue.values())
+        if not self.has_forward_sync_files:
+            logger.warning("没有找到符合条件的文件，跳过 OneLap 正向上传步骤。")
+
+    def convert(self):
+        """为 Strava 预先生成 GCJ-02 -> WGS84 转换后的 FIT 文件，上传阶段直接使用"""
+        self.upload_paths = {}
+        if not self.has_forward_sync_files:
+            return
+        if not (STRAVA_ENABLE_SYNC and STRAVA_CLIENT_ID and STRAVA_CLIENT_SECRET and STRAVA_GCJ02_TO_WGS84):
+            return
+        if not FIT_COORD_TRANSFORM_AVAILABLE:
+            logger.warning('[Strava] GCJ-02 -> WGS84 转换已启用但 fit_coord_transform 模块未加载，将上传原始文件')
+            return
+        strava_files = self.upload_queue.get('strava') or []
+        for file_path in strava_files:
+            try:
+                upload_path = get_strava_upload_path(file_path, enable_conversion=True)
+            except Exception as e:
+                logger.warning(f"[Strava] 坐标转换失败，将上传原始文件 {os.path.basename(file_path)}: {e}")
+                continue
+            if upload_path != file_path:
+                self.upload_paths[file_path] = upload_path
+        logger.info(f"[Strava] 坐标转换完成 {len(self.upload_paths)}/{len(strava_files)} 个文件")
+
+    def cleanup_converted_files(self):
+        """清理转换阶段生成但未被上传阶段消费的临时文件"""
+        for file_path, upload_path in self.upload_paths.items():
+            cleanup_temp_file(upload_path, file_path)
+        self.upload_paths = {}
+
+    def count_upload_results(self, platform, file_paths):
+        """
+        platform_uploads 只在这里计数：各平台上传阶段结束时（接口直传和页面上传都处理完之后）按上传待办中的最终状态逐个文件计入，
+        仍为 pending 的文件本轮没有处理，不计数；unconfirmed 的文件等 verify_unconfirmed_uploads() 核对出结论后再计数
+        """
+        for file_path in file_paths:
+            status = self.outbox.status(platform, file_path)
+            if status in ('pending', 'unconfirmed'):
+                continue
+            incr('platform_uploads', platform=platform,
+                 result={'done': 'success', 'failed': 'failed'}.get(status, 'unknown'))
+
+    def upload_xoss(self):
+        """步骤4：分批上传到行者"""
+        # === 步骤4：跳转到行者上传页面并分批上传文件 ===
+        logger.info("===== 步骤4：开始上传文件到行者平台 =====")
+        valid_files = self.upload_queue.get('xoss') or []
+        if not valid_files:
+            logger.info("没有 OneLap 新文件，跳过行者平台上传")
+        elif not XOSS_ENABLE_SYNC:
+            logger.info("行者平台同步已禁用，跳过行者平台上传")
+        elif not (XOSS_ACCOUNT and XOSS_PASSWORD and XOSS_ACCOUNT not in ['139xxxxxx', ''] and XOSS_PASSWORD not in ['xxxxxx', '']):
+            logger.info("未配置行者账号或密码为默认值，跳过行者平台上传")
+        elif not self.xoss_login_ok:
+            logger.info("行者登录失败或不可用，跳过行者平台上传")
         else:
-            logger.warning("未获取到 Strava 最新记录")
-    except Exception as e:
-        logger.error(f"Strava 获取基准失败: {e}")
+            self.outbox.mark('xoss', valid_files, 'in_flight')
+            pending_files = upload_files_to_xoss_api(self.tab, valid_files) if XOSS_DIRECT_UPLOAD else valid_files
+            self.outbox.mark('xoss', [path for path in valid_files if path not in pending_files], 'done')
+            if not pending_files:
+                self.count_upload_results('xoss', valid_files)
+                return
+
+            self.tab.get(XOSS_UPLOAD_PAGE_URL)
+            time.sleep(2)  # 等待页面加载
+
+            batcher = AdaptiveBatcher('xoss', MAX_FILES_PER_BATCH)
+            for batch in batcher.batches(pending_files):
+                logger.info(f"正在上传批次文件，共 {len(batch)} 个文件")
+
+                # 在选择文件之前开始监听，点击上传后按接口响应确认每个文件
+                listening = start_upload_listener(self.tab, XOSS_UPLOAD_API_MARKERS)
+                file_results = {}
+                try:
+                    # 查找上传区域（行者平台的上传组件）
+                    # 可能的选择器，按优先级尝试
+                    upload_selectors = [
+                        '.van-uploader__input'
+                    ]
 
-if not latest_sync_activity:
-    if ONELAP_FULL_SYNC:
-        logger.warning("[WARN]未能从任何平台获取最新活动记录，但已显式启用 onelap_full_sync=true，将执行全量同步！")
-    elif igpsport_empty_confirmed:
-        logger.warning("[WARN]iGPSport 当前无活动记录，将按首次同步处理，返回全部 OneLap 活动继续上传。")
-    else:
-        logger.critical("[ERROR]未能从任何平台获取最新活动记录，且未显式启用 onelap_full_sync=true；为避免误触发全量同步，程序终止。")
-        tab.close()
-        session.close()
-        sys.exit(2)
-else:
-    logger.info(f"[OK]同步基准确定: {sync_benchmark_platform}, 最新时间: {latest_sync_activity['activity_date']}")
+                    upload_element = None
+                    for selector in upload_selectors:
+                        try:
+                            upload_element = self.tab.ele(selector, timeout=2)
+                            if upload_element:
+                                logger.info(f"找到上传元素: {selector}")
+                                break
+                        except Exception:
+                            logger.error(f"找不到行者里的上传按钮元素: {selector}")
+                            continue
 
-if ONELAP_FULL_SYNC:
-    logger.info("[OK]已显式启用 OneLap 全量下载开关，将忽略同步基准，执行全量同步")
-    latest_sync_activity = None
+                    if not upload_element:
+                        # 如果找不到特定的上传组件，尝试通过文件输入框上传
+                        try:
+                            upload_element = self.tab.ele('@type=file', timeout=3)
+                        except Exception:
+                            logger.error("无法找到文件上传元素")
+                            continue
+
+                    # 逐个上传文件
+                    for file_path in batch:
+                        try:
+                            logger.info(f"正在上传文件: {os.path.basename(file_path)}")
+                            if hasattr(upload_element, 'click.to_upload'):
+                                upload_element.click.to_upload(file_path)
+                            else:
+                                upload_element.input(file_path)
+                            time.sleep(0.5)  # 等待文件加入上传列表
+                            logger.info(f"已选择文件: {os.path.basename(file_path)}")
+                        except Exception as e:
+                            logger.error(f"选择上传文件失败 {file_path}: {e}")
+                            file_results[os.path.basename(file_path)] = ('failed', str(e))
+                            continue
 
+                    # 查找并点击"上传"按钮 - 通过class定位第二个按钮
+                    try: 
+                        # 正确的CSS选择器：用点号连接多个class
+                        upload_btn = self.tab.ele('.fit_btn van-button van-button--primary van-button--normal',index=2)
 
-# === 步骤3：开始执行 FIT 文件下载任务 ===
-logger.info("===== 步骤3：开始执行 FIT 文件下载任务 =====")
-downloaded_files = []
-try:
-    logger.info(f"[DEBUG] 进入步骤3，latest_sync_activity={'有' if latest_sync_activity else '无'}，benchmark平台={sync_benchmark_platform}")
-    activities = fetch_activities(session, onelap_auth_context, latest_sync_activity)
+                        if upload_btn:
+                            upload_btn.click()
+                            logger.info("通过文本内容成功点击上传按钮")
+                            time.sleep(2)
+                        else:
+                            logger.error("无法找到行者的上传按钮")
+
+
+                    except Exception as e:
+                        logger.error(f"查找上传按钮失败: {e}")
+
+                    if listening:
+                        selected = [path for path in batch if os.path.basename(path) not in file_results]
+                        file_results.update(wait_upload_responses(self.tab, selected, parse_xoss_upload_packet, 'xoss'))
+
+                except Exception as e:
+                    logger.error(f"批次上传失败: {e}")
+                    batcher.record('failed')
+                    self.outbox.mark('xoss', batch, 'failed', str(e))
+                    continue
+                finally:
+                    if listening:
+                        stop_upload_listener(self.tab)
+
+                # 只有上传接口确认过的文件才标记完成，没收到结果的记为 unconfirmed，稍后按活动列表核对
+                self.outbox.mark_results('xoss', batch, file_results)
+                failed_files = [name for name, (status, _) in file_results.items() if status == 'failed']
+                batcher.record(upload_batch_result(file_results, len(batch)))
+                if len(file_results) < len(batch):
+                    logger.warning(f"行者本批有 {len(batch) - len(file_results)} 个文件未收到上传接口结果，稍后按活动列表核对")
+                if failed_files:
+                    logger.warning(f"行者本批 {len(failed_files)} 个文件上传失败: {failed_files}")
+                time.sleep(2)  # 批次间隔
+
+            # 找不到上传元素而跳过的批次没有结果，同样记为失败
+            unfinished = [path for path in pending_files if self.outbox.status('xoss', path) == 'in_flight']
+            self.outbox.mark('xoss', unfinished, 'failed', '页面上传未完成')
+            self.count_upload_results('xoss', valid_files)
+
+    def upload_giant(self):
+        """步骤5：上传到捷安特骑行"""
+        # === 步骤5：上传文件到捷安特骑行平台 ===
+        logger.info("===== 步骤5：上传文件到捷安特骑行平台 =====")
+        try:
+            # 检查是否启用了捷安特同步
+            valid_files = self.upload_queue.get('giant') or []
+            if not valid_files:
+                logger.info("没有 OneLap 新文件，跳过捷安特平台上传")
+            elif not GIANT_ENABLE_SYNC:
+                logger.info("捷安特平台同步已禁用，跳过捷安特平台上传")
+            elif not (GIANT_ACCOUNT and GIANT_PASSWORD and GIANT_ACCOUNT not in ['139xxxxxx', ''] and GIANT_PASSWORD not in ['xxxxxx', '']):
+                logger.info("未配置捷安特账号或密码为默认值，跳过捷安特平台上传")
+            else:
+                # 登录捷安特平台
+                logger.info("开始登录捷安特骑行平台...")
+                giant_cookies = login_giant_browser(self.tab, GIANT_ACCOUNT, GIANT_PASSWORD)
+                logger.info("捷安特登录完成，开始上传文件...")
+
+                self.outbox.mark('giant', valid_files, 'in_flight')
+                pending_files = upload_files_to_giant_api(giant_cookies, valid_files) if GIANT_DIRECT_UPLOAD else valid_files
+                self.outbox.mark('giant', [path for path in valid_files if path not in pending_files], 'done')
+
+                # 接口未接受的文件走页面上传
+                upload_success = True
+                if pending_files:
+                    upload_success = upload_files_to_giant(self.tab, pending_files, outbox=self.outbox)
+                    # 页面流程中途退出时没有结果的文件记为失败，下轮重试
+                    unfinished = [path for path in pending_files if self.outbox.status('giant', path) == 'in_flight']
+                    self.outbox.mark('giant', unfinished, 'failed', '页面上传未完成')
+                self.count_upload_results('giant', valid_files)
+
+                if upload_success:
+                    logger.info("文件已成功上传到捷安特平台")
+                else:
+                    logger.warning("捷安特平台上传出现问题，请手动检查")
 
-    logger.info(f"[DEBUG] fetch_activities() 返回 {len(activities)} 个活动")
-    logger.info(f"总共需要处理 {len(activities)} 个活动")
+        except Exception as e:
+            logger.error(f"捷安特平台上传过程出错: {e}")
+            logger.info("继续执行后续步骤...")
+
+    def upload_igpsport(self):
+        """步骤6：上传到 iGPSport"""
+        # === 步骤6：上传文件到iGPSport平台 ===
+        logger.info("===== 步骤6：上传文件到iGPSport平台 =====")
+        try:
+            # 检查是否启用了iGPSport同步
+            valid_files = self.upload_queue.get('igpsport') or []
+            if not valid_files:
+                logger.info("没有 OneLap 新文件，跳过iGPSport平台上传")
+            elif not IGPSPORT_ENABLE_SYNC:
+                logger.info("iGPSport平台同步已禁用，跳过iGPSport平台上传")
+            elif not (IGPSPORT_ACCOUNT and IGPSPORT_PASSWORD and IGPSPORT_ACCOUNT not in ['139xxxxxx', ''] and IGPSPORT_PASSWORD not in ['xxxxxx', '']):
+                logger.info("未配置iGPSport账号或密码为默认值，跳过iGPSport平台上传")
+            else:
+                if IGPSPORT_DIRECT_UPLOAD:
+                    self.outbox.mark('igpsport', valid_files, 'in_flight')
+                    pending_files = upload_files_to_igpsport_api(valid_files)
+                    self.outbox.mark('igpsport', [path for path in valid_files if path not in pending_files], 'done')
+                else:
+                    pending_files = valid_files
+                upload_success = True
+                if pending_files:
+                    # 登录iGPSport平台
+                    logger.info("开始登录iGPSport平台...")
+                    login_igpsport_browser(self.tab, IGPSPORT_ACCOUNT, IGPSPORT_PASSWORD)
+                    logger.info("iGPSport登录完成，开始上传文件...")
+
+                    # 上传文件到iGPSport平台
+                    upload_success = upload_files_to_igpsport(self.tab, pending_files, outbox=self.outbox)
+                self.count_upload_results('igpsport', valid_files)
+
+                if upload_success:
+                    logger.info("文件已成功上传到iGPSport平台")
+                else:
+                    logger.warning("iGPSport平台上传出现问题，请手动检查")
 
-    latest_onelap_activity_time = None
-    onelap_download_state = load_onelap_download_state()
-    ensure_storage_dir(STORAGE_DIR)
+        except Exception as e:
+            logger.error(f"iGPSport平台上传过程出错: {e}")
+            logger.info("继续执行后续步骤...")
 
-    for activity in activities:
+    def upload_garmin(self):
+        """步骤7：上传到 Garmin Connect"""
+        # === 步骤7：上传文件到 Garmin Connect 平台 ===
+        logger.info("===== 步骤7：上传文件到 Garmin Connect 平台 =====")
         try:
-            activity_time = parse_onelap_activity_time(activity)
-            time_str = activity_time.strftime('%Y-%m-%d %H:%M:%S') if activity_time else "未知时间"
-            distance_km = round(float(activity.get('totalDistance') or 0) / 1000, 2)
-            elevation = activity.get('elevation', 0)
-            logger.info(f"时间: {time_str}, 距离: {distance_km}km, 爬升: {elevation}m")
-            if activity_time and (latest_onelap_activity_time is None or activity_time > latest_onelap_activity_time):
-                latest_onelap_activity_time = activity_time
+            valid_files = self.upload_queue.get('garmin') or []
+            if not valid_files:
+                logger.info("没有 OneLap 新文件，跳过 Garmin 上传")
+            elif not GARMIN_ENABLE_SYNC:
+                logger.info("Garmin 平台同步已禁用，跳过 Garmin 上传")
+            elif not (GARMIN_ACCOUNT and GARMIN_PASSWORD and GARMIN_ACCOUNT not in ['139xxxxxx', ''] and GARMIN_PASSWORD not in ['xxxxxx', '']):
+                logger.info("未配置 Garmin 账号或密码为默认值，跳过 Garmin 上传")
+            else:
+                logger.info("开始登录 Garmin Connect 平台...")
+                if not self.garmin_login_ok:
+                    login_garmin_browser(self.tab, GARMIN_ACCOUNT, GARMIN_PASSWORD)
+                    self.garmin_login_ok = True
+                logger.info("Garmin 登录完成，开始上传文件...")
+
+                upload_success = upload_files_to_garmin(self.tab, valid_files, outbox=self.outbox, catalog=self.onelap_catalog,
+                                                        file_times=self.file_times)
+                self.count_upload_results('garmin', valid_files)
+                if upload_success:
+                    logger.info("文件已成功上传到 Garmin Connect 平台")
+                else:
+                    logger.warning("Garmin Connect 平台上传出现问题，请手动检查")
         except Exception as e:
-            logger.warning(f"时间格式化失败: {e}, created_at={activity.get('created_at')}")
-
-    for idx, activity in enumerate(activities, 1):
-        logger.debug(f"正在处理第 {idx}/{len(activities)} 个活动")
-        file_path = download_fit_file(session, activity, onelap_download_state, storage_dir=STORAGE_DIR)
-        if file_path and file_path not in downloaded_files:
-            downloaded_files.append(file_path)
-
-    logger.info(f"===== FIT 文件下载完成，本次可用于上传的文件数: {len(downloaded_files)} =====")
-except Exception as e:
-    logger.critical("主流程发生致命错误", exc_info=True)
-    tab.close()
-    session.close()
-    sys.exit(1)
-
-# 获取本次需要上传的文件列表
-valid_files = list(downloaded_files)
-has_forward_sync_files = bool(valid_files)
-if not has_forward_sync_files:
-    logger.warning("没有找到符合条件的文件，跳过 OneLap 正向上传步骤。")
-
-# === 步骤4：跳转到行者上传页面并分批上传文件 ===
-logger.info("===== 步骤4：开始上传文件到行者平台 =====")
-if not has_forward_sync_files:
-    logger.info("没有 OneLap 新文件，跳过行者平台上传")
-elif not XOSS_ENABLE_SYNC:
-    logger.info("行者平台同步已禁用，跳过行者平台上传")
-elif not (XOSS_ACCOUNT and XOSS_PASSWORD and XOSS_ACCOUNT not in ['139xxxxxx', ''] and XOSS_PASSWORD not in ['xxxxxx', '']):
-    logger.info("未配置行者账号或密码为默认值，跳过行者平台上传")
-elif not xoss_login_ok:
-    logger.info("行者登录失败或不可用，跳过行者平台上传")
-else:
-    tab.get('https://www.imxingzhe.com/upload/fit')
-    time.sleep(2)  # 等待页面加载
+            logger.error(f"Garmin Connect 平台上传过程出错: {e}")
+            logger.info("继续执行后续步骤...")
 
-    for batch in batch_files(valid_files, MAX_FILES_PER_BATCH):
-        logger.info(f"正在上传批次文件，共 {len(batch)} 个文件")
-        
+    def upload_strava(self):
+        """步骤8：上传到 Strava，使用转换阶段生成的 WGS84 文件"""
+        # === 步骤8：上传文件到 Strava 平台 ===
+        logger.info("===== 步骤8：上传文件到 Strava 平台 =====")
         try:
-            # 查找上传区域（行者平台的上传组件）
-            # 可能的选择器，按优先级尝试
-            upload_selectors = [
-                '.van-uploader__input'
-            ]
-            
-            upload_element = None
-            for selector in upload_selectors:
-                try:
-                    upload_element = tab.ele(selector, timeout=2)
-                    if upload_element:
-                        logger.info(f"找到上传元素: {selector}")
-                        break
-                except Exception:
-                    logger.error(f"找不到行者里的上传按钮元素: {selector}")
-                    continue
-            
-            if not upload_element:
-                # 如果找不到特定的上传组件，尝试通过文件输入框上传
-                try:
-                    upload_element = tab.ele('@type=file', timeout=3)
-                except Exception:
-                    logger.error("无法找到文件上传元素")
-                    continue
-            
-            # 逐个上传文件
-            for file_path in batch:
+            valid_files = self.upload_queue.get('strava') or []
+            if not valid_files:
+                logger.info("没有 OneLap 新文件，跳过 Strava 上传")
+            elif not STRAVA_ENABLE_SYNC:
+                logger.info("Strava 平台同步已禁用，跳过 Strava 上传")
+            elif not (STRAVA_CLIENT_ID and STRAVA_CLIENT_SECRET):
+                logger.info("未配置 Strava client_id/client_secret，跳过 Strava 上传")
+            else:
+                self.outbox.mark('strava', valid_files, 'in_flight')
+                strava_result = upload_files_to_strava(valid_files, CONFIG_FILE_PATH, upload_paths=self.upload_paths)
+                # Strava 自身的上传状态按文件签名记录了成功/重复，据此逐个更新待办
+                strava_state = load_strava_upload_state()
+                for file_path in valid_files:
+                    try:
+                        uploaded = (strava_state.get(build_strava_file_signature(file_path)) or {}).get('uploaded')
+                    except Exception:
+                        uploaded = False
+                    self.outbox.mark('strava', [file_path], 'done' if uploaded else 'failed')
+                for result in ('success', 'skipped', 'failed'):
+                    incr('platform_uploads', strava_result.get(result, 0), platform='strava', result=result)
+                logger.info(f"Strava 上传摘要: 成功 {strava_result.get('success', 0)}，重复跳过 {strava_result.get('skipped', 0)}，失败 {strava_result.get('failed', 0)}")
+                if strava_result.get('ok', False):
+                    logger.info("文件已成功提交到 Strava 平台")
+                else:
+                    logger.warning("Strava 平台存在失败项，请检查上方分类日志")
+        except Exception as e:
+            logger.error(f"Strava 平台上传过程出错: {e}")
+            logger.info("继续执行后续步骤...")
+
+    def verify_unconfirmed_uploads(self):
+        """上传结果未确认的文件（含以前轮次遗留的）按各平台活动列表的最新日期核对，规则见 UploadOutbox"""
+        latest_fetchers = {
+            'xoss': get_xoss_latest_activity_from_logged_in_tab,
+            'giant': get_latest_activity_giant,
+            'igpsport': get_latest_activity_igpsport,
+            'garmin': get_latest_activity_garmin,
+        }
+        for platform_name in get_enabled_upload_platforms():
+            fetch_latest = latest_fetchers.get(platform_name)
+            unconfirmed = self.outbox.unconfirmed(platform_name) if fetch_latest else []
+            if not unconfirmed:
+                continue
+            logger.info(f"[{platform_name}] 有 {len(unconfirmed)} 个文件上传结果未确认，按活动列表最新日期核对")
+            try:
+                latest = fetch_latest(self.tab)
+            except Exception as e:
+                logger.warning(f"[{platform_name}] 获取最新活动失败，未确认的文件留到下轮核对: {e}")
+                continue
+            if not latest:
+                logger.warning(f"[{platform_name}] 未能获取最新活动，未确认的文件留到下轮核对")
+                continue
+            resolved = self.outbox.verify_unconfirmed(
+                platform_name, latest.get('time_obj'),
+                lambda path: get_upload_file_time(path, file_times=self.file_times, catalog=self.onelap_catalog))
+            confirmed = [path for path in resolved if self.outbox.status(platform_name, path) == 'done']
+            logger.info(f"[{platform_name}] 核对完成: 已在活动列表中 {len(confirmed)} 个，未找到(稍后重传) {len(resolved) - len(confirmed)} 个，"
+                        f"缺少活动时间无法核对 {len(unconfirmed) - len(resolved)} 个")
+            self.count_upload_results(platform_name, resolved)
+
+    def verify(self):
+        """步骤9：回到目标平台验证同步结果"""
+        # === 步骤9：验证同步结果 ===
+        logger.info("===== 步骤9：验证同步结果 =====")
+        try:
+            if self.outbox is not None:
+                self.verify_unconfirmed_uploads()
+            if not self.has_forward_sync_files:
+                logger.info("没有 OneLap 新文件，跳过正向同步验证步骤")
+            elif XOSS_ENABLE_SYNC and self.xoss_login_ok and XOSS_ACCOUNT and XOSS_PASSWORD and XOSS_ACCOUNT not in ['139xxxxxx', ''] and XOSS_PASSWORD not in ['xxxxxx', '']:
+                logger.info("跳转到行者活动列表页面验证同步结果...")
+                self.tab.get('https://www.imxingzhe.com/workouts/list')
+                wait_xoss_activity_page_ready(self.tab, timeout=12)
+
+                logger.info("请检查行者平台的活动列表，确认文件是否已成功同步")
+                logger.info("程序将在15秒后自动关闭，您可以手动查看最新的活动记录")
+
                 try:
-                    logger.info(f"正在上传文件: {os.path.basename(file_path)}")
-                    if hasattr(upload_element, 'click.to_upload'):
-                        upload_element.click.to_upload(file_path)
+                    parsed = parse_xoss_latest_activity_from_html(self.tab.html)
+                    if parsed:
+                        logger.info("==最后查看行者平台最新的活动记录如下==:")
+                        logger.info(f"  1. {parsed['activity_date']} - {parsed.get('source_text', '')[:160]}")
                     else:
-                        upload_element.input(file_path)
-                    time.sleep(0.5)  # 等待文件上传完成
-                    logger.info(f"文件上传完成: {os.path.basename(file_path)}")
+                        logger.warning("未找到活动表格或活动数据，请手动检查页面")
                 except Exception as e:
-                    logger.error(f"上传文件失败 {file_path}: {e}")
-                    continue
-            
-            # 查找并点击"上传"按钮 - 通过class定位第二个按钮
-            try: 
-                # 正确的CSS选择器：用点号连接多个class
-                upload_btn = tab.ele('.fit_btn van-button van-button--primary van-button--normal',index=2)
-
-                if upload_btn:
-                    upload_btn.click()
-                    logger.info("通过文本内容成功点击上传按钮")
-                    time.sleep(2)
+                    logger.debug(f"获取验证数据时出错: {e}")
+                    logger.info("自动验证失败，请手动查看页面内容")
+
+                if not DAEMON_MODE:
+                    time.sleep(15)  # 单次运行时留出时间查看页面，守护模式无需等待
+            elif IGPSPORT_ENABLE_SYNC:
+                logger.info("行者未配置，改为验证 iGPSport 最新记录日期...")
+                latest_igpsport = get_latest_activity_igpsport(self.tab)
+                if latest_igpsport and latest_igpsport.get('time_obj'):
+                    igp_time = latest_igpsport['time_obj']
+                    logger.info(f"iGPSport 当前最新日期: {igp_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                    if self.latest_onelap_activity_time:
+                        logger.info(f"本次同步最新 OneLap 时间: {self.latest_onelap_activity_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                        if igp_time.date() >= self.latest_onelap_activity_time.date():
+                            logger.info("[OK]iGPSport 日期验证通过（最新日期不早于本次同步日期）")
+                        else:
+                            logger.warning("[WARN]iGPSport 日期验证未通过（可能仍在处理导入队列，稍后刷新再看）")
                 else:
-                    logger.error("无法找到行者的上传按钮")
-                    
-                    
-            except Exception as e:
-                logger.error(f"查找上传按钮失败: {e}")
-                    
+                    logger.warning("未能获取 iGPSport 最新记录用于验证，请手动查看运动记录列表")
+            elif GARMIN_ENABLE_SYNC:
+                logger.info("改为验证 Garmin 最新记录日期...")
+                if not self.garmin_login_ok:
+                    login_garmin_browser(self.tab, GARMIN_ACCOUNT, GARMIN_PASSWORD)
+                    self.garmin_login_ok = True
+                latest_garmin = get_latest_activity_garmin(self.tab)
+                if latest_garmin and latest_garmin.get('time_obj'):
+                    garmin_time = latest_garmin['time_obj']
+                    logger.info(f"Garmin 当前最新日期: {garmin_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                    if self.latest_onelap_activity_time:
+                        logger.info(f"本次同步最新 OneLap 时间: {self.latest_onelap_activity_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                        if garmin_time.date() >= self.latest_onelap_activity_time.date():
+                            logger.info("[OK]Garmin 日期验证通过（最新日期不早于本次同步日期）")
+                        else:
+                            logger.warning("[WARN]Garmin 日期验证未通过（可能仍在处理导入队列，稍后刷新再看）")
+                else:
+                    logger.warning("未能获取 Garmin 最新记录用于验证，请手动查看活动列表")
+            else:
+                logger.info("未配置行者、iGPSport 或 Garmin 上传，跳过验证步骤")
+
         except Exception as e:
-            logger.error(f"批次上传失败: {e}")
-            continue
-        
-        time.sleep(2)  # 批次间隔
+            logger.error(f"验证步骤失败: {e}")
+            logger.info("请手动访问行者平台确认同步结果")
+            time.sleep(5)
+
+    def reverse_sync(self):
+        """步骤10：iGPSport -> OneLap 反向增量同步"""
+        # === 步骤10：iGPSport → OneLap 增量同步（新增）===
+        logger.info("===== 步骤10：iGPSport → OneLap 增量同步 =====")
+        try:
+            # 检查是否启用了增量同步
+            incremental_sync_class = load_incremental_sync_class() if IGPSPORT_TO_ONELAP_ENABLE else None
+            if not IGPSPORT_TO_ONELAP_ENABLE:
+                logger.info("iGPSport → OneLap 增量同步已禁用，跳过")
+            elif incremental_sync_class is None:
+                logger.warning("增量同步模块不可用，跳过")
+            elif not (IGPSPORT_ACCOUNT and IGPSPORT_PASSWORD and ONELAP_ACCOUNT and ONELAP_PASSWORD):
+                logger.warning("iGPSport 或 OneLap 账号未配置，跳过增量同步")
+            else:
+                logger.info("开始执行 iGPSport → OneLap 增量同步...")
+
+                # 构造配置
+                sync_config = {
+                    'igpsport': {
+                        'username': IGPSPORT_ACCOUNT,
+                        'password': IGPSPORT_PASSWORD
+                    },
+                    'onelap': {
+                        'username': ONELAP_ACCOUNT,
+                        'password': ONELAP_PASSWORD,
+                        'tab': self.tab,
+                        'owns_tab': False
+                    }
+                }
 
-# === 步骤5：上传文件到捷安特骑行平台 ===
-logger.info("===== 步骤5：上传文件到捷安特骑行平台 =====")
-try:
-    # 检查是否启用了捷安特同步
-    if not has_forward_sync_files:
-        logger.info("没有 OneLap 新文件，跳过捷安特平台上传")
-    elif not GIANT_ENABLE_SYNC:
-        logger.info("捷安特平台同步已禁用，跳过捷安特平台上传")
-    elif not (GIANT_ACCOUNT and GIANT_PASSWORD and GIANT_ACCOUNT not in ['139xxxxxx', ''] and GIANT_PASSWORD not in ['xxxxxx', '']):
-        logger.info("未配置捷安特账号或密码为默认值，跳过捷安特平台上传")
-    else:
-        # 登录捷安特平台
-        logger.info("开始登录捷安特骑行平台...")
-        giant_cookies = login_giant_browser(tab, GIANT_ACCOUNT, GIANT_PASSWORD)
-        logger.info("捷安特登录完成，开始上传文件...")
-        
-        # 上传文件到捷安特平台
-        upload_success = upload_files_to_giant(tab, valid_files)
-        
-        if upload_success:
-            logger.info("文件已成功上传到捷安特平台")
-        else:
-            logger.warning("捷安特平台上传出现问题，请手动检查")
-            
-except Exception as e:
-    logger.error(f"捷安特平台上传过程出错: {e}")
-    logger.info("继续执行后续步骤...")
+                # 创建同步实例
+                sync = incremental_sync_class(sync_config)
 
-# === 步骤6：上传文件到iGPSport平台 ===
-logger.info("===== 步骤6：上传文件到iGPSport平台 =====")
-try:
-    # 检查是否启用了iGPSport同步
-    if not has_forward_sync_files:
-        logger.info("没有 OneLap 新文件，跳过iGPSport平台上传")
-    elif not IGPSPORT_ENABLE_SYNC:
-        logger.info("iGPSport平台同步已禁用，跳过iGPSport平台上传")
-    elif not (IGPSPORT_ACCOUNT and IGPSPORT_PASSWORD and IGPSPORT_ACCOUNT not in ['139xxxxxx', ''] and IGPSPORT_PASSWORD not in ['xxxxxx', '']):
-        logger.info("未配置iGPSport账号或密码为默认值，跳过iGPSport平台上传")
-    else:
-        # 登录iGPSport平台
-        logger.info("开始登录iGPSport平台...")
-        igpsport_cookies = login_igpsport_browser(tab, IGPSPORT_ACCOUNT, IGPSPORT_PASSWORD)
-        logger.info("iGPSport登录完成，开始上传文件...")
+                try:
+                    # 执行同步（预览模式或完整同步）
+                    dry_run = (IGPSPORT_TO_ONELAP_MODE == 'preview')
+                    if dry_run:
+                        logger.info("当前为预览模式（只比对，不下载不上传）")
+                    else:
+                        logger.info(f"当前为同步模式: {IGPSPORT_TO_ONELAP_MODE}")
 
-        # 上传文件到iGPSport平台
-        upload_success = upload_files_to_igpsport(tab, valid_files)
+                    success = sync.run(dry_run=dry_run)
 
-        if upload_success:
-            logger.info("文件已成功上传到iGPSport平台")
-        else:
-            logger.warning("iGPSport平台上传出现问题，请手动检查")
+                    if success:
+                        logger.info("[OK]iGPSport → OneLap 增量同步完成！")
+                    else:
+                        logger.warning("[WARN]iGPSport → OneLap 同步遇到问题")
 
-except Exception as e:
-    logger.error(f"iGPSport平台上传过程出错: {e}")
-    logger.info("继续执行后续步骤...")
+                finally:
+                    # 确保清理资源
+                    sync.cleanup()
 
-# === 步骤7：上传文件到 Garmin Connect 平台 ===
-logger.info("===== 步骤7：上传文件到 Garmin Connect 平台 =====")
-try:
-    if not has_forward_sync_files:
-        logger.info("没有 OneLap 新文件，跳过 Garmin 上传")
-    elif not GARMIN_ENABLE_SYNC:
-        logger.info("Garmin 平台同步已禁用，跳过 Garmin 上传")
-    elif not (GARMIN_ACCOUNT and GARMIN_PASSWORD and GARMIN_ACCOUNT not in ['139xxxxxx', ''] and GARMIN_PASSWORD not in ['xxxxxx', '']):
-        logger.info("未配置 Garmin 账号或密码为默认值，跳过 Garmin 上传")
-    else:
-        logger.info("开始登录 Garmin Connect 平台...")
-        if not garmin_login_ok:
-            login_garmin_browser(tab, GARMIN_ACCOUNT, GARMIN_PASSWORD)
-            garmin_login_ok = True
-        logger.info("Garmin 登录完成，开始上传文件...")
+        except Exception as e:
+            logger.error(f"iGPSport → OneLap 增量同步失败: {e}")
+            logger.info("继续执行后续步骤...")
 
-        upload_success = upload_files_to_garmin(tab, valid_files)
-        if upload_success:
-            logger.info("文件已成功上传到 Garmin Connect 平台")
-        else:
-            logger.warning("Garmin Connect 平台上传出现问题，请手动检查")
-except Exception as e:
-    logger.error(f"Garmin Connect 平台上传过程出错: {e}")
-    logger.info("继续执行后续步骤...")
 
-# === 步骤8：上传文件到 Strava 平台 ===
-logger.info("===== 步骤8：上传文件到 Strava 平台 =====")
-try:
-    if not has_forward_sync_files:
-        logger.info("没有 OneLap 新文件，跳过 Strava 上传")
-    elif not STRAVA_ENABLE_SYNC:
-        logger.info("Strava 平台同步已禁用，跳过 Strava 上传")
-    elif not (STRAVA_CLIENT_ID and STRAVA_CLIENT_SECRET):
-        logger.info("未配置 Strava client_id/client_secret，跳过 Strava 上传")
-    else:
-        strava_result = upload_files_to_strava(valid_files, CONFIG_FILE_PATH)
-        logger.info(f"Strava 上传摘要: 成功 {strava_result.get('success', 0)}，重复跳过 {strava_result.get('skipped', 0)}，失败 {strava_result.get('failed', 0)}")
-        if strava_result.get('ok', False):
-            logger.info("文件已成功提交到 Strava 平台")
-        else:
-            logger.warning("Strava 平台存在失败项，请检查上方分类日志")
-except Exception as e:
-    logger.error(f"Strava 平台上传过程出错: {e}")
-    logger.info("继续执行后续步骤...")
+def run_sync_cycle(tab, runtime):
+    """执行一轮完整同步（步骤1-10），返回各步骤耗时；致命错误抛出 SyncCycleError"""
+    return SyncPipeline(tab, runtime).run()
 
-# === 步骤9：验证同步结果 ===
-logger.info("===== 步骤9：验证同步结果 =====")
-try:
-    if not has_forward_sync_files:
-        logger.info("没有 OneLap 新文件，跳过正向同步验证步骤")
-    elif XOSS_ENABLE_SYNC and xoss_login_ok and XOSS_ACCOUNT and XOSS_PASSWORD and XOSS_ACCOUNT not in ['139xxxxxx', ''] and XOSS_PASSWORD not in ['xxxxxx', '']:
-        logger.info("跳转到行者活动列表页面验证同步结果...")
-        tab.get('https://www.imxingzhe.com/workouts/list')
-        wait_xoss_activity_page_ready(tab, timeout=12)
 
-        logger.info("请检查行者平台的活动列表，确认文件是否已成功同步")
-        logger.info("程序将在15秒后自动关闭，您可以手动查看最新的活动记录")
+def show_sync_status():
+    """--status：汇总本地状态文件（下载记录、Strava 去重记录、守护模式状态），不启动浏览器也不访问网络"""
+    onelap_state = load_onelap_download_state()
+    downloaded = [item for item in onelap_state.values() if isinstance(item, dict) and item.get('downloaded')]
+    latest_download = max((item.get('activity_time') or '' for item in downloaded), default='')
+    print(f"OneLap 已下载活动: {len(downloaded)}，最新活动时间: {latest_download or '无'}")
 
-        try:
-            parsed = parse_xoss_latest_activity_from_html(tab.html)
-            if parsed:
-                logger.info("==最后查看行者平台最新的活动记录如下==:")
-                logger.info(f"  1. {parsed['activity_date']} - {parsed.get('source_text', '')[:160]}")
-            else:
-                logger.warning("未找到活动表格或活动数据，请手动检查页面")
-        except Exception as e:
-            logger.debug(f"获取验证数据时出错: {e}")
-            logger.info("自动验证失败，请手动查看页面内容")
-
-        time.sleep(15)
-    elif IGPSPORT_ENABLE_SYNC:
-        logger.info("行者未配置，改为验证 iGPSport 最新记录日期...")
-        latest_igpsport = get_latest_activity_igpsport(tab)
-        if latest_igpsport and latest_igpsport.get('time_obj'):
-            igp_time = latest_igpsport['time_obj']
-            logger.info(f"iGPSport 当前最新日期: {igp_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            if 'latest_onelap_activity_time' in globals() and latest_onelap_activity_time:
-                logger.info(f"本次同步最新 OneLap 时间: {latest_onelap_activity_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                if igp_time.date() >= latest_onelap_activity_time.date():
-                    logger.info("[OK]iGPSport 日期验证通过（最新日期不早于本次同步日期）")
-                else:
-                    logger.warning("[WARN]iGPSport 日期验证未通过（可能仍在处理导入队列，稍后刷新再看）")
-        else:
-            logger.warning("未能获取 iGPSport 最新记录用于验证，请手动查看运动记录列表")
-    elif GARMIN_ENABLE_SYNC:
-        logger.info("改为验证 Garmin 最新记录日期...")
-        if not garmin_login_ok:
-            login_garmin_browser(tab, GARMIN_ACCOUNT, GARMIN_PASSWORD)
-            garmin_login_ok = True
-        latest_garmin = get_latest_activity_garmin(tab)
-        if latest_garmin and latest_garmin.get('time_obj'):
-            garmin_time = latest_garmin['time_obj']
-            logger.info(f"Garmin 当前最新日期: {garmin_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            if 'latest_onelap_activity_time' in globals() and latest_onelap_activity_time:
-                logger.info(f"本次同步最新 OneLap 时间: {latest_onelap_activity_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                if garmin_time.date() >= latest_onelap_activity_time.date():
-                    logger.info("[OK]Garmin 日期验证通过（最新日期不早于本次同步日期）")
-                else:
-                    logger.warning("[WARN]Garmin 日期验证未通过（可能仍在处理导入队列，稍后刷新再看）")
-        else:
-            logger.warning("未能获取 Garmin 最新记录用于验证，请手动查看活动列表")
+    strava_state = load_strava_upload_state()
+    uploaded = [item for item in strava_state.values() if isinstance(item, dict) and item.get('uploaded')]
+    latest_upload = max((item.get('uploaded_at') or '' for item in uploaded), default='')
+    print(f"Strava 已上传文件: {len(uploaded)}，最近上传时间: {latest_upload or '无'}")
+
+    daemon_status = {}
+    try:
+        if os.path.exists(DAEMON_STATUS_FILE) and os.path.getsize(DAEMON_STATUS_FILE) > 0:
+            with open(DAEMON_STATUS_FILE, 'r', encoding='utf-8') as f:
+                daemon_status = json.load(f)
+    except Exception as e:
+        print(f"读取守护模式状态失败: {e}")
+    if daemon_status:
+        print(f"守护模式最近一轮: 第 {daemon_status.get('cycle')} 轮，结果 {daemon_status.get('result')}，"
+              f"开始于 {daemon_status.get('started_at')}，耗时 {daemon_status.get('duration_seconds')} 秒，"
+              f"下一轮 {daemon_status.get('next_run_at')}")
+        if daemon_status.get('error'):
+            print(f"  错误: {daemon_status['error']}")
     else:
-        logger.info("未配置行者、iGPSport 或 Garmin 上传，跳过验证步骤")
-    
-except Exception as e:
-    logger.error(f"验证步骤失败: {e}")
-    logger.info("请手动访问行者平台确认同步结果")
-    time.sleep(5)
+        print("守护模式: 暂无运行记录")
 
-# === 步骤10：iGPSport → OneLap 增量同步（新增）===
-logger.info("===== 步骤10：iGPSport → OneLap 增量同步 =====")
-try:
-    # 检查是否启用了增量同步
-    if not IGPSPORT_TO_ONELAP_ENABLE:
-        logger.info("iGPSport → OneLap 增量同步已禁用，跳过")
-    elif not INCREMENTAL_SYNC_AVAILABLE:
-        logger.warning("增量同步模块不可用，跳过")
-    elif not (IGPSPORT_ACCOUNT and IGPSPORT_PASSWORD and ONELAP_ACCOUNT and ONELAP_PASSWORD):
-        logger.warning("iGPSport 或 OneLap 账号未配置，跳过增量同步")
+    run_report = {}
+    try:
+        if os.path.exists(RUN_REPORT_FILE) and os.path.getsize(RUN_REPORT_FILE) > 0:
+            with open(RUN_REPORT_FILE, 'r', encoding='utf-8') as f:
+                run_report = json.load(f)
+    except Exception as e:
+        print(f"读取运行报告失败: {e}")
+    if run_report:
+        print(f"最近一次运行报告: {run_report.get('started_at')}，总耗时 {run_report.get('duration')} 秒")
+        stages = run_report.get('stages') or {}
+        for name, item in sorted(stages.items(), key=lambda pair: pair[1].get('total', 0), reverse=True)[:8]:
+            print(f"  {name}: {item.get('total')} 秒 / {item.get('count')} 次")
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_daemon():
+    """守护模式：常驻进程，复用浏览器和顽鹿登录态，按 cron 或固定间隔循环执行同步"""
+    if DAEMON_CRON:
+        logger.info(f"===== 守护模式启动，cron: {DAEMON_CRON} =====")
     else:
-        logger.info("开始执行 iGPSport → OneLap 增量同步...")
-        
-        # 构造配置
-        sync_config = {
-            'igpsport': {
-                'username': IGPSPORT_ACCOUNT,
-                'password': IGPSPORT_PASSWORD
-            },
-            'onelap': {
-                'username': ONELAP_ACCOUNT,
-                'password': ONELAP_PASSWORD,
-                'tab': tab,
-                'owns_tab': False
+        logger.info(f"===== 守护模式启动，间隔: {DAEMON_INTERVAL_MINUTES} 分钟 =====")
+    # docker stop 发送 SIGTERM，转换为 KeyboardInterrupt 以便正常关闭浏览器
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+
+    tab = None
+    runtime = {}
+    cycle = 0
+    try:
+        while True:
+            cycle += 1
+            cycle_started_at = datetime.now()
+            logger.info(f"===== 守护模式第 {cycle} 轮同步开始 =====")
+            if tab is None or not is_browser_alive(tab):
+                if tab is not None:
+                    logger.warning("浏览器已失效，重新启动浏览器")
+                    close_sync_resources(tab, runtime)
+                tab = create_browser_page()
+
+            status = {
+                'cycle': cycle,
+                'started_at': cycle_started_at.strftime('%Y-%m-%d %H:%M:%S'),
             }
-        }
-        
-        # 创建同步实例
-        sync = IncrementalSync(sync_config)
-        
-        try:
-            # 执行同步（预览模式或完整同步）
-            dry_run = (IGPSPORT_TO_ONELAP_MODE == 'preview')
-            if dry_run:
-                logger.info("当前为预览模式（只比对，不下载不上传）")
-            else:
-                logger.info(f"当前为同步模式: {IGPSPORT_TO_ONELAP_MODE}")
-            
-            success = sync.run(dry_run=dry_run)
-            
-            if success:
-                logger.info("[OK]iGPSport → OneLap 增量同步完成！")
-            else:
-                logger.warning("[WARN]iGPSport → OneLap 同步遇到问题")
-                
-        finally:
-            # 确保清理资源
-            sync.cleanup()
-            
-except Exception as e:
-    logger.error(f"iGPSport → OneLap 增量同步失败: {e}")
-    logger.info("继续执行后续步骤...")
-
-# === 任务完成，关闭浏览器和会话 ===
-logger.info("===== 任务执行完成 =====")
-tab.close()
-session.close()
-logger.info("浏览器和会话已关闭")
+            try:
+                timings = run_sync_cycle(tab, runtime)
+                status.update(result='ok', timings=timings)
+            except SyncCycleError as e:
+                logger.error(f"第 {cycle} 轮同步中止: {e}")
+                status.update(result='aborted', exit_code=e.exit_code, error=str(e))
+            except Exception as e:
+                logger.error(f"第 {cycle} 轮同步出现未处理异常: {e}", exc_info=True)
+                status.update(result='error', error=str(e))
+                # 浏览器状态未知，关闭后下一轮重新启动，避免残留 Chromium 进程
+                close_sync_resources(tab, runtime)
+                tab = None
+
+            finished_at = datetime.now()
+            next_run = compute_next_daemon_run(cycle_started_at, finished_at)
+            status['finished_at'] = finished_at.strftime('%Y-%m-%d %H:%M:%S')
+            status['duration_seconds'] = round((finished_at - cycle_started_at).total_seconds(), 2)
+            status['next_run_at'] = next_run.strftime('%Y-%m-%d %H:%M:%S')
+            write_daemon_status(status)
+            logger.info(f"===== 第 {cycle} 轮同步结束，耗时 {status['duration_seconds']} 秒，下一轮: {status['next_run_at']} =====")
+
+            wait_seconds = (next_run - datetime.now()).total_seconds()
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+    except KeyboardInterrupt:
+        logger.info("收到停止信号，守护模式退出")
+    finally:
+        close_sync_resources(tab, runtime)
+        logger.info("浏览器和会话已关闭")
+
+
+def run_once():
+    """单次运行：执行一轮同步后关闭浏览器，致命错误时以对应退出码结束进程"""
+    tab = None
+    runtime = {}
+    try:
+        tab = create_browser_page()
+        run_sync_cycle(tab, runtime)
+        logger.info("===== 任务执行完成 =====")
+    except SyncCycleError as e:
+        sys.exit(e.exit_code)
+    finally:
+        # 无论正常结束、致命错误还是其他异常都关闭浏览器和会话
+        close_sync_resources(tab, runtime)
+        logger.info("浏览器和会话已关闭")
+
+
+def main(argv=None):
+    """命令行入口：先分发不需要浏览器的轻量命令，只有完整同步才会导入 DrissionPage 等依赖"""
+    global DAEMON_MODE, PROBE_EXISTING_LOGIN
+    argv = sys.argv if argv is None else argv
+    if '--status' in argv:
+        show_sync_status()
+        return
+    run_strava_commands(argv)
+    DAEMON_MODE = DAEMON_ENABLE or '--daemon' in argv
+    PROBE_EXISTING_LOGIN = PERSIST_BROWSER_SESSION or DAEMON_MODE
+    start_metrics_server()
+    if DAEMON_MODE:
+        run_daemon()
+    else:
+        run_once()
+
+
+if __name__ == '__main__':
+    main()
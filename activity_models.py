@@ -0,0 +1,161 @@
+"""
+活动记录模型
+顽鹿和 iGPSport 列表接口返回的活动在解析列表页时统一转换成 ActivityRecord（__slots__，开始时间存为 epoch 秒），
+之后列表筛选、日志、下载、状态记录都只读它的属性，不再反复从原始字典的多个候选字段解析时间
+
+SyncOnelapToXoss.py、incremental_sync_v2.py 和 onelap_catalog.py 共用，无第三方依赖
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+ACTIVITY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+ONELAP_TIME_FIELDS = ('activity_time', 'start_riding_time', 'startTime', 'created_at', 'updated_at', 'date')
+
+
+def get_onelap_record_id(activity):
+    return str(activity.get('_id') or activity.get('id') or activity.get('record_id') or '').strip()
+
+
+def to_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_activity_time_value(value):
+    """解析单个时间字段：秒/毫秒时间戳或常见日期字符串，早于 2000 年视为无效"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if value <= 0:
+            return None
+        timestamp = value / 1000 if value > 10**11 else value
+        dt = datetime.fromtimestamp(timestamp)
+        return dt if dt.year >= 2000 else None
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return None
+        for fmt in (ACTIVITY_TIME_FORMAT, '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+            try:
+                dt = datetime.strptime(text, fmt)
+                return dt if dt.year >= 2000 else None
+            except ValueError:
+                pass
+        try:
+            dt = datetime.fromisoformat(text.replace('Z', '+00:00')).replace(tzinfo=None)
+            return dt if dt.year >= 2000 else None
+        except ValueError:
+            return None
+    return None
+
+
+def find_onelap_fit_key(*sources):
+    """
+    在若干原始字典里递归查找 FIT 下载参数：fitUrl/fit_url 优先，其次 fit/fitKey/fileKey，最后 url/path；
+    同一优先级按 sources 的顺序取第一个
+    """
+    candidates = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                key_lower = str(key).lower()
+                if key_lower in {'fiturl', 'fit_url'}:
+                    priority = 0
+                elif key_lower in {'fit', 'fitkey', 'filekey', 'file_key'}:
+                    priority = 1
+                elif key_lower in {'url', 'path'}:
+                    priority = 2
+                else:
+                    priority = None
+                text = str(item).strip() if priority is not None and item is not None else ''
+                if text:
+                    candidates.append((priority, text))
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    for source in sources:
+        walk(source)
+    return min(candidates, key=lambda item: item[0])[1] if candidates else ''
+
+
+def parse_onelap_activity_time(activity):
+    """按 ONELAP_TIME_FIELDS 顺序取第一个能解析的时间；已转换的 ActivityRecord 直接返回开始时间"""
+    if isinstance(activity, ActivityRecord):
+        return activity.start_time
+    if not isinstance(activity, dict):
+        return None
+    for field in ONELAP_TIME_FIELDS:
+        parsed = parse_activity_time_value(activity.get(field))
+        if parsed:
+            return parsed
+    return None
+
+
+@dataclass
+class ActivityRecord:
+    """
+    单条活动：start_ts 为本地时间 epoch 秒（0 表示未知），distance 单位米，duration 单位秒，
+    fit_url 是顽鹿的 fitUrl 或 iGPSport 的下载地址，filename 是下载到本地后的文件名
+    """
+
+    __slots__ = ('platform', 'record_id', 'start_ts', 'distance', 'elevation', 'duration', 'name', 'fit_url', 'filename')
+
+    platform: str
+    record_id: str
+    start_ts: int
+    distance: float
+    elevation: float
+    duration: int
+    name: str
+    fit_url: str
+    filename: str
+
+    @property
+    def start_time(self):
+        return datetime.fromtimestamp(self.start_ts) if self.start_ts else None
+
+    @property
+    def start_time_text(self):
+        return datetime.fromtimestamp(self.start_ts).strftime(ACTIVITY_TIME_FORMAT) if self.start_ts else ''
+
+    @classmethod
+    def from_onelap(cls, activity):
+        """把顽鹿列表接口的一条原始活动转换成 ActivityRecord"""
+        start_time = parse_onelap_activity_time(activity)
+        return cls(
+            platform='onelap',
+            record_id=get_onelap_record_id(activity),
+            start_ts=int(start_time.timestamp()) if start_time else 0,
+            distance=to_float(activity.get('totalDistance') or activity.get('distance')),
+            elevation=to_float(activity.get('elevation') or activity.get('totalClimb')),
+            duration=int(to_float(activity.get('time') or activity.get('duration'))),
+            name=str(activity.get('name') or ''),
+            fit_url=find_onelap_fit_key(activity),
+            filename='',
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 to_dict() 的结果还原；兼容只记录了 activity_time 字符串的旧目录条目"""
+        start_ts = data.get('start_ts')
+        if start_ts is None:
+            start_time = parse_activity_time_value(data.get('activity_time'))
+            start_ts = int(start_time.timestamp()) if start_time else 0
+        return cls(
+            platform=str(data.get('platform') or 'onelap'),
+            record_id=str(data.get('record_id') or ''),
+            start_ts=int(start_ts or 0),
+            distance=to_float(data.get('distance')),
+            elevation=to_float(data.get('elevation')),
+            duration=int(to_float(data.get('duration'))),
+            name=str(data.get('name') or ''),
+            fit_url=str(data.get('fit_url') or data.get('fitUrl') or ''),
+            filename=str(data.get('filename') or ''),
+        )
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
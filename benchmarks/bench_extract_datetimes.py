@@ -0,0 +1,143 @@
+"""
+页面文本日期提取基准测试
+get_latest_activity_garmin 会把整页 BeautifulSoup(tab.html).get_text() 交给 extract_datetimes_from_text，
+行者/捷安特解析器也在行文本上反复调用它。本脚本对 benchmarks/fixtures/ 下所有保存的页面：
+先取整页文本，再分别测量
+
+- legacy：旧实现（多次 str.replace + 三个未编译模式 re.findall + 逐个 strptime），保留在本文件中作对照
+- cold：当前实现、每次清空 LRU 缓存（单个预编译组合正则，直接构造 datetime）
+- warm：当前实现、命中缓存（轮询循环中同一页面文本重复出现的情况）
+
+并核对新旧实现返回的列表完全一致（包括顺序）
+
+用法：
+    python benchmarks/bench_extract_datetimes.py
+    python benchmarks/bench_extract_datetimes.py --repeat 200
+
+结果追加到 benchmarks/results/extract_datetimes.jsonl；新旧结果不一致时以退出码 1 结束
+
+依赖：beautifulsoup4
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+HISTORY_FILE = os.path.join(RESULTS_DIR, 'extract_datetimes.jsonl')
+
+
+def legacy_extract_datetimes_from_text(text):
+    """优化前的实现，仅用于对照"""
+    if not text:
+        return []
+
+    normalized = text.replace('\xa0', ' ').replace('/', '-').replace('.', '-')
+    normalized = normalized.replace('年', '-').replace('月', '-').replace('日', ' ')
+    normalized = re.sub(r'\s+', ' ', normalized).strip()
+
+    patterns = [
+        (r'20\d{2}-\d{1,2}-\d{1,2}\s+\d{1,2}:\d{2}:\d{2}', '%Y-%m-%d %H:%M:%S'),
+        (r'20\d{2}-\d{1,2}-\d{1,2}\s+\d{1,2}:\d{2}', '%Y-%m-%d %H:%M'),
+        (r'20\d{2}-\d{1,2}-\d{1,2}', '%Y-%m-%d')
+    ]
+
+    results = []
+    seen = set()
+    for pattern, fmt in patterns:
+        for match in re.findall(pattern, normalized):
+            try:
+                parsed = datetime.strptime(match, fmt)
+                key = parsed.strftime('%Y-%m-%d %H:%M:%S')
+                if key not in seen:
+                    seen.add(key)
+                    results.append(parsed)
+            except Exception:
+                continue
+    return results
+
+
+def median_seconds(func, text, repeat, before_each=None):
+    durations = []
+    for _ in range(repeat):
+        if before_each:
+            before_each()
+        started = time.perf_counter()
+        func(text)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def run_case(sync_main, path, repeat):
+    from bs4 import BeautifulSoup
+
+    with open(path, 'r', encoding='utf-8') as f:
+        page_text = BeautifulSoup(f.read(), 'html.parser').get_text(' ', strip=True)
+
+    cache = sync_main.extract_datetimes_tuple
+    cache.cache_clear()
+    expected = legacy_extract_datetimes_from_text(page_text)
+    actual = sync_main.extract_datetimes_from_text(page_text)
+
+    legacy_seconds = median_seconds(legacy_extract_datetimes_from_text, page_text, repeat)
+    cold_seconds = median_seconds(sync_main.extract_datetimes_from_text, page_text, repeat, before_each=cache.cache_clear)
+    warm_seconds = median_seconds(sync_main.extract_datetimes_from_text, page_text, repeat)
+    return {
+        'fixture': os.path.relpath(path, FIXTURES_DIR).replace(os.sep, '/'),
+        'text_chars': len(page_text),
+        'datetimes': len(actual),
+        'ok': actual == expected,
+        'legacy_ms': round(legacy_seconds * 1000, 4),
+        'cold_ms': round(cold_seconds * 1000, 4),
+        'warm_ms': round(warm_seconds * 1000, 4),
+        'cold_speedup': round(legacy_seconds / cold_seconds, 1) if cold_seconds > 0 else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='页面文本日期提取基准测试')
+    parser.add_argument('--repeat', type=int, default=50, help='每个页面重复次数，取中位数')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    import SyncOnelapToXoss as sync_main
+
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*', '*.html')))
+    results = [run_case(sync_main, path, args.repeat) for path in paths]
+
+    print(f"{'页面':<36}{'字符':>9}{'日期':>6}{'旧实现 ms':>12}{'冷 ms':>10}{'热 ms':>10}{'加速':>8}  结果")
+    for item in results:
+        print(f"{item['fixture']:<36}{item['text_chars']:>9}{item['datetimes']:>6}{item['legacy_ms']:>12.3f}"
+              f"{item['cold_ms']:>10.3f}{item['warm_ms']:>10.4f}{item['cold_speedup'] or 0:>7.1f}x  "
+              f"{'✅' if item['ok'] else '❌ 与旧实现结果不一致'}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    entry = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'cases': results,
+    }
+    with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    print(f'结果已追加到 {HISTORY_FILE}')
+    return 0 if all(item['ok'] for item in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+FIT 坐标转换离线基准测试
+用 garmin-fit-sdk 的 Encoder 生成不同规模的合成 FIT 文件（国内 / 境外坐标），测量
+convert_fit_gcj02_to_wgs84 的吞吐（点/秒）、峰值内存（RSS）和输出大小，
+并逐点核对输出坐标与 gcj02_to_wgs84 的计算结果是否一致
+
+用法：
+    python benchmarks/bench_fit_coord_transform.py                   # 默认 1k/10k/100k 点
+    python benchmarks/bench_fit_coord_transform.py --sizes 1000,10000 --repeat 5
+    python benchmarks/bench_fit_coord_transform.py --update-baseline # 把本次结果设为基线
+
+每次运行的结果追加到 benchmarks/results/fit_coord_transform.jsonl；
+若存在基线文件 fit_coord_transform_baseline.json，吞吐下降超过 --max-regression
+（默认 30%）或精度检查失败时以退出码 1 结束，便于发布前检查
+
+依赖：garmin-fit-sdk (pip install garmin-fit-sdk)
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+HISTORY_FILE = os.path.join(RESULTS_DIR, 'fit_coord_transform.jsonl')
+BASELINE_FILE = os.path.join(RESULTS_DIR, 'fit_coord_transform_baseline.json')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# 合成轨迹起点（度）：国内用北京，境外用巴黎（不做偏移）
+REGIONS = {
+    'china': (39.9042, 116.4074),
+    'abroad': (48.8566, 2.3522),
+}
+
+# FIT semicircle 精度约 9.3mm，允许两次取整误差
+MAX_ERROR_METERS = 0.05
+
+
+def generate_fit_file(path, record_count, region):
+    """生成包含 record_count 条 record 消息的合成骑行 FIT 文件"""
+    from garmin_fit_sdk import Encoder, Profile
+    from fit_coord_transform import DEGREES_TO_SEMICIRCLES
+
+    mesg_num = Profile['mesg_num']
+    start_lat, start_lng = REGIONS[region]
+    start_time = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def semicircles(degrees):
+        return int(round(degrees * DEGREES_TO_SEMICIRCLES))
+
+    encoder = Encoder()
+    encoder.on_mesg(mesg_num['FILE_ID'], {
+        'type': 'activity',
+        'manufacturer': 'development',
+        'product': 0,
+        'serial_number': 1234,
+        'time_created': start_time,
+    })
+    lat, lng = start_lat, start_lng
+    for index in range(record_count):
+        # 约 5 m/s 向东北方向前进，带一点摆动，避免坐标完全线性
+        lat += 0.00003 + (index % 7) * 1e-6
+        lng += 0.00004 - (index % 5) * 1e-6
+        encoder.on_mesg(mesg_num['RECORD'], {
+            'timestamp': start_time + timedelta(seconds=index),
+            'position_lat': semicircles(lat),
+            'position_long': semicircles(lng),
+            'distance': index * 5.0,
+            'speed': 5.0,
+            'heart_rate': 120 + index % 40,
+            'cadence': 85,
+            'altitude': 50.0 + (index % 100) * 0.2,
+        })
+    end_time = start_time + timedelta(seconds=record_count)
+    encoder.on_mesg(mesg_num['LAP'], {
+        'timestamp': end_time,
+        'start_time': start_time,
+        'start_position_lat': semicircles(start_lat),
+        'start_position_long': semicircles(start_lng),
+        'end_position_lat': semicircles(lat),
+        'end_position_long': semicircles(lng),
+        'total_elapsed_time': float(record_count),
+        'total_timer_time': float(record_count),
+    })
+    encoder.on_mesg(mesg_num['SESSION'], {
+        'timestamp': end_time,
+        'start_time': start_time,
+        'sport': 'cycling',
+        'start_position_lat': semicircles(start_lat),
+        'start_position_long': semicircles(start_lng),
+        'total_elapsed_time': float(record_count),
+        'total_timer_time': float(record_count),
+        'total_distance': record_count * 5.0,
+    })
+    encoder.on_mesg(mesg_num['ACTIVITY'], {
+        'timestamp': end_time,
+        'num_sessions': 1,
+        'type': 'manual',
+        'total_timer_time': float(record_count),
+    })
+    with open(path, 'wb') as f:
+        f.write(encoder.close())
+    return path
+
+
+def read_record_positions(path):
+    """读取 FIT 文件中全部 record 消息的 (lat, lng) semicircles"""
+    from garmin_fit_sdk import Decoder, Stream
+    from fit_coord_transform import MESG_NUM_RECORD
+
+    positions = []
+
+    def on_mesg(mesg_num, mesg):
+        if mesg_num == MESG_NUM_RECORD:
+            positions.append((mesg.get('position_lat'), mesg.get('position_long')))
+
+    Decoder(Stream.from_file(path)).read(mesg_listener=on_mesg)
+    return positions
+
+
+def check_accuracy(input_path, output_path):
+    """逐点比较输出坐标与 gcj02_to_wgs84 的期望值，返回最大误差（米）和点数"""
+    import math
+    from fit_coord_transform import gcj02_to_wgs84, SEMICIRCLES_TO_DEGREES
+
+    source = read_record_positions(input_path)
+    converted = read_record_positions(output_path)
+    if len(source) != len(converted):
+        return {'ok': False, 'error': f'record 数量不一致: {len(source)} -> {len(converted)}'}
+
+    max_error = 0.0
+    for (src_lat, src_lng), (out_lat, out_lng) in zip(source, converted):
+        expected_lng, expected_lat = gcj02_to_wgs84(src_lng * SEMICIRCLES_TO_DEGREES, src_lat * SEMICIRCLES_TO_DEGREES)
+        d_lat = (out_lat * SEMICIRCLES_TO_DEGREES - expected_lat) * 111320.0
+        d_lng = (out_lng * SEMICIRCLES_TO_DEGREES - expected_lng) * 111320.0 * math.cos(math.radians(expected_lat))
+        max_error = max(max_error, math.hypot(d_lat, d_lng))
+    return {'ok': max_error <= MAX_ERROR_METERS, 'max_error_m': round(max_error, 4), 'points': len(source)}
+
+
+def peak_rss_kb():
+    """当前进程峰值 RSS（KB），不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_worker(input_path, record_count, repeat):
+    """子进程内执行：多次转换同一文件，峰值 RSS 只反映转换本身"""
+    import logging
+    logging.disable(logging.WARNING)
+    import fit_coord_transform
+
+    rss_before = peak_rss_kb()
+    durations = []
+    output_path = f'{input_path}.wgs84.fit'
+    result_path = input_path
+    for _ in range(repeat):
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        started = time.perf_counter()
+        result_path = fit_coord_transform.convert_fit_gcj02_to_wgs84(input_path, output_path)
+        durations.append(time.perf_counter() - started)
+    rss_after = peak_rss_kb()
+
+    converted = result_path != input_path
+    accuracy = check_accuracy(input_path, result_path)
+    if not converted:
+        # 境外坐标不应被转换，输出即原文件
+        accuracy['ok'] = accuracy['ok'] and accuracy['max_error_m'] == 0
+    median = statistics.median(durations)
+    return {
+        'records': record_count,
+        'converted': converted,
+        'durations': [round(value, 4) for value in durations],
+        'median_seconds': round(median, 4),
+        'points_per_second': round(record_count / median, 1) if median > 0 else None,
+        'input_bytes': os.path.getsize(input_path),
+        'output_bytes': os.path.getsize(result_path),
+        'peak_rss_kb': rss_after,
+        'baseline_rss_kb': rss_before,
+        'accuracy': accuracy,
+    }
+
+
+def run_case(work_dir, record_count, region, repeat):
+    input_path = os.path.join(work_dir, f'synthetic_{region}_{record_count}.fit')
+    started = time.perf_counter()
+    generate_fit_file(input_path, record_count, region)
+    generate_seconds = time.perf_counter() - started
+
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', input_path, str(record_count), str(repeat)],
+        capture_output=True, text=True, check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'基准子进程失败 ({region}, {record_count}): {completed.stderr.strip()}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['region'] = region
+    result['generate_seconds'] = round(generate_seconds, 3)
+    return result
+
+
+def compare_with_baseline(results, baseline, max_regression):
+    """返回吞吐回退超过阈值的用例说明列表"""
+    baseline_cases = {(case['region'], case['records']): case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in results:
+        previous = baseline_cases.get((case['region'], case['records']))
+        if not previous or not previous.get('points_per_second') or not case.get('points_per_second'):
+            continue
+        ratio = case['points_per_second'] / previous['points_per_second']
+        case['baseline_ratio'] = round(ratio, 3)
+        if ratio < 1 - max_regression:
+            regressions.append(
+                f"{case['region']}/{case['records']}: {case['points_per_second']} 点/秒，"
+                f"基线 {previous['points_per_second']} 点/秒（{ratio:.0%}）"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='FIT 坐标转换基准测试')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='record 消息数量，逗号分隔')
+    parser.add_argument('--regions', default=','.join(REGIONS), help='坐标区域，逗号分隔（china, abroad）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例重复转换次数，取中位数')
+    parser.add_argument('--max-regression', type=float, default=0.3, help='相对基线允许的吞吐下降比例')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写为基线')
+    parser.add_argument('--worker', nargs=3, metavar=('INPUT', 'RECORDS', 'REPEAT'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        input_path, record_count, repeat = args.worker
+        print(json.dumps(run_worker(input_path, int(record_count), int(repeat))))
+        return 0
+
+    if importlib.util.find_spec('garmin_fit_sdk') is None:
+        print('未安装 garmin-fit-sdk，无法运行基准测试: pip install garmin-fit-sdk')
+        return 2
+
+    sizes = [int(value) for value in args.sizes.split(',') if value.strip()]
+    regions = [value.strip() for value in args.regions.split(',') if value.strip()]
+    unknown = [region for region in regions if region not in REGIONS]
+    if unknown:
+        parser.error(f'未知区域: {", ".join(unknown)}')
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='fit_bench_') as work_dir:
+        for record_count in sizes:
+            for region in regions:
+                case = run_case(work_dir, record_count, region, max(1, args.repeat))
+                results.append(case)
+                rss = f"{case['peak_rss_kb'] / 1024:.1f} MB" if case['peak_rss_kb'] else 'N/A'
+                accuracy = case['accuracy']
+                print(f"{region:>6} {record_count:>7} 点: {case['points_per_second']:>10} 点/秒  "
+                      f"中位 {case['median_seconds']}s  峰值RSS {rss}  "
+                      f"输出 {case['output_bytes']} 字节  最大误差 {accuracy.get('max_error_m')} m  "
+                      f"{'OK' if accuracy.get('ok') else 'FAIL'}")
+
+    run = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'cases': results,
+    }
+
+    failures = [f"{case['region']}/{case['records']}: {case['accuracy']}" for case in results if not case['accuracy'].get('ok')]
+    regressions = []
+    if os.path.exists(BASELINE_FILE) and not args.update_baseline:
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.max_regression)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run, ensure_ascii=False) + '\n')
+    if args.update_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(run, f, ensure_ascii=False, indent=2)
+        print(f'基线已更新: {BASELINE_FILE}')
+
+    for message in failures:
+        print(f'[FAIL] 精度检查失败 {message}')
+    for message in regressions:
+        print(f'[FAIL] 吞吐回退 {message}')
+    return 1 if failures or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+同步网络路径端到端吞吐基准
+在本机启动 mock_servers 中的顽鹿 / iGPSport / Strava 模拟服务，把主程序和增量同步模块里的
+接口地址指向本地，然后按真实调用顺序跑一遍各网络路径，统计活动数/分钟与 MB/s：
+
+- onelap_download：fetch_activities 翻页 + download_fit_file 逐条下载
+- igpsport_download：IGPSportClient 登录、翻页、download_file 逐条下载
+- onelap_upload：OneLapClient._direct_upload_file 直传
+- igpsport_upload：IGPSportClient.upload_files 并发直传（--igpsport-workers）
+- strava_upload：exchange_strava_code_for_token + upload_file_to_strava + poll_strava_upload_status
+
+用法：
+    python benchmarks/bench_sync_throughput.py                          # 默认 100 条历史、无延迟
+    python benchmarks/bench_sync_throughput.py --history 500 --latency 0.05 --jitter 0.05
+    python benchmarks/bench_sync_throughput.py --error-rate 0.05 --paths onelap_download,strava_upload
+
+每次运行的结果追加到 benchmarks/results/sync_throughput.jsonl；不访问任何线上平台，
+也不会改动 APP_DIR 下的下载状态文件
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+for path in (REPO_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from mock_servers import (  # noqa: E402
+    IGPSPORT_MOCK_TOKEN, ONELAP_MOCK_TOKEN, STRAVA_MOCK_CODE, MockServerSuite,
+)
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+HISTORY_FILE = os.path.join(RESULTS_DIR, 'sync_throughput.jsonl')
+
+PATHS = ('onelap_download', 'igpsport_download', 'onelap_upload', 'igpsport_upload', 'strava_upload')
+
+
+def point_clients_at(suite, work_dir):
+    """把两个模块里的接口常量改到本地模拟服务，并把下载状态文件重定向到临时目录"""
+    import SyncOnelapToXoss as sync_main
+    import incremental_sync_v2 as incremental
+
+    onelap_base = suite.onelap.base_url
+    sync_main.ONELAP_LIST_API = f'{onelap_base}/api/otm/ride_record/list'
+    sync_main.ONELAP_DETAIL_API = f'{onelap_base}/api/otm/ride_record/analysis/{{record_id}}'
+    sync_main.ONELAP_DOWNLOAD_API = f'{onelap_base}/api/otm/ride_record/analysis/fit_content/{{fit_key}}'
+    sync_main.STRAVA_OAUTH_TOKEN_URL = suite.strava.oauth_token_url
+    sync_main.STRAVA_API_BASE_URL = suite.strava.api_base_url
+    incremental.ONELAP_UPLOAD_API = f'{onelap_base}/api/otm/ride_record/upload/fit'
+    incremental.IGPSportClient.BASE_URL = suite.igpsport.base_url
+
+    state_file = os.path.join(work_dir, 'onelap_download_state.json')
+    save_state = sync_main.save_onelap_download_state
+    sync_main.save_onelap_download_state = lambda state, state_file=state_file: save_state(state, state_file)
+    return sync_main, incremental
+
+
+def summarize(path, started, files, total_bytes, failures, extra=None):
+    elapsed = time.perf_counter() - started
+    result = {
+        'path': path,
+        'activities': files,
+        'failures': failures,
+        'bytes': total_bytes,
+        'seconds': round(elapsed, 3),
+        'activities_per_min': round(files / elapsed * 60, 1) if elapsed > 0 else 0.0,
+        'mb_per_s': round(total_bytes / elapsed / 1024 / 1024, 3) if elapsed > 0 else 0.0,
+    }
+    result.update(extra or {})
+    return result
+
+
+def bench_onelap_download(sync_main, work_dir, limit):
+    storage_dir = os.path.join(work_dir, 'onelap')
+    auth_context = {'token': ONELAP_MOCK_TOKEN, 'cookies': {}}
+    session = sync_main.create_retry_session()
+    started = time.perf_counter()
+    try:
+        activities = sync_main.fetch_activities(session, auth_context, None)[:limit]
+        list_seconds = time.perf_counter() - started
+        state = {}
+        files = total_bytes = failures = 0
+        for activity in activities:
+            try:
+                file_path = sync_main.download_fit_file(session, activity, state, storage_dir=storage_dir)
+            except Exception:
+                file_path = None
+            if file_path:
+                files += 1
+                total_bytes += os.path.getsize(file_path)
+            else:
+                failures += 1
+    finally:
+        session.close()
+    return summarize('onelap_download', started, files, total_bytes, failures, {'list_seconds': round(list_seconds, 3)})
+
+
+def bench_igpsport_download(incremental, work_dir, limit):
+    storage_dir = os.path.join(work_dir, 'igpsport')
+    os.makedirs(storage_dir, exist_ok=True)
+    client = incremental.IGPSportClient('bench', 'bench')
+    started = time.perf_counter()
+    if not client.login() or client.token != IGPSPORT_MOCK_TOKEN:
+        return summarize('igpsport_download', started, 0, 0, 1, {'error': 'login failed'})
+    activities = client.get_all_activities()[:limit]
+    list_seconds = time.perf_counter() - started
+    files = total_bytes = failures = 0
+    for activity in activities:
+        output_path = os.path.join(storage_dir, f'{activity.record_id}.fit')
+        if client.download_file(activity.record_id, output_path):
+            files += 1
+            total_bytes += os.path.getsize(output_path)
+        else:
+            failures += 1
+    return summarize('igpsport_download', started, files, total_bytes, failures, {'list_seconds': round(list_seconds, 3)})
+
+
+def collect_upload_sources(work_dir, fit_size, count):
+    """优先复用本轮下载得到的文件，不够时补齐合成文件"""
+    from mock_servers import build_fit_payload
+
+    sources = []
+    for sub_dir in ('onelap', 'igpsport'):
+        directory = os.path.join(work_dir, sub_dir)
+        if os.path.isdir(directory):
+            sources.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.fit'))
+    upload_dir = os.path.join(work_dir, 'upload')
+    os.makedirs(upload_dir, exist_ok=True)
+    payload = None
+    while len(sources) < count:
+        payload = payload or build_fit_payload(fit_size, seed=3)
+        path = os.path.join(upload_dir, f'synthetic_{len(sources):05d}.fit')
+        with open(path, 'wb') as f:
+            f.write(payload)
+        sources.append(path)
+    return sources[:count]
+
+
+def bench_onelap_upload(incremental, sources):
+    client = incremental.OneLapClient('bench', 'bench', tab=None)
+    client._create_api_session = lambda: incremental.build_onelap_api_session(ONELAP_MOCK_TOKEN, {})
+    started = time.perf_counter()
+    files = total_bytes = failures = 0
+    for file_path in sources:
+        try:
+            client._direct_upload_file(file_path)
+            files += 1
+            total_bytes += os.path.getsize(file_path)
+        except Exception:
+            failures += 1
+    return summarize('onelap_upload', started, files, total_bytes, failures)
+
+
+def bench_igpsport_upload(incremental, sources, workers):
+    client = incremental.IGPSportClient('bench', 'bench')
+    started = time.perf_counter()
+    if not client.login():
+        return summarize('igpsport_upload', started, 0, 0, 1, {'error': 'login failed'})
+    results = client.upload_files(sources, max_workers=workers)
+    sizes = {os.path.basename(path): os.path.getsize(path) for path in sources}
+    done = [name for name, (status, _) in results.items() if status in ('success', 'duplicate')]
+    total_bytes = sum(sizes[name] for name in done)
+    return summarize('igpsport_upload', started, len(done), total_bytes, len(sources) - len(done), {'workers': workers})
+
+
+def bench_strava_upload(sync_main, sources, poll_interval):
+    started = time.perf_counter()
+    token = sync_main.exchange_strava_code_for_token('bench', 'bench', STRAVA_MOCK_CODE)['access_token']
+    files = total_bytes = failures = duplicates = 0
+    for file_path in sources:
+        try:
+            upload = sync_main.upload_file_to_strava(file_path, token)
+            result = sync_main.poll_strava_upload_status(upload['id'], token, poll_interval=poll_interval) or {}
+            if result.get('activity_id'):
+                files += 1
+                total_bytes += os.path.getsize(file_path)
+            else:
+                failures += 1
+        except Exception as e:
+            if sync_main.classify_strava_error(str(e))[0] == 'duplicate':
+                duplicates += 1
+            else:
+                failures += 1
+    return summarize('strava_upload', started, files, total_bytes, failures, {'duplicates': duplicates})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='同步网络路径端到端吞吐基准（本地模拟服务）')
+    parser.add_argument('--paths', default=','.join(PATHS), help=f"要测的路径，逗号分隔（{', '.join(PATHS)}）")
+    parser.add_argument('--history', type=int, default=100, help='模拟平台上的历史活动数量')
+    parser.add_argument('--limit', type=int, default=0, help='每条下载路径最多处理的活动数，0 表示全部')
+    parser.add_argument('--uploads', type=int, default=20, help='上传路径使用的文件数')
+    parser.add_argument('--fit-size', type=int, default=200 * 1024, help='模拟 FIT 文件字节数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机抖动上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入 5xx 错误的比例（0~1）')
+    parser.add_argument('--processing-polls', type=int, default=1, help='Strava 上传 ready 之前的"处理中"轮询次数')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='Strava 状态轮询间隔（秒）')
+    parser.add_argument('--igpsport-workers', type=int, default=3, help='iGPSport 接口直传并发数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help='保留主程序的 INFO 日志')
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.paths.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in PATHS]
+    if unknown:
+        parser.error(f"未知路径: {', '.join(unknown)}")
+
+    work_dir = tempfile.mkdtemp(prefix='bench_sync_')
+    results = []
+    try:
+        with MockServerSuite(history=args.history, fit_size=args.fit_size, latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate, processing_polls=args.processing_polls, seed=args.seed) as suite:
+            sync_main, incremental = point_clients_at(suite, work_dir)
+            if not args.verbose:
+                logging.getLogger().setLevel(logging.WARNING)
+                incremental.logger.setLevel(logging.WARNING)
+            limit = args.limit or args.history
+
+            if 'onelap_download' in selected:
+                results.append(bench_onelap_download(sync_main, work_dir, limit))
+            if 'igpsport_download' in selected:
+                results.append(bench_igpsport_download(incremental, work_dir, limit))
+            sources = None
+            if 'onelap_upload' in selected:
+                sources = collect_upload_sources(work_dir, args.fit_size, args.uploads)
+                results.append(bench_onelap_upload(incremental, sources))
+            if 'igpsport_upload' in selected:
+                sources = sources or collect_upload_sources(work_dir, args.fit_size, args.uploads)
+                results.append(bench_igpsport_upload(incremental, sources, args.igpsport_workers))
+            if 'strava_upload' in selected:
+                sources = sources or collect_upload_sources(work_dir, args.fit_size, args.uploads)
+                results.append(bench_strava_upload(sync_main, sources, args.poll_interval))
+            server_stats = suite.snapshot_stats()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'路径':<20}{'活动':>8}{'失败':>6}{'秒':>10}{'活动/分钟':>12}{'MB/s':>10}")
+    for item in results:
+        print(f"{item['path']:<20}{item['activities']:>8}{item['failures']:>6}{item['seconds']:>10.2f}"
+              f"{item['activities_per_min']:>12.1f}{item['mb_per_s']:>10.2f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    entry = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'history': args.history, 'fit_size': args.fit_size, 'latency': args.latency, 'jitter': args.jitter,
+            'error_rate': args.error_rate, 'processing_polls': args.processing_polls,
+            'poll_interval': args.poll_interval, 'uploads': args.uploads, 'igpsport_workers': args.igpsport_workers,
+        },
+        'results': results,
+        'server_stats': server_stats,
+    }
+    with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    print(f'结果已追加到 {HISTORY_FILE}')
+    return 1 if any(item['activities'] == 0 for item in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+行者活动页 HTML 解析基准测试
+对 benchmarks/fixtures/xoss/ 下保存的页面（桌面表格、element 表格、移动端卡片、通用列表、空列表等），
+分别测量完整 BeautifulSoup 解析（parse_xoss_latest_activity_from_soup）和带 .table_box 快速路径的
+parse_xoss_latest_activity_from_html 的耗时，并核对两者结果与 expected.json 是否一致
+
+用法：
+    python benchmarks/bench_xoss_html_parser.py               # 每个页面重复 20 次
+    python benchmarks/bench_xoss_html_parser.py --repeat 100
+
+结果追加到 benchmarks/results/xoss_html_parser.jsonl；任一页面解析结果与预期不一致时以退出码 1 结束
+
+依赖：beautifulsoup4
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures', 'xoss')
+EXPECTED_FILE = os.path.join(FIXTURES_DIR, 'expected.json')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+HISTORY_FILE = os.path.join(RESULTS_DIR, 'xoss_html_parser.jsonl')
+
+
+def measure(func, page_html, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(page_html)
+        durations.append(time.perf_counter() - started)
+    return result, statistics.median(durations)
+
+
+def run_case(sync_main, filename, expected, repeat):
+    with open(os.path.join(FIXTURES_DIR, filename), 'r', encoding='utf-8') as f:
+        page_html = f.read()
+
+    full_result, full_seconds = measure(sync_main.parse_xoss_latest_activity_from_soup, page_html, repeat)
+    fast_result, fast_seconds = measure(sync_main.parse_xoss_latest_activity_from_html, page_html, repeat)
+    actual = fast_result['activity_date'] if fast_result else None
+    return {
+        'fixture': filename,
+        'bytes': len(page_html.encode('utf-8')),
+        'expected': expected,
+        'actual': actual,
+        'ok': actual == expected and fast_result == full_result,
+        'fast_path_hit': sync_main.parse_xoss_latest_activity_from_table_box(page_html) is not None,
+        'full_ms': round(full_seconds * 1000, 3),
+        'fast_ms': round(fast_seconds * 1000, 3),
+        'speedup': round(full_seconds / fast_seconds, 1) if fast_seconds > 0 else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='行者活动页 HTML 解析基准测试')
+    parser.add_argument('--repeat', type=int, default=20, help='每个页面重复解析次数，取中位数')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    import SyncOnelapToXoss as sync_main
+
+    with open(EXPECTED_FILE, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    results = [run_case(sync_main, filename, expected[filename], args.repeat) for filename in sorted(expected)]
+
+    print(f"{'页面':<30}{'KB':>8}{'完整解析 ms':>14}{'快速路径 ms':>14}{'加速':>8}  结果")
+    for item in results:
+        status = '✅' if item['ok'] else f"❌ 预期 {item['expected']}"
+        print(f"{item['fixture']:<30}{item['bytes'] / 1024:>8.1f}{item['full_ms']:>14.2f}{item['fast_ms']:>14.2f}"
+              f"{item['speedup'] or 0:>7.1f}x  {item['actual']} {status}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    entry = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'cases': results,
+    }
+    with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    print(f'结果已追加到 {HISTORY_FILE}')
+    return 0 if all(item['ok'] for item in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
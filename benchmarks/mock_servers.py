@@ -0,0 +1,617 @@
+"""
+本地模拟 API 服务（顽鹿 / iGPSport / Strava）
+按线上接口的路径与返回结构实现一组轻量 HTTP 服务，便于在无网络环境下对
+fetch_activities、download_fit_file、IGPSportClient、OneLapClient._direct_upload_file、
+upload_file_to_strava、poll_strava_upload_status 等网络路径做压测和延迟测试
+
+- 顽鹿：列表接口按 generate_onelap_sign_headers 的算法校验 nonce/timestamp/sign 请求头
+- Strava：上传后先返回"处理中"，轮询若干次后才给出 activity_id；external_id 重复时返回 duplicate 错误
+- 所有服务都支持固定延迟 + 随机抖动、按比例注入错误状态码，以及可调的历史活动数量
+
+用法：
+    python benchmarks/mock_servers.py --history 500 --latency 0.05 --error-rate 0.02
+
+也可以在基准脚本中直接使用：
+    with MockServerSuite(history=200, latency=0.02) as suite:
+        suite.onelap.base_url, suite.igpsport.base_url, suite.strava.base_url
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+ONELAP_SIGN_KEY = 'fe9f8382418fcdeb136461cac6acae7b'
+ONELAP_SIGN_MAX_SKEW_SECONDS = 300
+ONELAP_MOCK_TOKEN = 'mock-onelap-token'
+IGPSPORT_MOCK_TOKEN = 'mock-igpsport-token'
+STRAVA_MOCK_CODE = 'mock-strava-code'
+
+# 合成活动的起始时间（最新一条），之后按 interval_hours 逐条往前推
+DEFAULT_LATEST_ACTIVITY_TIME = datetime(2026, 6, 1, 8, 0, 0)
+
+
+def fit_crc16(data, crc=0):
+    """FIT 文件使用的 CRC-16（多项式 0xA001，反射，初值 0）"""
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def build_fit_payload(size, seed):
+    """生成固定长度、文件头和末尾 CRC 都有效的伪 FIT 内容（14 字节文件头 + 按 seed 可复现的数据区 + 2 字节 CRC）"""
+    data_size = max(size - 16, 0)
+    header = bytes([14, 0x10]) + (2132).to_bytes(2, 'little') + data_size.to_bytes(4, 'little') + b'.FIT'
+    header += fit_crc16(header).to_bytes(2, 'little')
+    rng = random.Random(seed)
+    block = bytes(rng.getrandbits(8) for _ in range(4096))
+    body = header + (block * (data_size // len(block) + 1))[:data_size]
+    return body + fit_crc16(body).to_bytes(2, 'little')
+
+
+def compute_onelap_sign(params, nonce, timestamp):
+    """按客户端同样的规则计算签名：空串视为缺省、列表/字典序列化后按键名排序拼接"""
+    normalized = {}
+    for key, value in (params or {}).items():
+        if value == '' or value is None:
+            continue
+        if isinstance(value, dict) or (isinstance(value, list) and value and isinstance(value[0], dict)):
+            value = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        elif isinstance(value, list):
+            value = ','.join(str(v) for v in value)
+        normalized[key] = value
+    normalized['nonce'] = nonce
+    normalized['timestamp'] = timestamp
+    string_to_sign = '&'.join(f'{key}={normalized[key]}' for key in sorted(normalized)) + f'&key={ONELAP_SIGN_KEY}'
+    return hashlib.md5(string_to_sign.encode('utf-8')).hexdigest()
+
+
+def extract_multipart_field(body, name):
+    match = re.search(rb'name="' + re.escape(name.encode('utf-8')) + rb'"(?:; filename="([^"]*)")?\r\n(?:[^\r\n]+\r\n)*\r\n',
+                      body)
+    if not match:
+        return None, None
+    start = match.end()
+    end = body.find(b'\r\n--', start)
+    value = body[start:end if end >= 0 else len(body)]
+    filename = match.group(1).decode('utf-8', 'replace') if match.group(1) is not None else None
+    return filename, value
+
+
+class MockResponse:
+    def __init__(self, status=200, body=b'', content_type='application/json;charset=UTF-8', headers=None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, data, status=200):
+        return cls(status, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    @classmethod
+    def file(cls, payload, request_headers, headers=None):
+        """返回文件内容，支持 Range: bytes=N- 的断点续传请求"""
+        headers = dict(headers or {}, **{'Accept-Ranges': 'bytes'})
+        match = re.match(r'bytes=(\d+)-$', (request_headers.get('Range') or '').strip())
+        if match:
+            start = int(match.group(1))
+            if start >= len(payload):
+                return cls(416, b'', content_type='application/octet-stream',
+                           headers={'Content-Range': f'bytes */{len(payload)}'})
+            headers['Content-Range'] = f'bytes {start}-{len(payload) - 1}/{len(payload)}'
+            return cls(206, payload[start:], content_type='application/octet-stream', headers=headers)
+        return cls(200, payload, content_type='application/octet-stream', headers=headers)
+
+
+class MockApiServer:
+    """单个服务的基类：路由表 + 延迟/错误注入 + 请求统计"""
+
+    name = 'mock'
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=502, seed=0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.routes = []
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def route(self, method, pattern, handler):
+        self.routes.append((method, re.compile(pattern + r'$'), handler))
+
+    def record(self, key, field, value=1):
+        with self.lock:
+            item = self.stats.setdefault(key, {'requests': 0, 'errors': 0, 'injected_errors': 0, 'bytes_in': 0, 'bytes_out': 0})
+            item[field] += value
+
+    def should_inject_error(self):
+        if self.error_rate <= 0:
+            return False
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def simulate_latency(self):
+        delay = self.latency
+        if self.jitter > 0:
+            with self.lock:
+                delay += self.rng.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def dispatch(self, method, raw_path, headers, body):
+        parsed = urlparse(raw_path)
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = pattern.match(parsed.path)
+            if not match:
+                continue
+            key = handler.__name__.replace('handle_', '', 1)
+            self.record(key, 'requests')
+            self.record(key, 'bytes_in', len(body))
+            self.simulate_latency()
+            if self.should_inject_error():
+                self.record(key, 'injected_errors')
+                response = MockResponse.json({'code': self.error_status, 'message': 'injected error'}, status=self.error_status)
+            else:
+                query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                try:
+                    response = handler(match, query, headers, body)
+                except Exception as e:
+                    response = MockResponse.json({'code': 500, 'message': f'mock handler error: {e}'}, status=500)
+            if response.status >= 400:
+                self.record(key, 'errors')
+            self.record(key, 'bytes_out', len(response.body))
+            return response
+        return MockResponse.json({'code': 404, 'message': f'no route for {method} {parsed.path}'}, status=404)
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle_method(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length > 0 else b''
+                response = server.dispatch(method, self.path, self.headers, body)
+                self.send_response(response.status)
+                self.send_header('Content-Type', response.content_type)
+                self.send_header('Content-Length', str(len(response.body)))
+                for header_name, header_value in response.headers.items():
+                    self.send_header(header_name, header_value)
+                self.end_headers()
+                self.wfile.write(response.body)
+
+            def do_GET(self):
+                self.handle_method('GET')
+
+            def do_POST(self):
+                self.handle_method('POST')
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name=f'{self.name}-mock', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def snapshot_stats(self):
+        with self.lock:
+            return {key: dict(value) for key, value in self.stats.items()}
+
+
+class MockOneLapServer(MockApiServer):
+    """顽鹿 u.onelap.cn：记录列表（签名校验）、记录详情、FIT 下载、FIT 直传"""
+
+    name = 'onelap'
+
+    def __init__(self, history=100, fit_size=200 * 1024, interval_hours=24, **kwargs):
+        super().__init__(**kwargs)
+        self.fit_size = fit_size
+        self.fit_payload = build_fit_payload(fit_size, seed=1)
+        self.records = []
+        self.records_by_id = {}
+        self.files = {}
+        self.uploaded = []
+        for index in range(history):
+            self.add_record(DEFAULT_LATEST_ACTIVITY_TIME - timedelta(hours=interval_hours * index), append=True)
+
+        self.route('POST', r'/api/otm/ride_record/list', self.handle_list)
+        self.route('GET', r'/api/otm/ride_record/analysis/(?P<record_id>[^/]+)', self.handle_detail)
+        self.route('GET', r'/api/otm/ride_record/analysis/fit_content/(?P<fit_key>.+)', self.handle_download)
+        self.route('POST', r'/api/otm/ride_record/upload/fit', self.handle_upload)
+
+    def add_record(self, start_time, append=False):
+        record_id = hashlib.md5(f'onelap-{start_time.isoformat()}-{len(self.records)}'.encode('utf-8')).hexdigest()[:24]
+        filename = f'MAGENE_{int(start_time.timestamp())}.fit'
+        record = {
+            '_id': record_id,
+            'name': start_time.strftime('%Y-%m-%d 骑行'),
+            'start_riding_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'created_at': int(start_time.timestamp()),
+            'distance': 30000,
+            'time': 3600,
+            'fitUrl': f'https://fit.onelap.cn/fit/{filename}',
+        }
+        with self.lock:
+            if append:
+                self.records.append(record)
+            else:
+                self.records.insert(0, record)
+            self.records_by_id[record_id] = record
+            self.files[filename] = record
+        return record
+
+    def check_auth(self, headers):
+        return (headers.get('Authorization') or '').strip() == ONELAP_MOCK_TOKEN
+
+    def check_sign(self, headers, params):
+        nonce = headers.get('nonce') or ''
+        timestamp = headers.get('timestamp') or ''
+        sign = headers.get('sign') or ''
+        if not nonce or not timestamp or not sign:
+            return 'missing sign headers'
+        try:
+            skew = abs(time.time() - int(timestamp))
+        except ValueError:
+            return 'invalid timestamp'
+        if skew > ONELAP_SIGN_MAX_SKEW_SECONDS:
+            return 'timestamp expired'
+        if compute_onelap_sign(params, nonce, timestamp) != sign:
+            return 'sign mismatch'
+        return ''
+
+    def handle_list(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'code': 401, 'message': 'unauthorized'}, status=401)
+        try:
+            params = json.loads(body.decode('utf-8') or '{}')
+        except ValueError:
+            return MockResponse.json({'code': 400, 'message': 'invalid json'}, status=400)
+        sign_error = self.check_sign(headers, params)
+        if sign_error:
+            return MockResponse.json({'code': 403, 'message': sign_error}, status=403)
+
+        page = max(int(params.get('page') or 1), 1)
+        limit = max(int(params.get('limit') or 20), 1)
+        with self.lock:
+            total = len(self.records)
+            items = [dict(item) for item in self.records[(page - 1) * limit:page * limit]]
+        for item in items:
+            item.pop('fitUrl', None)
+        pages = (total + limit - 1) // limit
+        return MockResponse.json({'code': 200, 'data': {'list': items, 'total': total, 'pages': pages, 'page': page}})
+
+    def handle_detail(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'code': 401, 'message': 'unauthorized'}, status=401)
+        record = self.records_by_id.get(match.group('record_id'))
+        if not record:
+            return MockResponse.json({'code': 404, 'message': 'record not found'}, status=404)
+        return MockResponse.json({'code': 200, 'data': {'ridingRecord': {'_id': record['_id'], 'fitUrl': record['fitUrl']}}})
+
+    def handle_download(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'code': 401, 'message': 'unauthorized'}, status=401)
+        try:
+            fit_key = base64.b64decode(unquote(match.group('fit_key'))).decode('utf-8')
+        except Exception:
+            return MockResponse.json({'code': 400, 'message': 'invalid fit key'}, status=400)
+        filename = unquote(fit_key).rsplit('/', 1)[-1]
+        if filename not in self.files:
+            return MockResponse.json({'code': 404, 'message': 'fit not found'}, status=404)
+        return MockResponse.file(self.fit_payload, headers, headers={
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}",
+        })
+
+    def handle_upload(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'code': 401, 'message': 'unauthorized'}, status=401)
+        filename, content = extract_multipart_field(body, 'jilu0')
+        if content is None:
+            return MockResponse.json({'code': 400, 'message': 'missing jilu0'})
+        if not content.startswith(b'\x0e') and b'.FIT' not in content[:16]:
+            return MockResponse.json({'code': 200, 'data': {'success_count': 0, 'failed_count': 1}})
+        record = self.add_record(datetime.now().replace(microsecond=0))
+        with self.lock:
+            self.uploaded.append({'filename': filename, 'size': len(content), 'record_id': record['_id']})
+        return MockResponse.json({'code': 200, 'data': {'success_count': 1, 'failed_count': 0}})
+
+
+class MockIGPSportServer(MockApiServer):
+    """iGPSport prod.zh.igpsport.com/service：登录、活动分页列表、下载地址与文件、FIT 导入"""
+
+    name = 'igpsport'
+
+    def __init__(self, history=100, fit_size=200 * 1024, interval_hours=24, **kwargs):
+        super().__init__(**kwargs)
+        self.fit_payload = build_fit_payload(fit_size, seed=2)
+        self.rows = []
+        for index in range(history):
+            start_time = DEFAULT_LATEST_ACTIVITY_TIME - timedelta(hours=interval_hours * index)
+            ride_id = str(9000000 + history - index)
+            self.rows.append({
+                'rideId': ride_id,
+                'title': f'骑行_{int(start_time.timestamp())}_{ride_id}',
+                'startTime': start_time.strftime('%Y.%m.%d'),
+                'rideDistance': 30000 + index,
+                'totalMovingTime': 3600,
+                'durl': '',
+            })
+        self.rows_by_id = {row['rideId']: row for row in self.rows}
+        self.uploaded_names = set()
+
+        self.route('POST', r'/auth/account/login', self.handle_login)
+        self.route('GET', r'/web-gateway/web-analyze/activity/queryMyActivity', self.handle_list)
+        self.route('GET', r'/web-gateway/web-analyze/activity/getDownloadUrl/(?P<ride_id>[^/]+)', self.handle_download_url)
+        self.route('GET', r'/files/(?P<ride_id>[^/]+)\.fit', self.handle_file)
+        self.route('POST', r'/web-gateway/web-analyze/activity/uploadFile', self.handle_upload)
+
+    def check_auth(self, headers):
+        return (headers.get('Authorization') or '').strip() == f'Bearer {IGPSPORT_MOCK_TOKEN}'
+
+    def handle_login(self, match, query, headers, body):
+        try:
+            payload = json.loads(body.decode('utf-8') or '{}')
+        except ValueError:
+            payload = {}
+        if not payload.get('username') or not payload.get('password'):
+            return MockResponse.json({'code': 10001, 'message': '用户名或密码错误', 'data': None})
+        return MockResponse.json({'code': 0, 'message': 'success', 'data': {'access_token': IGPSPORT_MOCK_TOKEN}})
+
+    def handle_list(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'code': 401, 'message': 'unauthorized'}, status=401)
+        page = max(int(query.get('pageNo') or 1), 1)
+        page_size = max(int(query.get('pageSize') or 20), 1)
+        rows = self.rows[(page - 1) * page_size:page * page_size]
+        total_page = max((len(self.rows) + page_size - 1) // page_size, 1)
+        return MockResponse.json({'code': 0, 'data': {'rows': rows, 'totalPage': total_page, 'totalRows': len(self.rows)}})
+
+    def handle_download_url(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'code': 401, 'message': 'unauthorized'}, status=401)
+        ride_id = match.group('ride_id')
+        if ride_id not in self.rows_by_id:
+            return MockResponse.json({'code': 404, 'message': 'activity not found', 'data': None})
+        return MockResponse.json({'code': 0, 'data': f'{self.base_url}/files/{ride_id}.fit'})
+
+    def handle_file(self, match, query, headers, body):
+        if match.group('ride_id') not in self.rows_by_id:
+            return MockResponse(404, b'')
+        return MockResponse.file(self.fit_payload, headers)
+
+    def handle_upload(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'code': 401, 'message': 'unauthorized'}, status=401)
+        filename, content = extract_multipart_field(body, 'file')
+        if content is None:
+            return MockResponse.json({'code': 400, 'message': 'missing file'})
+        with self.lock:
+            if filename in self.uploaded_names:
+                return MockResponse.json({'code': 40001, 'message': '活动已存在，请勿重复上传', 'data': None})
+            self.uploaded_names.add(filename)
+        return MockResponse.json({'code': 0, 'message': 'success', 'data': {'fileName': filename}})
+
+
+class MockStravaServer(MockApiServer):
+    """Strava：OAuth token、异步上传（处理中 -> ready / duplicate 错误）、运动员活动列表"""
+
+    name = 'strava'
+
+    def __init__(self, processing_polls=1, **kwargs):
+        super().__init__(**kwargs)
+        self.processing_polls = processing_polls
+        self.access_token = 'mock-strava-access-token'
+        self.uploads = {}
+        self.activities = []
+        self.external_ids = {}
+        self.next_id = 1000
+
+        self.route('POST', r'/oauth/token', self.handle_token)
+        self.route('POST', r'/api/v3/uploads', self.handle_upload)
+        self.route('GET', r'/api/v3/uploads/(?P<upload_id>\d+)', self.handle_upload_status)
+        self.route('GET', r'/api/v3/athlete/activities', self.handle_activities)
+
+    @property
+    def api_base_url(self):
+        return f'{self.base_url}/api/v3'
+
+    @property
+    def oauth_token_url(self):
+        return f'{self.base_url}/oauth/token'
+
+    def check_auth(self, headers):
+        return (headers.get('Authorization') or '').strip() == f'Bearer {self.access_token}'
+
+    def allocate_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def handle_token(self, match, query, headers, body):
+        form = {k: v[-1] for k, v in parse_qs(body.decode('utf-8')).items()}
+        grant_type = form.get('grant_type')
+        if grant_type == 'authorization_code' and form.get('code') != STRAVA_MOCK_CODE:
+            return MockResponse.json({'message': 'Bad Request', 'errors': [{'field': 'code', 'code': 'invalid'}]}, status=400)
+        if grant_type not in ('authorization_code', 'refresh_token'):
+            return MockResponse.json({'message': 'Bad Request'}, status=400)
+        return MockResponse.json({
+            'token_type': 'Bearer',
+            'access_token': self.access_token,
+            'refresh_token': 'mock-strava-refresh-token',
+            'expires_at': int(time.time()) + 6 * 3600,
+            'expires_in': 6 * 3600,
+            'athlete': {'id': 1, 'username': 'mock_athlete', 'firstname': 'Mock'},
+        })
+
+    def handle_upload(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'message': 'Authorization Error', 'errors': [{'code': 'invalid'}]}, status=401)
+        _, external_id = extract_multipart_field(body, 'external_id')
+        filename, content = extract_multipart_field(body, 'file')
+        if content is None:
+            return MockResponse.json({'message': 'Bad Request', 'errors': [{'field': 'file', 'code': 'empty'}]}, status=400)
+        external_id = (external_id or b'').decode('utf-8', 'replace') or filename or ''
+        upload_id = self.allocate_id()
+        with self.lock:
+            duplicate_of = self.external_ids.get(external_id)
+            self.uploads[upload_id] = {
+                'external_id': external_id,
+                'size': len(content),
+                'polls': 0,
+                'duplicate_of': duplicate_of,
+                'activity_id': None,
+            }
+        return MockResponse.json(self.upload_view(upload_id), status=201)
+
+    def upload_view(self, upload_id):
+        upload = self.uploads[upload_id]
+        view = {
+            'id': upload_id,
+            'id_str': str(upload_id),
+            'external_id': upload['external_id'],
+            'error': None,
+            'status': 'Your activity is still being processed.',
+            'activity_id': None,
+        }
+        if upload['polls'] > self.processing_polls:
+            if upload['duplicate_of']:
+                view['status'] = 'There was an error processing your activity.'
+                view['error'] = f"{upload['external_id']} duplicate of <a href='/activities/{upload['duplicate_of']}'>activity</a>"
+            else:
+                view['status'] = 'Your activity is ready.'
+                view['activity_id'] = upload['activity_id']
+        return view
+
+    def handle_upload_status(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'message': 'Authorization Error'}, status=401)
+        upload_id = int(match.group('upload_id'))
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if not upload:
+                return MockResponse.json({'message': 'Record Not Found'}, status=404)
+            upload['polls'] += 1
+            if upload['polls'] > self.processing_polls and not upload['duplicate_of'] and not upload['activity_id']:
+                self.next_id += 1
+                upload['activity_id'] = self.next_id
+                self.external_ids[upload['external_id']] = upload['activity_id']
+                self.activities.insert(0, {
+                    'id': upload['activity_id'],
+                    'name': upload['external_id'],
+                    'start_date': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    'start_date_local': datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                })
+            return MockResponse.json(self.upload_view(upload_id))
+
+    def handle_activities(self, match, query, headers, body):
+        if not self.check_auth(headers):
+            return MockResponse.json({'message': 'Authorization Error'}, status=401)
+        per_page = max(int(query.get('per_page') or 30), 1)
+        page = max(int(query.get('page') or 1), 1)
+        with self.lock:
+            items = self.activities[(page - 1) * per_page:page * per_page]
+        return MockResponse.json(items)
+
+
+class MockServerSuite:
+    """同时启动三个模拟服务，支持 with 语句"""
+
+    def __init__(self, history=100, fit_size=200 * 1024, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=502, processing_polls=1, seed=0, host='127.0.0.1', ports=(0, 0, 0)):
+        common = {'latency': latency, 'jitter': jitter, 'error_rate': error_rate,
+                  'error_status': error_status, 'host': host}
+        self.onelap = MockOneLapServer(history=history, fit_size=fit_size, seed=seed, port=ports[0], **common)
+        self.igpsport = MockIGPSportServer(history=history, fit_size=fit_size, seed=seed + 1, port=ports[1], **common)
+        self.strava = MockStravaServer(processing_polls=processing_polls, seed=seed + 2, port=ports[2], **common)
+        self.servers = [self.onelap, self.igpsport, self.strava]
+
+    def start(self):
+        for server in self.servers:
+            server.start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def snapshot_stats(self):
+        return {server.name: server.snapshot_stats() for server in self.servers}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='顽鹿 / iGPSport / Strava 本地模拟 API 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--onelap-port', type=int, default=18081)
+    parser.add_argument('--igpsport-port', type=int, default=18082)
+    parser.add_argument('--strava-port', type=int, default=18083)
+    parser.add_argument('--history', type=int, default=100, help='每个平台的历史活动数量')
+    parser.add_argument('--fit-size', type=int, default=200 * 1024, help='每个 FIT 文件的字节数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='在固定延迟上追加的随机抖动上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回错误状态码的比例（0~1）')
+    parser.add_argument('--error-status', type=int, default=502, help='注入错误时返回的 HTTP 状态码')
+    parser.add_argument('--processing-polls', type=int, default=1, help='Strava 上传在 ready 之前返回"处理中"的轮询次数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    suite = MockServerSuite(
+        history=args.history, fit_size=args.fit_size, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status, processing_polls=args.processing_polls,
+        seed=args.seed, host=args.host, ports=(args.onelap_port, args.igpsport_port, args.strava_port),
+    ).start()
+    print(f'顽鹿 API:    {suite.onelap.base_url}  (Authorization: {ONELAP_MOCK_TOKEN})')
+    print(f'iGPSport API: {suite.igpsport.base_url}')
+    print(f'Strava API:  {suite.strava.api_base_url}  (code: {STRAVA_MOCK_CODE})')
+    print('按 Ctrl+C 停止')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        suite.stop()
+        print(json.dumps(suite.snapshot_stats(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
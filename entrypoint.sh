@@ -5,15 +5,16 @@ set -e
 # OneLap 多平台数据同步工具 — 容器启动脚本
 #
 # 环境变量:
-#   ONELAP_MODE = sync (默认) | vnc
-#     sync - 自动运行同步脚本，结束后容器保持 30 分钟供 VNC 查看
-#     vnc  - 仅启动 VNC，不运行脚本，容器一直存活
+#   ONELAP_MODE = sync (默认) | vnc | daemon
+#     sync   - 自动运行同步脚本，结束后容器保持 30 分钟供 VNC 查看
+#     vnc    - 仅启动 VNC，不运行脚本，容器一直存活
+#     daemon - 常驻循环同步（按 [daemon] 间隔或 cron），复用浏览器和登录态
 #   VNC_PW      - VNC 密码（默认 onelap123）
 # =============================================================================
 
 # ----- 持久化数据目录（避免 Docker 把单个文件挂载创建成目录）-----
 mkdir -p /app/data
-for f in onelap_download_state.json strava_upload_state.json; do
+for f in onelap_download_state.json strava_upload_state.json daemon_status.json run_report.json upload_batch_state.json upload_outbox.json onelap_detail_cache.json onelap_catalog.json; do
     # 如果旧版本遗留了目录挂载（非 symlink），先移除
     if [ -d "/app/$f" ] && [ ! -L "/app/$f" ]; then
         echo "[FIX] /app/$f 是目录，移除并重建为 symlink"
@@ -86,6 +87,18 @@ if [ "$ONELAP_MODE" = "vnc" ]; then
     exec sleep infinity
 fi
 
+if [ "$ONELAP_MODE" = "daemon" ]; then
+    echo "daemon 模式: 常驻进程循环执行同步..."
+    cd /app
+    python3 SyncOnelapToXoss.py --daemon &
+    PY_PID=$!
+    # 转发 SIGTERM，脚本收到后关闭浏览器再退出
+    trap 'kill -TERM $PY_PID 2>/dev/null' SIGTERM SIGINT
+    wait $PY_PID || true
+    wait $PY_PID 2>/dev/null || true
+    exit 0
+fi
+
 # sync 模式: 跑同步脚本，结束后保持容器存活供 VNC 查看
 echo "sync 模式: 开始执行同步脚本..."
 cd /app
@@ -12,6 +12,12 @@ import os
 import tempfile
 import logging
 
+try:
+    from sync_metrics import timed
+except ImportError:  # 单独使用本模块时不记录耗时
+    def timed(name=None):
+        return lambda func: func
+
 logger = logging.getLogger(__name__)
 
 # ============================================================
@@ -133,6 +139,7 @@ def _has_garmin_fit_sdk():
         return False
 
 
+@timed('convert_fit_gcj02_to_wgs84')
 def convert_fit_gcj02_to_wgs84(input_path, output_path=None):
     """将 FIT 文件中的坐标从 GCJ-02 转换为 WGS84
 
@@ -0,0 +1,144 @@
+"""
+FIT 文件完整性校验
+在下载写盘的同一个循环里增量计算内容哈希、解析 12/14 字节文件头并校验文件 CRC，不需要下载完成后再读一遍文件
+
+FIT 文件结构：文件头（12 或 14 字节）+ 数据区（文件头声明的字节数）+ 2 字节 CRC（小端，覆盖文件头和数据区）
+14 字节文件头的最后 2 字节是文件头自身的 CRC，为 0 时表示未填写
+多个 FIT 依次拼接（chained FIT）时只校验第一段，后续字节只参与哈希
+
+无第三方依赖
+"""
+
+import hashlib
+import os
+
+FIT_SIGNATURE = b'.FIT'
+FIT_HEADER_SIZES = (12, 14)
+FIT_CRC_SIZE = 2
+
+
+def _build_crc_table():
+    """FIT SDK 使用的 CRC-16（多项式 0xA001，反射，初值 0），按字节查表"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+FIT_CRC_TABLE = _build_crc_table()
+
+
+def fit_crc16(data, crc=0):
+    """在 crc 基础上继续累加 data 的 FIT CRC；对"内容 + 其小端 CRC"计算的结果为 0"""
+    table = FIT_CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+class FitIntegrityError(RuntimeError):
+    """下载得到的内容不是完整有效的 FIT 文件"""
+
+
+class FitStreamValidator:
+    """
+    按下载顺序喂入数据块：update(chunk) 同时累加 sha256 和 FIT CRC，最后用 result()/verify() 取结论
+    """
+
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.crc = 0
+        self.header = b''
+        self.header_size = None
+        self.data_size = None
+        self.error = ''
+
+    @property
+    def expected_size(self):
+        """第一段 FIT 的总字节数（文件头 + 数据区 + CRC），文件头未读完时为 None"""
+        if self.data_size is None:
+            return None
+        return self.header_size + self.data_size + FIT_CRC_SIZE
+
+    def update(self, chunk):
+        if not chunk:
+            return
+        self.sha256.update(chunk)
+        if self.header_size is None or len(self.header) < self.header_size:
+            self._read_header(chunk)
+
+        expected = self.expected_size
+        limit = len(chunk) if expected is None else max(0, expected - self.size)
+        if limit:
+            self.crc = fit_crc16(chunk[:limit] if limit < len(chunk) else chunk, self.crc)
+        self.size += len(chunk)
+
+    def update_from_file(self, path, chunk_size=256 * 1024):
+        """断点续传时先把已有的 .part 内容补喂进来（只读已下载的前缀）"""
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                self.update(chunk)
+
+    def _read_header(self, chunk):
+        needed = (self.header_size or FIT_HEADER_SIZES[-1]) - len(self.header)
+        self.header += chunk[:needed]
+        if self.header_size is None and self.header:
+            self.header_size = self.header[0]
+            if self.header_size not in FIT_HEADER_SIZES:
+                self.error = self.error or f'文件头长度异常: {self.header_size}'
+                self.header_size = FIT_HEADER_SIZES[-1]
+                return
+            self.header = self.header[:self.header_size]
+        if len(self.header) < 12 or self.data_size is not None:
+            return
+        if self.header[8:12] != FIT_SIGNATURE:
+            self.error = self.error or '缺少 .FIT 文件标识'
+            return
+        self.data_size = int.from_bytes(self.header[4:8], 'little')
+
+    def result(self):
+        """返回校验结论字典：valid、error、sha256、size 以及文件头信息"""
+        error = self.error
+        if not error:
+            if self.size == 0:
+                error = '空文件'
+            elif self.data_size is None or len(self.header) < (self.header_size or 12):
+                error = f'文件头不完整: {self.size} 字节'
+            elif self.header_size == 14 and int.from_bytes(self.header[12:14], 'little') not in (0, fit_crc16(self.header[:12])):
+                error = '文件头 CRC 校验失败'
+            elif self.size < self.expected_size:
+                error = f'文件不完整: {self.size}/{self.expected_size} 字节'
+            elif self.crc != 0:
+                error = '文件 CRC 校验失败'
+        return {
+            'valid': not error,
+            'error': error,
+            'sha256': self.sha256.hexdigest(),
+            'size': self.size,
+            'header_size': self.header_size,
+            'data_size': self.data_size,
+            'protocol_version': self.header[1] if len(self.header) > 1 else None,
+            'profile_version': int.from_bytes(self.header[2:4], 'little') if len(self.header) >= 4 else None,
+        }
+
+    def verify(self):
+        """校验不通过时抛出 FitIntegrityError，否则返回 result()"""
+        result = self.result()
+        if not result['valid']:
+            raise FitIntegrityError(result['error'])
+        return result
+
+
+def validate_fit_file(path):
+    """校验磁盘上已有的 FIT 文件，返回 result() 字典"""
+    validator = FitStreamValidator()
+    if os.path.exists(path):
+        validator.update_from_file(path)
+    return validator.result()
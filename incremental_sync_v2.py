@@ -16,7 +16,11 @@ import hashlib
 import random
 import string
 from datetime import datetime
-from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from fit_integrity import FitStreamValidator
+from onelap_catalog import OneLapCatalog
+from activity_models import ActivityRecord, parse_onelap_activity_time
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,6 +39,7 @@ def get_app_dir():
 
 APP_DIR = get_app_dir()
 CONFIG_FILE_PATH = os.path.join(APP_DIR, 'settings.ini')
+ONELAP_CATALOG_FILE = os.path.join(APP_DIR, 'onelap_catalog.json')
 
 ONELAP_BASE_WEB_URL = 'https://www.onelap.cn'
 ONELAP_BASE_APP_URL = 'https://u.onelap.cn'
@@ -136,54 +141,6 @@ def build_onelap_api_session(token, cookies_dict):
     return session
 
 
-def parse_onelap_activity_time(activity):
-    candidates = []
-    if isinstance(activity, dict):
-        candidates.extend([
-            activity.get('start_riding_time'),
-            activity.get('startTime'),
-            activity.get('created_at'),
-            activity.get('updated_at'),
-            activity.get('date'),
-        ])
-
-    def parse_candidate(value):
-        if isinstance(value, int):
-            if value <= 0:
-                return None
-            timestamp = value / 1000 if value > 10**11 else value
-            dt = datetime.fromtimestamp(timestamp)
-            return dt if dt.year >= 2000 else None
-        if isinstance(value, float):
-            if value <= 0:
-                return None
-            timestamp = value / 1000 if value > 10**11 else value
-            dt = datetime.fromtimestamp(timestamp)
-            return dt if dt.year >= 2000 else None
-        if isinstance(value, str):
-            text = value.strip()
-            if not text:
-                return None
-            for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
-                try:
-                    dt = datetime.strptime(text, fmt)
-                    return dt if dt.year >= 2000 else None
-                except Exception:
-                    pass
-            try:
-                dt = datetime.fromisoformat(text.replace('Z', '+00:00')).replace(tzinfo=None)
-                return dt if dt.year >= 2000 else None
-            except Exception:
-                return None
-        return None
-
-    for candidate in candidates:
-        parsed = parse_candidate(candidate)
-        if parsed:
-            return parsed
-    return None
-
-
 def parse_igpsport_activity_time(item):
     if not isinstance(item, dict):
         return None
@@ -215,15 +172,32 @@ def sanitize_filename_component(value):
     return text or 'unknown'
 
 
-ActivityRecord = namedtuple('ActivityRecord', [
-    'ride_id', 'start_time', 'start_time_obj', 'distance', 'duration', 'platform', 'download_url'
-])
+CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+# 只认明确表示"文件已上传过"的说法；"user not exist"、"token not exist" 之类的错误不能当成重复
+UPLOAD_DUPLICATE_KEYWORDS = ('already exist', 'duplicate', '已存在', '重复')
+
+
+def parse_resume_response(status, headers, offset):
+    """
+    根据 Range 请求的响应判断能否续传，返回 (完整文件字节数或 None, 是否追加写入)
+    只有 206 且 Content-Range 起点等于已有字节数时才追加；压缩传输时不校验长度
+    """
+    if (headers.get('Content-Encoding') or 'identity').lower() != 'identity':
+        return None, False
+    match = CONTENT_RANGE_PATTERN.match(headers.get('Content-Range') or '')
+    if offset and status == 206 and match and int(match.group(1)) == offset:
+        return (int(match.group(3)) if match.group(3) != '*' else None), True
+    length = headers.get('Content-Length') or ''
+    return (int(length) if length.isdigit() else None), False
 
 
 class IGPSportClient:
     """iGPSport 平台客户端"""
     
     BASE_URL = "https://prod.zh.igpsport.com/service"
+    # 网页端"导入运动记录"弹窗调用的导入接口（multipart，字段 file）；路径尚未抓包确认，
+    # 只在 [igpsport] direct_upload = true 时使用，返回 404/405 时由调用方回退浏览器上传
+    UPLOAD_PATH = "/web-gateway/web-analyze/activity/uploadFile"
     
     def __init__(self, username, password):
         self.username = username
@@ -319,6 +293,7 @@ class IGPSportClient:
                         if not start_time:
                             raw_start_time = str(item.get('startTime') or '').strip()
                             start_time = raw_start_time.replace('.', '-') if raw_start_time else 'Unknown'
+                        ride_id = str(item.get('rideId', ''))
 
                         # 使用 rideDistance（米）
                         distance = float(item.get('rideDistance', 0) or 0)
@@ -327,13 +302,16 @@ class IGPSportClient:
                         duration = int(item.get('totalMovingTime', 0) or 0)
 
                         activity = ActivityRecord(
-                            ride_id=str(item.get('rideId', '')),
-                            start_time=start_time,
-                            start_time_obj=start_time_obj,
+                            platform='igpsport',
+                            record_id=ride_id,
+                            start_ts=int(start_time_obj.timestamp()) if start_time_obj else 0,
                             distance=distance,
+                            elevation=0.0,
                             duration=duration,
-                            platform='igpsport',
-                            download_url=item.get('durl', '')
+                            name=str(item.get('title') or ''),
+                            fit_url=str(item.get('durl', '') or ''),
+                            # 开始时间解析失败时用原始 startTime 文本命名，保持与旧版本下载的文件名一致
+                            filename=f"{sanitize_filename_component(start_time)}-{ride_id}.fit"
                         )
                         all_activities.append(activity)
                     
@@ -353,7 +331,7 @@ class IGPSportClient:
         return all_activities
     
     def download_file(self, ride_id, output_path):
-        """下载单个 FIT 文件"""
+        """下载单个 FIT 文件；已有 .part 时用 Range 从断点续传，服务器不支持时从头下载"""
         import urllib.request
         import json
 
@@ -361,8 +339,6 @@ class IGPSportClient:
             return False
 
         part_path = f"{output_path}.part"
-        if os.path.exists(part_path):
-            os.remove(part_path)
 
         for attempt in range(1, 4):
             url = f"{self.BASE_URL}/web-gateway/web-analyze/activity/getDownloadUrl/{ride_id}"
@@ -381,24 +357,44 @@ class IGPSportClient:
                         logger.error("[iGPSport] 下载地址为空")
                         return False
 
+                offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
                 req2 = urllib.request.Request(download_url)
                 req2.add_header('Authorization', f"Bearer {self.token}")
-
-                with urllib.request.urlopen(req2, timeout=120) as resp, \
-                     open(part_path, 'wb') as out_file:
-                    while True:
-                        chunk = resp.read(1024 * 256)
-                        if not chunk:
-                            break
-                        out_file.write(chunk)
-
-                if not os.path.exists(part_path) or os.path.getsize(part_path) <= 0:
+                if offset:
+                    req2.add_header('Range', f"bytes={offset}-")
+
+                with urllib.request.urlopen(req2, timeout=120) as resp:
+                    expected_total, resumed = parse_resume_response(resp.status, resp.headers, offset)
+                    validator = FitStreamValidator()
+                    if offset and resumed:
+                        logger.info(f"[iGPSport] 从断点续传 {os.path.basename(output_path)}: 已有 {offset} 字节")
+                        validator.update_from_file(part_path)
+                    with open(part_path, 'ab' if resumed else 'wb') as out_file:
+                        while True:
+                            chunk = resp.read(1024 * 256)
+                            if not chunk:
+                                break
+                            out_file.write(chunk)
+                            validator.update(chunk)
+
+                size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                if size <= 0:
                     raise RuntimeError('下载结果为空文件')
+                if expected_total is not None and size != expected_total:
+                    if size > expected_total:
+                        os.remove(part_path)
+                    raise RuntimeError(f'下载长度不符: {size}/{expected_total} 字节')
+                fit_info = validator.result()
+                if not fit_info['valid']:
+                    # 内容损坏时不续传，下一次尝试从头下载
+                    os.remove(part_path)
+                    raise RuntimeError(f"不是有效的 FIT 文件: {fit_info['error']}")
 
                 os.replace(part_path, output_path)
                 return True
             except Exception as e:
-                if os.path.exists(part_path):
+                # 保留 .part，下次重试或下次运行从断点续传；416 说明 .part 与服务器文件不一致，删除后从头下载
+                if getattr(e, 'code', None) == 416 and os.path.exists(part_path):
                     os.remove(part_path)
                 logger.error(f"[iGPSport] 下载失败(第{attempt}/3次): {e}")
                 if attempt < 3:
@@ -406,6 +402,75 @@ class IGPSportClient:
 
         return False
 
+    def upload_file(self, file_path):
+        """
+        直接调用导入接口上传单个 FIT 文件
+        返回 (结果, 说明)，结果为 success / duplicate / failed；接口不存在(404/405)时为 unsupported
+        """
+        if not self.token:
+            return 'failed', '未登录'
+
+        filename = os.path.basename(file_path)
+        headers = {
+            'Authorization': f"Bearer {self.token}",
+            'Accept': 'application/json, text/plain, */*',
+            'Origin': 'https://app.igpsport.cn',
+            'Referer': 'https://app.igpsport.cn/',
+        }
+        message = ''
+        for attempt in range(1, 4):
+            try:
+                with open(file_path, 'rb') as f:
+                    response = requests.post(
+                        f"{self.BASE_URL}{self.UPLOAD_PATH}",
+                        headers=headers,
+                        files={'file': (filename, f, 'application/octet-stream')},
+                        timeout=120,
+                    )
+                if response.status_code in (404, 405):
+                    return 'unsupported', f"HTTP {response.status_code}"
+                if response.status_code >= 500:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                try:
+                    data = response.json()
+                except ValueError:
+                    return 'failed', f"HTTP {response.status_code}: {response.text[:200]}"
+                if not isinstance(data, dict):
+                    return 'failed', f"返回异常: {response.text[:200]}"
+
+                message = str(data.get('message') or data.get('msg') or '')
+                if data.get('code') == 0 and response.status_code < 400:
+                    return 'success', ''
+                if any(keyword in message.lower() for keyword in UPLOAD_DUPLICATE_KEYWORDS):
+                    return 'duplicate', message
+                return 'failed', message or f"code={data.get('code')}"
+            except (requests.RequestException, RuntimeError) as e:
+                message = str(e)
+                logger.warning(f"[iGPSport] 上传 {filename} 异常(第{attempt}/3次): {e}")
+                if attempt < 3:
+                    time.sleep(attempt)
+        return 'failed', message
+
+    def upload_files(self, file_paths, max_workers=3):
+        """
+        并发直传多个 FIT 文件，返回 {文件名: (结果, 说明)}
+        任一文件返回 unsupported 后不再发起新的请求，未处理的文件不出现在结果中
+        """
+        results = {}
+        unsupported = []
+
+        def upload_one(file_path):
+            if unsupported:
+                return
+            status, message = self.upload_file(file_path)
+            if status == 'unsupported':
+                unsupported.append(file_path)
+            results[os.path.basename(file_path)] = (status, message)
+
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers or 1))) as executor:
+            list(executor.map(upload_one, file_paths))
+        return results
+
 
 class OneLapClient:
     """OneLap 平台客户端"""
@@ -416,6 +481,7 @@ class OneLapClient:
         self.tab = tab
         self.owns_tab = owns_tab
         self.auth_context = None
+        self.catalog = None
 
     def login(self):
         """登录 OneLap"""
@@ -529,32 +595,30 @@ class OneLapClient:
             session.close()
 
     def _count_activities_with_time(self, expected_time, max_pages=5, page_size=20):
+        """
+        增量同步本地活动目录后按时间索引计数：目录里已有记录时每次轮询通常只请求第一页，
+        目录为空时最多翻 max_pages 页
+        """
         if not expected_time:
             return 0
 
+        if self.catalog is None:
+            self.catalog = OneLapCatalog(ONELAP_CATALOG_FILE)
+
         session = self._create_api_session()
         try:
-            matched = 0
-            for page in range(1, max_pages + 1):
-                payload = {'page': page, 'limit': page_size}
+            def fetch_page(page, limit):
+                payload = {'page': page, 'limit': limit}
                 headers = generate_onelap_sign_headers(payload)
                 response = session.post(ONELAP_LIST_API, json=payload, headers=headers, timeout=30)
                 response.raise_for_status()
                 data = response.json()
                 page_data = (data.get('data') or {}) if isinstance(data, dict) else {}
-                items = page_data.get('list') or []
-                if not items:
-                    break
-
-                for activity in items:
-                    activity_time = parse_onelap_activity_time(activity)
-                    if activity_time == expected_time:
-                        matched += 1
-
-                if len(items) < page_size:
-                    break
+                return page_data.get('list') or [], page_data
 
-            return matched
+            if self.catalog.sync(fetch_page, page_size=page_size, max_pages=max_pages, page_delay=0):
+                self.catalog.save()
+            return self.catalog.count_at(expected_time)
         finally:
             session.close()
 
@@ -805,7 +869,7 @@ class IncrementalSync:
         # 显示增量记录
         logger.info("\n增量记录列表:")
         for i, act in enumerate(incremental, 1):
-            logger.info(f"  {i}. {act.start_time} - {act.distance/1000:.1f}km")
+            logger.info(f"  {i}. {act.start_time_text} - {act.distance/1000:.1f}km")
         
         # 如果是预览模式，到这里结束
         if dry_run:
@@ -851,18 +915,18 @@ class IncrementalSync:
         
         for act in source_list:
             try:
-                act_time = act.start_time_obj
+                act_time = act.start_time
                 if not act_time:
                     continue
 
                 if act_time > latest_time:
                     incremental.append(act)
             except Exception as e:
-                logger.debug(f"时间解析失败: {act.start_time}, 错误: {e}")
+                logger.debug(f"时间解析失败: {act.record_id}, 错误: {e}")
                 continue
 
         # 按时间排序（新的在前）
-        incremental.sort(key=lambda x: x.start_time_obj or datetime.min, reverse=True)
+        incremental.sort(key=lambda x: x.start_ts, reverse=True)
         
         return incremental
     
@@ -871,10 +935,9 @@ class IncrementalSync:
         downloaded = []
         
         for i, act in enumerate(activities, 1):
-            logger.info(f"  [{i}/{len(activities)}] 下载: {act.start_time} ({act.distance/1000:.1f}km)")
+            logger.info(f"  [{i}/{len(activities)}] 下载: {act.start_time_text} ({act.distance/1000:.1f}km)")
             
-            safe_start_time = sanitize_filename_component(act.start_time)
-            filename = f"{safe_start_time}-{act.ride_id}.fit"
+            filename = act.filename or f"{sanitize_filename_component(act.start_time_text)}-{act.record_id}.fit"
             filepath = os.path.join(self.download_dir, filename)
             
             # 如果文件已存在，跳过下载
@@ -888,10 +951,9 @@ class IncrementalSync:
 
             part_path = f"{filepath}.part"
             if os.path.exists(part_path):
-                logger.warning("      [WARN] 发现未完成临时文件，准备重新下载")
-                os.remove(part_path)
+                logger.info(f"      发现未完成临时文件 ({os.path.getsize(part_path)} 字节)，尝试断点续传")
 
-            if self.igpsport.download_file(act.ride_id, filepath):
+            if self.igpsport.download_file(act.record_id, filepath):
                 file_size = os.path.getsize(filepath)
                 logger.info(f"      ✅ 完成 ({file_size/1024:.1f} KB)")
                 downloaded.append((act, filepath))
@@ -908,9 +970,9 @@ class IncrementalSync:
         
         for i, (act, filepath) in enumerate(file_list, 1):
             logger.info(f"\n  [{i}/{len(file_list)}] 上传: {os.path.basename(filepath)}")
-            logger.info(f"      日期: {act.start_time}, 距离: {act.distance/1000:.1f}km")
+            logger.info(f"      日期: {act.start_time_text}, 距离: {act.distance/1000:.1f}km")
             
-            if self.onelap.upload_file(filepath, expected_time=act.start_time_obj):
+            if self.onelap.upload_file(filepath, expected_time=act.start_time):
                 logger.info(f"      ✅ 上传成功")
                 uploaded += 1
             else:
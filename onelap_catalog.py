@@ -0,0 +1,225 @@
+"""
+顽鹿（OneLap）活动本地目录
+按 record_id 保存活动的 ActivityRecord（开始时间、距离、爬升、名称和本地文件名），并维护按时间、按文件名的内存索引。
+列表接口按时间倒序返回，增量同步只翻页到出现已知 record_id 为止；目录为空或超过
+ONELAP_CATALOG_FULL_SYNC_DAYS 天未完整同步时翻完全部页，以补上后来补传的旧活动并清理已删除的记录
+
+SyncOnelapToXoss.py 和 incremental_sync_v2.py 共用，无第三方依赖
+"""
+
+import bisect
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from activity_models import ActivityRecord, get_onelap_record_id, parse_onelap_activity_time
+
+logger = logging.getLogger(__name__)
+
+ONELAP_CATALOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+ONELAP_CATALOG_FULL_SYNC_DAYS = 7
+
+
+class OneLapCatalog:
+    """
+    records[record_id] = ActivityRecord，磁盘上按 ActivityRecord.to_dict() 保存
+    catalog_file 为 None 时只在内存中使用，不读写磁盘
+    """
+
+    def __init__(self, catalog_file=None):
+        self.catalog_file = catalog_file
+        self.records = {}
+        self.full_synced_at = ''
+        self._time_index = None
+        self._time_keys = None
+        self._time_counts = None
+        self._filename_index = None
+        if catalog_file:
+            self.load()
+
+    def load(self):
+        try:
+            if os.path.exists(self.catalog_file):
+                with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and isinstance(data.get('records'), dict):
+                    self.records = {
+                        record_id: ActivityRecord.from_dict(item)
+                        for record_id, item in data['records'].items() if isinstance(item, dict)
+                    }
+                    self.full_synced_at = str(data.get('full_synced_at') or '')
+        except Exception as e:
+            logger.warning(f'[OneLap] 读取活动目录失败，将重新完整同步: {e}')
+            self.records = {}
+            self.full_synced_at = ''
+        self._invalidate()
+
+    def save(self):
+        if not self.catalog_file:
+            return
+        tmp_path = f'{self.catalog_file}.tmp'
+        try:
+            records = {record_id: record.to_dict() for record_id, record in self.records.items()}
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'full_synced_at': self.full_synced_at, 'records': records}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.catalog_file)
+        except Exception as e:
+            logger.warning(f'[OneLap] 保存活动目录失败: {e}')
+
+    def _invalidate(self):
+        self._time_index = None
+        self._time_keys = None
+        self._time_counts = None
+        self._filename_index = None
+
+    def _build_indexes(self):
+        self._time_index = sorted(
+            (record.start_ts, record_id) for record_id, record in self.records.items() if record.start_ts
+        )
+        self._time_keys = [start_ts for start_ts, _ in self._time_index]
+        self._time_counts = {}
+        self._filename_index = {}
+        for record_id, record in self.records.items():
+            if record.start_ts:
+                self._time_counts[record.start_ts] = self._time_counts.get(record.start_ts, 0) + 1
+            if record.filename:
+                self._filename_index[record.filename] = record_id
+
+    def needs_full_sync(self):
+        if not self.records or not self.full_synced_at:
+            return True
+        try:
+            last_full = datetime.strptime(self.full_synced_at, ONELAP_CATALOG_TIME_FORMAT)
+        except ValueError:
+            return True
+        return datetime.now() - last_full > timedelta(days=ONELAP_CATALOG_FULL_SYNC_DAYS)
+
+    def add(self, activity):
+        """把列表接口返回的一条原始活动转换后写入目录，已知记录保留已记录的文件名和 fitUrl；返回 ActivityRecord"""
+        record = ActivityRecord.from_onelap(activity)
+        if not record.record_id:
+            return None
+        previous = self.records.get(record.record_id)
+        if previous is not None:
+            record.filename = previous.filename
+            record.fit_url = record.fit_url or previous.fit_url
+        self.records[record.record_id] = record
+        self._invalidate()
+        return record
+
+    def sync(self, fetch_page, full=False, stop_time=None, page_size=20, max_pages=None, page_delay=0.2):
+        """
+        fetch_page(page, page_size) 返回 (items, page_data)，即列表接口 data.list 和 data
+        增量模式：某页出现已知 record_id 后处理完该页即停止；传入 stop_time 时遇到不晚于它的活动也停止
+        full=True 时翻完全部页，完成后删除列表中已不存在的记录并刷新 full_synced_at
+        翻页全部结束后才把各页写入目录：中途出错时目录保持不变，下次增量不会停在半截写入的记录上而漏掉更早的页
+        返回本次新增的 record_id 列表
+        """
+        added = []
+        seen = set()
+        fetched = []
+        stop_ts = int(stop_time.timestamp()) if stop_time else 0
+        page = 1
+        completed = False
+        stop_paging = False
+        while True:
+            items, page_data = fetch_page(page, page_size)
+            if not items:
+                completed = True
+                break
+
+            for activity in items:
+                record_id = get_onelap_record_id(activity)
+                if not record_id:
+                    continue
+                fetched.append(activity)
+                if record_id not in self.records:
+                    if record_id not in seen:
+                        added.append(record_id)
+                elif not full:
+                    stop_paging = True
+                seen.add(record_id)
+                if stop_ts and not full:
+                    start_time = parse_onelap_activity_time(activity)
+                    if start_time and int(start_time.timestamp()) <= stop_ts:
+                        stop_paging = True
+
+            logger.info(f'[OneLap] 活动目录同步第 {page} 页: {len(items)} 条，新增累计 {len(added)} 条')
+            total = int((page_data or {}).get('total') or 0)
+            total_pages = int((page_data or {}).get('pages') or 0)
+            if (total_pages and page >= total_pages) or (total and page * page_size >= total) or len(items) < page_size:
+                completed = True
+                break
+            if stop_paging or (max_pages and page >= max_pages):
+                break
+            page += 1
+            if page_delay:
+                time.sleep(page_delay)
+
+        for activity in fetched:
+            self.add(activity)
+        if not (full or completed or stop_paging) and self.full_synced_at:
+            # 受 max_pages 限制没翻到已知记录，中间可能还有没拿到的活动，下次改为完整同步
+            logger.info('[OneLap] 增量同步未翻到已知记录，下次将完整同步活动目录')
+            self.full_synced_at = ''
+        if full and completed:
+            removed = [record_id for record_id in self.records if record_id not in seen]
+            for record_id in removed:
+                self.records.pop(record_id, None)
+            if removed:
+                logger.info(f'[OneLap] 活动目录移除 {len(removed)} 条服务器上已不存在的记录')
+            self.full_synced_at = datetime.now().strftime(ONELAP_CATALOG_TIME_FORMAT)
+            self._invalidate()
+        return added
+
+    def get(self, record_id):
+        return self.records.get(record_id)
+
+    def newer_than(self, benchmark_time=None):
+        """
+        按时间倒序返回晚于 benchmark_time 的 ActivityRecord（None 时返回全部）
+        无法解析时间的活动排在最后，指定 benchmark_time 时只返回还没有本地文件名（尚未下载成功）的那些，
+        否则它们每轮都会被重新处理
+        """
+        if self._time_index is None:
+            self._build_indexes()
+        start = 0
+        if benchmark_time:
+            start = bisect.bisect_right(self._time_keys, int(benchmark_time.timestamp()))
+        activities = [self.records[record_id] for _, record_id in reversed(self._time_index[start:])]
+        activities.extend(
+            record for record in self.records.values()
+            if not record.start_ts and not (benchmark_time and record.filename)
+        )
+        return activities
+
+    def count_at(self, activity_time):
+        """活动时间恰好等于 activity_time 的记录数"""
+        if not activity_time:
+            return 0
+        if self._time_counts is None:
+            self._build_indexes()
+        return self._time_counts.get(int(activity_time.timestamp()), 0)
+
+    def set_filename(self, record_id, filename):
+        record = self.records.get(record_id)
+        if record is not None and filename and record.filename != filename:
+            record.filename = filename
+            self._filename_index = None
+
+    def merge_download_state(self, state):
+        """把下载状态里记录的文件名补到目录中（目录建立前下载的文件）；下载失败的条目不补"""
+        for record_id, item in (state or {}).items():
+            record = self.records.get(record_id)
+            if (record is not None and not record.filename and isinstance(item, dict)
+                    and item.get('downloaded') and item.get('filename')):
+                self.set_filename(record_id, str(item['filename']))
+
+    def time_for_filename(self, filename):
+        """按本地文件名查活动时间，目录中没有时返回 None"""
+        if self._filename_index is None:
+            self._build_indexes()
+        record_id = self._filename_index.get(filename)
+        return self.records[record_id].start_time if record_id else None
@@ -0,0 +1,425 @@
+"""
+同步流程计时与运行报告模块
+为同步流水线中的各个函数提供轻量的 span 计时、计数器和 HTTP 请求统计，
+每轮同步结束后输出机器可读的 JSON 运行报告，用于定位真实瓶颈
+
+用法：
+    @timed('fetch_activities')           # 装饰函数，记录每次调用耗时
+    with span('download', file=name):    # 记录代码块耗时
+    incr('onelap_fit_bytes', size)       # 累加计数
+    session.get(url, hooks={'response': http_metrics_hook('onelap_list')})
+
+仅依赖标准库
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _label_key(labels):
+    """把标签字典转成稳定的元组键，例如 (('api', 'onelap_list'), ('status', '200'))"""
+    return tuple((key, str(labels[key])) for key in sorted(labels))
+
+
+def _label_text(key):
+    """报告中使用的标签字符串，例如 api=onelap_list,status=200"""
+    return ','.join(f'{name}={value}' for name, value in key)
+
+
+class RunReport:
+    """一轮同步的运行报告：span 耗时、计数器和观测值（如请求延迟）"""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._started_perf = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+        self.counters = {}
+        self.observations = {}
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """记录一个代码块的耗时，异常会被记录后继续抛出"""
+        record = {
+            'name': name,
+            'start': round(time.perf_counter() - self._started_perf, 3),
+            'duration': 0.0,
+            'ok': True,
+        }
+        if attrs:
+            record['attrs'] = attrs
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['ok'] = False
+            record['error'] = f'{type(e).__name__}: {e}'[:300]
+            raise
+        finally:
+            record['duration'] = round(time.perf_counter() - started, 3)
+            with self._lock:
+                self.spans.append(record)
+
+    def incr(self, name, value=1, **labels):
+        """累加计数器，labels 用于区分 API、平台、结果等维度"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """记录一次观测值（秒、字节等），报告中汇总为次数/总和/最大值"""
+        key = _label_key(labels)
+        with self._lock:
+            self.observations.setdefault(name, {}).setdefault(key, []).append(value)
+
+    def stage_summary(self):
+        """按 span 名称汇总调用次数、总耗时和最大耗时"""
+        summary = {}
+        for record in self.spans:
+            item = summary.setdefault(record['name'], {'count': 0, 'total': 0.0, 'max': 0.0, 'errors': 0})
+            item['count'] += 1
+            item['total'] = round(item['total'] + record['duration'], 3)
+            item['max'] = max(item['max'], record['duration'])
+            if not record['ok']:
+                item['errors'] += 1
+        return summary
+
+    def to_dict(self):
+        counters = {
+            name: {_label_text(key): value for key, value in series.items()}
+            for name, series in self.counters.items()
+        }
+        observations = {}
+        for name, series in self.observations.items():
+            observations[name] = {
+                _label_text(key): {
+                    'count': len(values),
+                    'sum': round(sum(values), 3),
+                    'max': round(max(values), 3),
+                }
+                for key, values in series.items()
+            }
+        return {
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': round(time.perf_counter() - self._started_perf, 3),
+            'stages': self.stage_summary(),
+            'counters': counters,
+            'observations': observations,
+            'spans': self.spans,
+        }
+
+    def write(self, path):
+        """写出 JSON 运行报告，失败只记录警告"""
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            return True
+        except Exception as e:
+            logger.warning(f'[Metrics] 写入运行报告失败: {e}')
+            return False
+
+
+_current_report = RunReport()
+
+
+def get_report():
+    """返回当前这一轮的运行报告"""
+    return _current_report
+
+
+def reset_report():
+    """开始新一轮同步时调用，返回新的运行报告"""
+    global _current_report
+    _current_report = RunReport()
+    return _current_report
+
+
+def span(name, **attrs):
+    return _current_report.span(name, **attrs)
+
+
+def incr(name, value=1, **labels):
+    _current_report.incr(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    _current_report.observe(name, value, **labels)
+
+
+def timed(name=None, metric=None):
+    """函数计时装饰器，每次调用记录一个 span（名称默认取函数名）
+
+    metric 不为空时，同时把耗时记为观测值 metric{span=...}，例如浏览器等待时间
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # 调用时再取当前报告，reset_report() 之后的调用会记到新报告里
+            report = _current_report
+            started = time.perf_counter()
+            with report.span(span_name):
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    if metric:
+                        report.observe(metric, time.perf_counter() - started, span=span_name)
+        return wrapper
+    return decorator
+
+
+def http_metrics_hook(api):
+    """生成 requests 的 response hook，按 api 统计请求次数、状态码、延迟、字节数和重试次数"""
+    def hook(response, *args, **kwargs):
+        try:
+            status = response.status_code
+            incr('http_requests', api=api, status=status)
+            elapsed = response.elapsed.total_seconds() if response.elapsed is not None else 0.0
+            observe('http_request_seconds', elapsed, api=api)
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit():
+                incr('http_response_bytes', int(content_length), api=api)
+            retries = getattr(getattr(response, 'raw', None), 'retries', None)
+            history = getattr(retries, 'history', None) or ()
+            if history:
+                incr('http_retries', len(history), api=api)
+        except Exception as e:
+            logger.debug(f'[Metrics] 记录请求指标失败: {e}')
+        return response
+    return hook
+
+
+# ============================================================
+# Prometheus / OpenMetrics 文本格式导出
+# ============================================================
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in items) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class PrometheusExporter:
+    """把每轮 RunReport 累积成跨轮次单调递增的计数器和直方图，输出 Prometheus 文本格式
+
+    - 计数器：{prefix}_{name}_total
+    - 观测值：{prefix}_{name} 直方图（请求延迟、浏览器等待时间）
+    - span：{prefix}_span_duration_seconds{span=...} 直方图
+    - 最近一轮：{prefix}_last_run_timestamp_seconds / _last_run_duration_seconds / _last_run_success
+
+    单次运行模式每轮都是新进程，需用 load_state()/save_state() 把累计值保存在磁盘上，
+    否则每次写出的 _total 都从零开始，rate()/increase() 会把它当成计数器重置
+    """
+
+    def __init__(self, prefix='onelap_sync', const_labels=None, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.const_labels = tuple(sorted((const_labels or {}).items()))
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.runs_total = {'ok': 0, 'failed': 0}
+        self.last_run = None
+        self._server = None
+
+    def _observe(self, name, key, value):
+        series = self.histograms.setdefault(name, {})
+        item = series.get(key)
+        if item is None:
+            item = series[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                item['buckets'][index] += 1
+        item['count'] += 1
+        item['sum'] += value
+
+    def collect(self, report, ok=True):
+        """合并一轮运行报告"""
+        with self._lock:
+            for name, series in report.counters.items():
+                target = self.counters.setdefault(name, {})
+                for key, value in series.items():
+                    target[key] = target.get(key, 0) + value
+            for name, series in report.observations.items():
+                for key, values in series.items():
+                    for value in values:
+                        self._observe(name, key, value)
+            for record in report.spans:
+                self._observe('span_duration_seconds', (('span', record['name']),), record['duration'])
+            self.runs_total['ok' if ok else 'failed'] += 1
+            self.last_run = {
+                'timestamp': time.time(),
+                'duration': time.perf_counter() - report._started_perf,
+                'ok': ok,
+            }
+
+    def load_state(self, path):
+        """读取 save_state() 保存的累计值；文件不存在或损坏时从零开始，分桶配置变化时丢弃旧直方图"""
+        try:
+            if not os.path.exists(path):
+                return False
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            counters = {
+                name: {tuple(tuple(pair) for pair in key): value for key, value in series}
+                for name, series in (data.get('counters') or {}).items()
+            }
+            histograms = {}
+            if tuple(data.get('buckets') or ()) == self.buckets:
+                histograms = {
+                    name: {tuple(tuple(pair) for pair in key): item for key, item in series}
+                    for name, series in (data.get('histograms') or {}).items()
+                }
+            runs_total = {'ok': 0, 'failed': 0}
+            runs_total.update({result: int(value) for result, value in (data.get('runs_total') or {}).items()})
+        except Exception as e:
+            logger.warning(f'[Metrics] 读取累计指标失败，计数器从零开始: {e}')
+            return False
+        with self._lock:
+            self.counters = counters
+            self.histograms = histograms
+            self.runs_total = runs_total
+        return True
+
+    def save_state(self, path):
+        """把累计计数器、直方图和运行次数写到 path（先写临时文件再替换）"""
+        with self._lock:
+            data = {
+                'buckets': list(self.buckets),
+                'runs_total': dict(self.runs_total),
+                'counters': {
+                    name: [[[list(pair) for pair in key], value] for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                'histograms': {
+                    name: [[[list(pair) for pair in key], item] for key, item in series.items()]
+                    for name, series in self.histograms.items()
+                },
+            }
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.warning(f'[Metrics] 保存累计指标失败: {e}')
+            return False
+
+    def render(self):
+        """生成 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            name = f'{self.prefix}_runs_total'
+            lines.append(f'# TYPE {name} counter')
+            for result, value in sorted(self.runs_total.items()):
+                lines.append(f'{name}{_format_labels((("result", result),), self.const_labels)} {value}')
+
+            for metric, series in sorted(self.counters.items()):
+                name = f'{self.prefix}_{metric}_total'
+                lines.append(f'# TYPE {name} counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{_format_labels(key, self.const_labels)} {_format_number(value)}')
+
+            for metric, series in sorted(self.histograms.items()):
+                name = f'{self.prefix}_{metric}'
+                lines.append(f'# TYPE {name} histogram')
+                for key, item in sorted(series.items()):
+                    for bound, count in zip(self.buckets, item['buckets']):
+                        labels = _format_labels(key + (('le', _format_number(float(bound))),), self.const_labels)
+                        lines.append(f'{name}_bucket{labels} {count}')
+                    labels = _format_labels(key + (('le', '+Inf'),), self.const_labels)
+                    lines.append(f'{name}_bucket{labels} {item["count"]}')
+                    lines.append(f'{name}_sum{_format_labels(key, self.const_labels)} {round(item["sum"], 6)}')
+                    lines.append(f'{name}_count{_format_labels(key, self.const_labels)} {item["count"]}')
+
+            if self.last_run:
+                labels = _format_labels((), self.const_labels)
+                for suffix, value in (
+                    ('last_run_timestamp_seconds', round(self.last_run['timestamp'], 3)),
+                    ('last_run_duration_seconds', round(self.last_run['duration'], 3)),
+                    ('last_run_success', 1 if self.last_run['ok'] else 0),
+                ):
+                    name = f'{self.prefix}_{suffix}'
+                    lines.append(f'# TYPE {name} gauge')
+                    lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """写入 node_exporter textfile collector 文件（先写临时文件再替换，避免被读到半截内容）"""
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.warning(f'[Metrics] 写入 Prometheus textfile 失败: {e}')
+            return False
+
+    def start_http_server(self, port, host='0.0.0.0'):
+        """在后台线程提供 /metrics 接口，适合守护模式常驻进程"""
+        if self._server is not None:
+            return self._server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f'[Metrics] Prometheus 指标接口已启动: http://{host}:{port}/metrics')
+        return self._server
+
+    def stop_http_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None